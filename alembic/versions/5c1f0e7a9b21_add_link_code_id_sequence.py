@@ -0,0 +1,29 @@
+"""add link code id sequence
+
+Revision ID: 5c1f0e7a9b21
+Revises: 40899879b5a5
+Create Date: 2026-10-17 10:12:40.118532
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5c1f0e7a9b21"
+down_revision: Union[str, Sequence[str], None] = "40899879b5a5"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # One nextval() reserves a block of 1000 ids (CODE_ID_BLOCK_SIZE)
+    op.execute("CREATE SEQUENCE link_code_id_seq START WITH 1 INCREMENT BY 1000")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP SEQUENCE link_code_id_seq")
@@ -0,0 +1,47 @@
+"""add links click_count/last_accessed_at index for the cache warm-up
+
+Revision ID: 7b3e91d4c5a2
+Revises: f1c8d3b6a290
+Create Date: 2026-10-17 23:41:09.512874
+
+The startup warm-up reads the N hottest links ordered by click_count DESC,
+last_accessed_at DESC NULLS LAST. Without an index that is a full scan and
+sort of links. With this one it is an index scan that stops after N
+entries. The click flusher updates both columns, so those updates can no
+longer be HOT updates and each also writes an index entry.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "7b3e91d4c5a2"
+down_revision: Union[str, Sequence[str], None] = "f1c8d3b6a290"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY cannot run inside a transaction; see 9a41c6b2d8e3.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_links_click_count_last_accessed",
+            "links",
+            [sa.text("click_count DESC"), sa.text("last_accessed_at DESC NULLS LAST")],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_links_click_count_last_accessed",
+            table_name="links",
+            postgresql_concurrently=True,
+        )
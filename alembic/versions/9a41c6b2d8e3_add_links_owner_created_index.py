@@ -0,0 +1,56 @@
+"""add links owner/created_at/id index
+
+Revision ID: 9a41c6b2d8e3
+Revises: e3a9c5d70f12
+Create Date: 2026-10-17 15:02:44.118305
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "9a41c6b2d8e3"
+down_revision: Union[str, Sequence[str], None] = "e3a9c5d70f12"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY cannot run inside a transaction; building it this way
+    # keeps links writable while a large table is indexed.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_links_owner_created_id",
+            "links",
+            ["owner_api_key_id", sa.text("created_at DESC"), sa.text("id DESC")],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        # Redundant now: the new index leads with owner_api_key_id
+        op.drop_index(
+            op.f("ix_links_owner_api_key_id"),
+            table_name="links",
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            op.f("ix_links_owner_api_key_id"),
+            "links",
+            ["owner_api_key_id"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "ix_links_owner_created_id",
+            table_name="links",
+            postgresql_concurrently=True,
+        )
@@ -0,0 +1,29 @@
+"""add api key revoked_at
+
+Revision ID: b7d2e4f81c36
+Revises: 5c1f0e7a9b21
+Create Date: 2026-10-17 11:03:27.502914
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b7d2e4f81c36"
+down_revision: Union[str, Sequence[str], None] = "5c1f0e7a9b21"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("api_keys", sa.Column("revoked_at", sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("api_keys", "revoked_at")
@@ -0,0 +1,56 @@
+"""add partial indexes for the expiry sweeper
+
+Revision ID: c4f7a2e9d1b3
+Revises: 9a41c6b2d8e3
+Create Date: 2026-10-17 18:21:09.530417
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c4f7a2e9d1b3"
+down_revision: Union[str, Sequence[str], None] = "9a41c6b2d8e3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY cannot run inside a transaction; see 9a41c6b2d8e3.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_links_active_expires_at",
+            "links",
+            ["expires_at"],
+            unique=False,
+            postgresql_where=sa.text("is_active AND expires_at IS NOT NULL"),
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_links_active_capped",
+            "links",
+            ["id"],
+            unique=False,
+            postgresql_where=sa.text("is_active AND max_clicks IS NOT NULL"),
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_links_active_capped",
+            table_name="links",
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "ix_links_active_expires_at",
+            table_name="links",
+            postgresql_concurrently=True,
+        )
@@ -0,0 +1,41 @@
+"""create link_clicks_hourly
+
+Revision ID: e3a9c5d70f12
+Revises: b7d2e4f81c36
+Create Date: 2026-10-17 13:41:09.220417
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e3a9c5d70f12"
+down_revision: Union[str, Sequence[str], None] = "b7d2e4f81c36"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "link_clicks_hourly",
+        sa.Column("link_id", sa.UUID(), nullable=False),
+        sa.Column(
+            "bucket",
+            sa.DateTime(timezone=True),
+            nullable=False,
+            comment="Start of the UTC hour",
+        ),
+        sa.Column("clicks", sa.BigInteger(), nullable=False),
+        sa.ForeignKeyConstraint(["link_id"], ["links.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("link_id", "bucket"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("link_clicks_hourly")
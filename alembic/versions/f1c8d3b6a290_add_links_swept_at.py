@@ -0,0 +1,98 @@
+"""record swept links in links.swept_at instead of is_active
+
+Revision ID: f1c8d3b6a290
+Revises: c4f7a2e9d1b3
+Create Date: 2026-10-17 21:04:37.118305
+
+The expiry sweeper used to set is_active = false, which made a swept link
+indistinguishable from one its owner disabled. It now stamps swept_at and
+leaves is_active alone, so its partial indexes move from is_active to
+swept_at IS NULL. Links the old sweeper already deactivated cannot be told
+apart from owner-disabled ones and keep is_active = false.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "f1c8d3b6a290"
+down_revision: Union[str, Sequence[str], None] = "c4f7a2e9d1b3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Nullable, no default: a catalog-only change, no table rewrite
+    op.add_column(
+        "links",
+        sa.Column(
+            "swept_at",
+            sa.DateTime(timezone=True),
+            nullable=True,
+            comment="When the expiry sweeper found the link expired or used up",
+        ),
+    )
+    # CONCURRENTLY cannot run inside a transaction; see 9a41c6b2d8e3.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_links_unswept_expires_at",
+            "links",
+            ["expires_at"],
+            unique=False,
+            postgresql_where=sa.text("swept_at IS NULL AND expires_at IS NOT NULL"),
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_links_unswept_capped",
+            "links",
+            ["id"],
+            unique=False,
+            postgresql_where=sa.text("swept_at IS NULL AND max_clicks IS NOT NULL"),
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "ix_links_active_capped",
+            table_name="links",
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "ix_links_active_expires_at",
+            table_name="links",
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_links_active_expires_at",
+            "links",
+            ["expires_at"],
+            unique=False,
+            postgresql_where=sa.text("is_active AND expires_at IS NOT NULL"),
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_links_active_capped",
+            "links",
+            ["id"],
+            unique=False,
+            postgresql_where=sa.text("is_active AND max_clicks IS NOT NULL"),
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "ix_links_unswept_capped",
+            table_name="links",
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "ix_links_unswept_expires_at",
+            table_name="links",
+            postgresql_concurrently=True,
+        )
+    op.drop_column("links", "swept_at")
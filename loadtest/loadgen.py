@@ -0,0 +1,509 @@
+"""
+Open-loop load generator with named scenarios and regression reports.
+
+Requests are started on an arrival schedule (--rate per second), whether
+or not earlier ones have finished, and each latency is measured from the
+request's scheduled start. A slow server therefore shows up as latency
+instead of silently lowering the offered load (no coordinated omission).
+Arrivals that would exceed --max-in-flight are dropped and counted.
+
+Latencies go into HDR-style histograms (3 significant digits, so every
+recorded value is within 0.1%). Reports are JSON with sorted keys, so
+two runs diff cleanly, and `compare` prints percentile deltas. A run
+exits with status 1 when an operation misses its p95/p99 budget or the
+error rate is too high.
+
+Scenarios:
+  zipf-hot      redirects over Zipf-skewed hot links
+  long-tail     redirects spread uniformly over many cold links
+  create-burst  link creation with 5x bursts every 10 seconds
+  list-pages    paginated GET /api/v1/links, following cursors
+  mixed         90% redirects, 5% creates, 3% listing, 2% analytics
+  404-flood     redirects to codes that do not exist
+
+Creates are rate limited per API key (CREATE_LIMIT); raise it on the
+server for create-heavy runs, or the report will show 429s.
+
+Run:
+    python loadtest/loadgen.py run zipf-hot --api-key sk_dev_... --rate 1000 \\
+        --duration 60 --output zipf.json
+    python loadtest/loadgen.py compare before.json after.json
+    python loadtest/loadgen.py list
+"""
+
+import argparse
+import asyncio
+import bisect
+import json
+import math
+import random
+import secrets
+import sys
+import time
+from collections import deque
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, NamedTuple
+
+import httpx
+
+# ---------------------------------------------------------------------------
+# HDR-style histogram
+# ---------------------------------------------------------------------------
+
+# Values below SUB_BUCKETS are exact; above, each power of two is split
+# into SUB_BUCKETS / 2 linear slots, so the error stays below 1 / 1024.
+SUB_BUCKETS = 2048
+_HALF = SUB_BUCKETS // 2
+_SUB_BITS = SUB_BUCKETS.bit_length() - 1
+
+PERCENTILES = (50.0, 90.0, 95.0, 99.0, 99.9)
+
+
+class Histogram:
+    """Integer values (microseconds here) in log-linear buckets."""
+
+    def __init__(self) -> None:
+        self.counts: dict[int, int] = {}
+        self.total = 0
+        self.sum = 0
+        self.max = 0
+
+    @staticmethod
+    def index(value: int) -> int:
+        if value < SUB_BUCKETS:
+            return value
+        shift = value.bit_length() - _SUB_BITS
+        return SUB_BUCKETS + (shift - 1) * _HALF + (value >> shift) - _HALF
+
+    @staticmethod
+    def highest_equivalent(index: int) -> int:
+        """Largest value that lands in this bucket (what percentiles report)."""
+        if index < SUB_BUCKETS:
+            return index
+        shift, sub = divmod(index - SUB_BUCKETS, _HALF)
+        return ((sub + _HALF + 1) << (shift + 1)) - 1
+
+    def record(self, value: int) -> None:
+        value = max(0, value)
+        i = self.index(value)
+        self.counts[i] = self.counts.get(i, 0) + 1
+        self.total += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def percentile(self, p: float) -> int:
+        if not self.total:
+            return 0
+        rank = max(1, math.ceil(self.total * p / 100))
+        seen = 0
+        for i in sorted(self.counts):
+            seen += self.counts[i]
+            if seen >= rank:
+                return min(self.highest_equivalent(i), self.max)
+        return self.max
+
+    def to_json(self) -> dict:
+        return {
+            "buckets": {str(i): c for i, c in sorted(self.counts.items())},
+            "max": self.max,
+            "sum": self.sum,
+            "total": self.total,
+        }
+
+
+# ---------------------------------------------------------------------------
+# Scenarios
+# ---------------------------------------------------------------------------
+
+
+class Request(NamedTuple):
+    op: str
+    method: str
+    path: str
+    params: dict | None = None
+    json: dict | None = None
+    auth: bool = False
+    # Statuses that count as success for this operation
+    ok: frozenset[int] = frozenset({200})
+
+
+class Budget(NamedTuple):
+    p95_ms: float
+    p99_ms: float
+
+
+REDIRECT_OK = frozenset({307})
+
+DEFAULT_BUDGETS = {
+    "redirect": Budget(25, 100),
+    "redirect_missing": Budget(25, 100),
+    "create": Budget(100, 250),
+    "list": Budget(50, 150),
+    "analytics": Budget(100, 250),
+}
+
+
+class Workload:
+    """Shared state the scenarios draw requests from."""
+
+    def __init__(self, codes: list[str], zipf_s: float, rng: random.Random) -> None:
+        self.codes = codes
+        self.rng = rng
+        weights = [1 / (rank**zipf_s) for rank in range(1, len(codes) + 1)]
+        self._zipf_cdf = []
+        total = 0.0
+        for w in weights:
+            total += w
+            self._zipf_cdf.append(total)
+        # Cursors seen in list responses; continuing one walks deeper pages
+        self.cursors: deque[str] = deque(maxlen=1000)
+
+    def hot_code(self) -> str:
+        point = self.rng.random() * self._zipf_cdf[-1]
+        return self.codes[min(bisect.bisect_left(self._zipf_cdf, point), len(self.codes) - 1)]
+
+    def any_code(self) -> str:
+        return self.rng.choice(self.codes)
+
+    def redirect(self, code: str) -> Request:
+        return Request("redirect", "GET", f"/{code}", ok=REDIRECT_OK)
+
+    def create(self) -> Request:
+        url = f"https://example.com/load/{secrets.token_hex(6)}"
+        return Request(
+            "create", "POST", "/api/v1/links", json={"url": url}, auth=True, ok=frozenset({201})
+        )
+
+    def list_page(self) -> Request:
+        params = {"limit": 50}
+        if self.cursors and self.rng.random() < 0.8:
+            params["cursor"] = self.rng.choice(self.cursors)
+        return Request("list", "GET", "/api/v1/links", params=params, auth=True)
+
+    def analytics(self) -> Request:
+        return Request("analytics", "GET", f"/api/v1/links/{self.hot_code()}/analytics", auth=True)
+
+    def missing(self) -> Request:
+        # 10 characters: longer than any generated code, so never an existing one
+        code = secrets.token_hex(5)
+        return Request("redirect_missing", "GET", f"/{code}", ok=frozenset({404}))
+
+
+def _constant(t: float, rate: float) -> float:
+    return rate
+
+
+def _bursts(t: float, rate: float) -> float:
+    # 1 second at 5x every 10 seconds
+    return rate * 5 if t % 10 < 1 else rate
+
+
+def _mixed(w: Workload) -> Request:
+    roll = w.rng.random()
+    if roll < 0.90:
+        return w.redirect(w.hot_code())
+    if roll < 0.95:
+        return w.create()
+    if roll < 0.98:
+        return w.list_page()
+    return w.analytics()
+
+
+class Scenario(NamedTuple):
+    description: str
+    next_request: Callable[[Workload], Request]
+    # Links created before the run (the codes the workload draws from)
+    links: int
+    rate_at: Callable[[float, float], float] = _constant
+
+
+SCENARIOS = {
+    "zipf-hot": Scenario(
+        "redirects over Zipf-skewed hot links", lambda w: w.redirect(w.hot_code()), 1_000
+    ),
+    "long-tail": Scenario(
+        "redirects spread uniformly over many cold links",
+        lambda w: w.redirect(w.any_code()),
+        20_000,
+    ),
+    "create-burst": Scenario("link creation with 5x bursts", lambda w: w.create(), 0, _bursts),
+    "list-pages": Scenario("paginated listing, following cursors", lambda w: w.list_page(), 5_000),
+    "mixed": Scenario("90% redirects, 5% creates, 3% listing, 2% analytics", _mixed, 1_000),
+    "404-flood": Scenario("redirects to codes that do not exist", lambda w: w.missing(), 0),
+}
+
+
+# ---------------------------------------------------------------------------
+# Runner
+# ---------------------------------------------------------------------------
+
+
+class OpStats:
+    def __init__(self) -> None:
+        self.latency = Histogram()
+        self.statuses: dict[str, int] = {}
+        self.errors = 0
+
+    def add(self, status: str, ok: bool, latency_us: int) -> None:
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if not ok:
+            self.errors += 1
+        self.latency.record(latency_us)
+
+
+async def _seed_links(client: httpx.AsyncClient, count: int, headers: dict) -> list[str]:
+    """Create `count` links in batches, waiting out create rate limits."""
+    codes: list[str] = []
+    while len(codes) < count:
+        n = min(1000, count - len(codes))
+        items = [{"url": f"https://example.com/seed/{secrets.token_hex(6)}"} for _ in range(n)]
+        resp = await client.post(
+            "/api/v1/links:batch", json={"items": items}, headers=headers, timeout=60
+        )
+        if resp.status_code == 429:
+            wait = int(resp.headers.get("Retry-After", "1"))
+            print(f"seeding: rate limited, waiting {wait}s (raise CREATE_LIMIT to speed up)")
+            await asyncio.sleep(wait)
+            continue
+        resp.raise_for_status()
+        codes += [item["link"]["code"] for item in resp.json()["items"] if item.get("link")]
+    return codes
+
+
+async def _send(
+    client: httpx.AsyncClient,
+    workload: Workload,
+    request: Request,
+    headers: dict,
+    scheduled: float,
+    stats: OpStats | None,
+) -> None:
+    try:
+        resp = await client.request(
+            request.method,
+            request.path,
+            params=request.params,
+            json=request.json,
+            headers=headers if request.auth else None,
+        )
+        status, ok = str(resp.status_code), resp.status_code in request.ok
+        if request.op == "list" and resp.status_code == 200:
+            cursor = resp.json().get("next_cursor")
+            if cursor:
+                workload.cursors.append(cursor)
+    except httpx.HTTPError as exc:
+        status, ok = type(exc).__name__, False
+    if stats is not None:
+        stats.add(status, ok, int((time.perf_counter() - scheduled) * 1e6))
+
+
+async def run_scenario(args: argparse.Namespace) -> dict:
+    scenario = SCENARIOS[args.scenario]
+    rng = random.Random(args.seed)
+    headers = {"X-API-Key": args.api_key} if args.api_key else {}
+    limits = httpx.Limits(
+        max_connections=args.connections, max_keepalive_connections=args.connections
+    )
+
+    async with httpx.AsyncClient(
+        base_url=args.base_url, limits=limits, timeout=args.timeout, follow_redirects=False
+    ) as client:
+        codes: list[str] = []
+        if scenario.links:
+            if not args.api_key:
+                raise SystemExit(f"{args.scenario} needs --api-key to create its links")
+            codes = await _seed_links(client, args.links or scenario.links, headers)
+        workload = Workload(codes or ["unused"], args.zipf_s, rng)
+
+        stats: dict[str, OpStats] = {}
+        in_flight: set[asyncio.Task] = set()
+        dropped = 0
+        sent = 0
+        max_lag = 0.0
+
+        start = time.perf_counter()
+        measure_from = start + args.warmup
+        end = measure_from + args.duration
+        next_at = start
+        while next_at < end:
+            now = time.perf_counter()
+            if next_at > now:
+                await asyncio.sleep(next_at - now)
+            max_lag = max(max_lag, time.perf_counter() - next_at)
+
+            measured = next_at >= measure_from
+            if len(in_flight) >= args.max_in_flight:
+                dropped += measured
+            else:
+                request = scenario.next_request(workload)
+                op_stats = stats.setdefault(request.op, OpStats()) if measured else None
+                task = asyncio.create_task(
+                    _send(client, workload, request, headers, next_at, op_stats)
+                )
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+                sent += measured
+
+            rate = scenario.rate_at(next_at - start, args.rate)
+            next_at += rng.expovariate(rate) if args.poisson else 1 / rate
+
+        if in_flight:
+            await asyncio.wait(in_flight, timeout=args.timeout)
+
+    return _report(args, stats, sent, dropped, max_lag)
+
+
+def _budget(args: argparse.Namespace, op: str) -> Budget:
+    default = DEFAULT_BUDGETS.get(op, Budget(100, 250))
+    return Budget(args.p95_ms or default.p95_ms, args.p99_ms or default.p99_ms)
+
+
+def _report(args, stats: dict[str, OpStats], sent: int, dropped: int, max_lag: float) -> dict:
+    ops = {}
+    for op, s in sorted(stats.items()):
+        total = s.latency.total
+        ops[op] = {
+            "budget_ms": _budget(args, op)._asdict(),
+            "count": total,
+            "error_rate": s.errors / total if total else 0.0,
+            "errors": s.errors,
+            "histogram_us": s.latency.to_json(),
+            "latency_ms": _latency_summary(s.latency),
+            "statuses": dict(sorted(s.statuses.items())),
+        }
+    return {
+        "config": {
+            "base_url": args.base_url,
+            "duration_s": args.duration,
+            "max_in_flight": args.max_in_flight,
+            "poisson": args.poisson,
+            "rate": args.rate,
+            "scenario": args.scenario,
+            "seed": args.seed,
+            "warmup_s": args.warmup,
+        },
+        "dropped": dropped,
+        "finished_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "max_schedule_lag_ms": round(max_lag * 1000, 3),
+        "max_error_rate": args.max_error_rate,
+        "operations": ops,
+        "sent": sent,
+    }
+
+
+def _latency_summary(hist: Histogram) -> dict:
+    summary = {f"p{p:g}": hist.percentile(p) / 1000 for p in PERCENTILES}
+    summary["max"] = hist.max / 1000
+    summary["mean"] = round(hist.sum / hist.total / 1000, 3) if hist.total else 0.0
+    return summary
+
+
+def check_budgets(report: dict) -> list[str]:
+    """Every budget an operation missed, as readable lines."""
+    failures = []
+    for op, data in report["operations"].items():
+        latency, budget = data["latency_ms"], data["budget_ms"]
+        if latency["p95"] > budget["p95_ms"]:
+            failures.append(f"{op}: p95 {latency['p95']:.2f}ms > {budget['p95_ms']}ms")
+        if latency["p99"] > budget["p99_ms"]:
+            failures.append(f"{op}: p99 {latency['p99']:.2f}ms > {budget['p99_ms']}ms")
+        if data["error_rate"] > report["max_error_rate"]:
+            failures.append(
+                f"{op}: error rate {data['error_rate']:.2%} > {report['max_error_rate']:.2%}"
+            )
+    return failures
+
+
+# Above this the generator itself fell behind its schedule; latencies then
+# include client-side delay (run it on a separate, less loaded machine)
+SCHEDULE_LAG_WARN_MS = 100
+
+
+def _print_report(report: dict) -> None:
+    cfg = report["config"]
+    print(
+        f"\n{cfg['scenario']}: {report['sent']} requests at {cfg['rate']}/s "
+        f"over {cfg['duration_s']}s, {report['dropped']} dropped, "
+        f"max schedule lag {report['max_schedule_lag_ms']}ms"
+    )
+    print(
+        f"{'op':<18} {'count':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8} {'err':>7}  statuses"
+    )
+    if report["max_schedule_lag_ms"] > SCHEDULE_LAG_WARN_MS:
+        print("warning: the generator fell behind its schedule; it may be the bottleneck")
+    for op, data in report["operations"].items():
+        lat = data["latency_ms"]
+        print(
+            f"{op:<18} {data['count']:>8} {lat['p50']:>8.2f} {lat['p95']:>8.2f} "
+            f"{lat['p99']:>8.2f} {lat['max']:>8.2f} {data['error_rate']:>7.2%}  "
+            + " ".join(f"{k}:{v}" for k, v in data["statuses"].items())
+        )
+
+
+def compare(before: dict, after: dict) -> None:
+    print(f"{'op':<18} {'metric':>8} {'before':>10} {'after':>10} {'change':>8}")
+    for op in sorted(set(before["operations"]) | set(after["operations"])):
+        old = before["operations"].get(op)
+        new = after["operations"].get(op)
+        if old is None or new is None:
+            print(f"{op:<18} {'only in ' + ('after' if old is None else 'before'):>30}")
+            continue
+        for metric in ("p50", "p95", "p99", "max"):
+            a, b = old["latency_ms"][metric], new["latency_ms"][metric]
+            change = f"{b / a - 1:+.1%}" if a else "-"
+            print(f"{op:<18} {metric:>8} {a:>10.2f} {b:>10.2f} {change:>8}")
+        print(f"{op:<18} {'errors':>8} {old['error_rate']:>10.2%} {new['error_rate']:>10.2%}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="run a scenario")
+    run.add_argument("scenario", choices=sorted(SCENARIOS))
+    run.add_argument("--base-url", default="http://localhost:8000")
+    run.add_argument("--api-key", help="needed by scenarios that create or list links")
+    run.add_argument("--rate", type=float, default=500, help="arrivals per second")
+    run.add_argument("--duration", type=float, default=60, help="measured seconds")
+    run.add_argument("--warmup", type=float, default=5, help="unmeasured seconds first")
+    run.add_argument("--poisson", action="store_true", help="exponential inter-arrival times")
+    run.add_argument("--links", type=int, help="links to seed (default: per scenario)")
+    run.add_argument("--zipf-s", type=float, default=1.1, help="Zipf exponent for hot keys")
+    run.add_argument("--connections", type=int, default=200)
+    run.add_argument("--max-in-flight", type=int, default=2000)
+    run.add_argument("--timeout", type=float, default=10)
+    run.add_argument("--seed", type=int, default=1)
+    run.add_argument("--p95-ms", type=float, help="override every operation's p95 budget")
+    run.add_argument("--p99-ms", type=float, help="override every operation's p99 budget")
+    run.add_argument("--max-error-rate", type=float, default=0.01)
+    run.add_argument("--output", type=Path, help="write the JSON report here")
+
+    cmp = sub.add_parser("compare", help="diff two reports")
+    cmp.add_argument("before", type=Path)
+    cmp.add_argument("after", type=Path)
+
+    sub.add_parser("list", help="list scenarios")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for name, scenario in SCENARIOS.items():
+            print(f"{name:<14} {scenario.description}")
+        return
+    if args.command == "compare":
+        compare(json.loads(args.before.read_text()), json.loads(args.after.read_text()))
+        return
+
+    report = asyncio.run(run_scenario(args))
+    _print_report(report)
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2, sort_keys=True) + "\n")
+
+    failures = check_budgets(report)
+    if failures:
+        print("\nbudget exceeded:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -37,9 +37,12 @@ def main() -> None:
         row = ApiKey(name=args.name, key_hash=key_hash)
         session.add(row)
         session.commit()
+        key_id = row.id
 
     print("API key (store this now; it will not be shown again):")
     print(raw)
+    # Add this to ADMIN_API_KEY_IDS to allow the key to call /api/v1/admin endpoints
+    print(f"API key id: {key_id}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,32 @@
+"""
+Dev utility: revoke an API key by id.
+
+The key stops authenticating immediately on every worker (cached copies
+are evicted through Redis pub/sub). Its links are kept.
+"""
+
+import argparse
+import uuid
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from urlshortenerapi.core.config import settings
+from urlshortenerapi.core.redis import get_redis_client
+from urlshortenerapi.services.api_key_cache import revoke_api_key
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--id", required=True, type=uuid.UUID)
+    args = parser.parse_args()
+
+    engine = create_engine(settings.database_url)
+    with Session(engine) as session:
+        revoked = revoke_api_key(get_redis_client(), session, args.id)
+
+    print("Revoked." if revoked else "No active API key with that id.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""
+Ops utility: preload the most clicked links into the Redis link cache.
+
+Run after a Redis restart or flush, or as a deploy step, so the first
+wave of redirects does not fall through to Postgres. Workers warm their
+own local caches at startup (CACHE_WARMUP_LINKS).
+"""
+
+import argparse
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from urlshortenerapi.core.config import settings
+from urlshortenerapi.core.redis import get_redis_client
+from urlshortenerapi.services.cache_warmup import WARMUP_BATCH_SIZE, warm_link_cache
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--limit", type=int, default=100_000, help="number of links to warm")
+    parser.add_argument("--batch-size", type=int, default=WARMUP_BATCH_SIZE)
+    args = parser.parse_args()
+
+    engine = create_engine(settings.database_url)
+    started = time.perf_counter()
+    with Session(engine) as session:
+        warmed = warm_link_cache(
+            get_redis_client(), session, args.limit, batch_size=args.batch_size
+        )
+
+    print(f"Warmed {warmed} links in {time.perf_counter() - started:.2f}s.")
+
+
+if __name__ == "__main__":
+    main()
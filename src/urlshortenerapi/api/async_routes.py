@@ -0,0 +1,286 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from typing import Literal
+
+from fastapi import APIRouter, status, HTTPException, Depends, Request, Response, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from urlshortenerapi.api.deps import (
+    charge_create_limit_async,
+    create_rate_limiter_async,
+    get_current_api_key_async,
+    require_admin_api_key_async,
+)
+from urlshortenerapi.api.link_service import (
+    BATCH_CODE_ATTEMPTS,
+    CREATE_CODE_ATTEMPTS,
+    RETAINED_FROM,
+    analytics_range,
+    check_batch_size,
+    click_buckets_query,
+    dense_buckets,
+    export_response,
+    fail_pending,
+    insert_ignoring_conflicts_stmt,
+    link_page,
+    link_page_query,
+    link_response,
+    new_link,
+    owned_link_query,
+    owner_analytics_range,
+    plan_batch,
+    record_aliased,
+    record_generated,
+    require_owned_link,
+    set_create_limit_headers,
+)
+from urlshortenerapi.core.profiling import profiler, request_profile_window_async
+from urlshortenerapi.core.redis import get_async_redis_client
+from urlshortenerapi.db.models import Link
+from urlshortenerapi.db.session import get_async_db, get_async_sessionmaker
+from urlshortenerapi.services.api_key_cache import ApiKeyPrincipal
+from urlshortenerapi.services.code_allocator import get_code_allocator
+from urlshortenerapi.services.link_cache import invalidate_link_async, register_new_codes_async
+from urlshortenerapi.services.link_export import gzip_chunks_async, iter_export_async
+from urlshortenerapi.services.unique_visitors import (
+    count_link_visitors_async,
+    count_owner_visitors_async,
+    daily_link_visitors_async,
+    day_key,
+    retained_days,
+)
+from urlshortenerapi.schemas.admin import ProfileWindowRequest, ProfileWindowResponse
+from urlshortenerapi.schemas.links import (
+    BatchCreateLinksRequest,
+    BatchCreateLinksResponse,
+    CreateLinkRequest,
+    LinkResponse,
+    LinkStatsResponse,
+    LinkListResponse,
+    PatchLinkRequest,
+    LinkAnalyticsResponse,
+    OwnerAnalyticsResponse,
+)
+
+# The management API for ASYNC_MODE: the same paths, status codes and
+# bodies as api.routes, served on the event loop with redis.asyncio and
+# AsyncSession. Queries and response shapes come from api.link_service, so
+# only the awaits differ.
+router = APIRouter(prefix="/api/v1")
+
+
+@router.post("/links", response_model=LinkResponse, status_code=status.HTTP_201_CREATED)
+async def create_link(
+    req: CreateLinkRequest,
+    request: Request,
+    response: Response,
+    _: None = Depends(create_rate_limiter_async),
+    db: AsyncSession = Depends(get_async_db),
+    api_key: ApiKeyPrincipal = Depends(get_current_api_key_async),
+):
+    set_create_limit_headers(request, response)
+    base_url = str(request.base_url).rstrip("/")
+    r = get_async_redis_client()
+
+    if req.custom_alias is not None:
+        link = new_link(req, req.custom_alias, api_key.id)
+        db.add(link)
+        try:
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            raise HTTPException(status_code=409, detail="Alias already taken")
+        await db.refresh(link)
+        await register_new_codes_async(r, [link.code])
+        return link_response(link, base_url)
+
+    allocator = get_code_allocator()
+    for _ in range(CREATE_CODE_ATTEMPTS):
+        link = new_link(req, await allocator.next_code_async(), api_key.id)
+        db.add(link)
+        try:
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            continue
+        await db.refresh(link)
+        await register_new_codes_async(r, [link.code])
+        return link_response(link, base_url)
+
+    raise HTTPException(status_code=500, detail="Failed to generate unique short code")
+
+
+async def _insert_ignoring_conflicts(db: AsyncSession, rows: list[dict]) -> dict:
+    if not rows:
+        return {}
+    result = await db.execute(insert_ignoring_conflicts_stmt(rows))
+    return {row.code: row for row in result}
+
+
+@router.post("/links:batch", response_model=BatchCreateLinksResponse)
+async def create_links_batch(
+    body: BatchCreateLinksRequest,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    api_key: ApiKeyPrincipal = Depends(get_current_api_key_async),
+):
+    """Same contract as the sync create_links_batch."""
+    plan = plan_batch(body, api_key.id)
+    check_batch_size(plan.cost)
+
+    await charge_create_limit_async(request, api_key, cost=plan.cost)
+    set_create_limit_headers(request, response)
+
+    base_url = str(request.base_url).rstrip("/")
+
+    inserted = await _insert_ignoring_conflicts(db, list(plan.aliased.values()))
+    record_aliased(plan, inserted, base_url)
+    new_codes = list(inserted)
+
+    allocator = get_code_allocator()
+    taken = {row["code"] for row in plan.aliased.values()}
+    for _ in range(BATCH_CODE_ATTEMPTS):
+        if not plan.generated:
+            break
+        for row in plan.generated.values():
+            code = await allocator.next_code_async()
+            while code in taken:
+                code = await allocator.next_code_async()
+            taken.add(code)
+            row["code"] = code
+
+        inserted = await _insert_ignoring_conflicts(db, list(plan.generated.values()))
+        record_generated(plan, inserted, base_url)
+        new_codes.extend(inserted)
+
+    fail_pending(plan)
+
+    await db.commit()
+    if new_codes:
+        await register_new_codes_async(get_async_redis_client(), new_codes)
+
+    return BatchCreateLinksResponse(items=plan.results)
+
+
+@router.get("/links", response_model=LinkListResponse)
+async def list_links(
+    limit: int = Query(50, ge=1, le=100),
+    cursor: str | None = None,
+    db: AsyncSession = Depends(get_async_db),
+    api_key: ApiKeyPrincipal = Depends(get_current_api_key_async),
+):
+    rows = (await db.scalars(link_page_query(api_key.id, limit, cursor))).all()
+    return link_page(rows, limit)
+
+
+@router.get("/links/export", response_class=StreamingResponse)
+async def export_links(
+    format: Literal["ndjson", "csv"] = Query("ndjson"),
+    gzip: bool = Query(False),
+    api_key: ApiKeyPrincipal = Depends(get_current_api_key_async),
+):
+    body = iter_export_async(get_async_sessionmaker(), api_key.id, format)
+    return export_response(body, format, gzip, gzip_chunks_async)
+
+
+async def _owned_link(db: AsyncSession, code: str, api_key: ApiKeyPrincipal) -> Link:
+    return require_owned_link((await db.scalars(owned_link_query(code, api_key.id))).first())
+
+
+@router.get("/links/{code}", response_model=LinkStatsResponse)
+async def get_link_stats(
+    code: str,
+    db: AsyncSession = Depends(get_async_db),
+    api_key: ApiKeyPrincipal = Depends(get_current_api_key_async),
+):
+    return await _owned_link(db, code, api_key)
+
+
+@router.get("/links/{code}/analytics", response_model=LinkAnalyticsResponse)
+async def get_link_analytics(
+    code: str,
+    from_: datetime | None = Query(default=None, alias="from"),
+    to: datetime | None = Query(default=None),
+    granularity: Literal["hour", "day"] | None = Query(default=None),
+    db: AsyncSession = Depends(get_async_db),
+    api_key: ApiKeyPrincipal = Depends(get_current_api_key_async),
+):
+    link = await _owned_link(db, code, api_key)
+
+    r = get_async_redis_client()
+    response = LinkAnalyticsResponse(
+        click_count=int(link.click_count),
+        last_accessed_at=link.last_accessed_at,
+    )
+    if from_ is None and to is None and granularity is None:
+        now = datetime.now(timezone.utc)
+        response.unique_visitors = await count_link_visitors_async(r, link.code, RETAINED_FROM, now)
+        return response
+
+    start, end, granularity = analytics_range(from_, to, granularity)
+    rows = (await db.execute(click_buckets_query(link.id, granularity, start, end))).all()
+    response.granularity = granularity
+    response.buckets = dense_buckets(rows, granularity, start, end)
+    response.unique_visitors = await count_link_visitors_async(r, link.code, start, end)
+
+    if granularity == "day":
+        per_day = await daily_link_visitors_async(r, link.code, retained_days(start, end))
+        for bucket in response.buckets:
+            bucket.unique_visitors = per_day.get(day_key(bucket.start))
+    return response
+
+
+@router.get("/analytics", response_model=OwnerAnalyticsResponse)
+async def get_owner_analytics(
+    from_: datetime | None = Query(default=None, alias="from"),
+    to: datetime | None = Query(default=None),
+    api_key: ApiKeyPrincipal = Depends(get_current_api_key_async),
+):
+    start, end = owner_analytics_range(from_, to)
+    return OwnerAnalyticsResponse(
+        unique_visitors=await count_owner_visitors_async(
+            get_async_redis_client(), str(api_key.id), start, end
+        )
+    )
+
+
+@router.patch("/links/{code}", response_model=LinkStatsResponse)
+async def patch_link(
+    code: str,
+    req: PatchLinkRequest,
+    db: AsyncSession = Depends(get_async_db),
+    api_key: ApiKeyPrincipal = Depends(get_current_api_key_async),
+):
+    link = await _owned_link(db, code, api_key)
+
+    link.is_active = req.is_active
+    await db.commit()
+    await db.refresh(link)
+
+    await invalidate_link_async(get_async_redis_client(), code)
+
+    return link
+
+
+@router.post(
+    "/admin/profile",
+    response_model=ProfileWindowResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def start_profile_window(
+    req: ProfileWindowRequest | None = None,
+    api_key: ApiKeyPrincipal = Depends(require_admin_api_key_async),
+):
+    req = req or ProfileWindowRequest()
+    fmt = req.format or profiler.format
+    workers = await request_profile_window_async(get_async_redis_client(), req.seconds, fmt)
+    if workers == 0:
+        workers = int(profiler.start_window(req.seconds, fmt))
+
+    return ProfileWindowResponse(
+        seconds=req.seconds, format=fmt, workers=workers, directory=profiler.directory
+    )
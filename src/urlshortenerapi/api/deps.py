@@ -3,21 +3,52 @@ from __future__ import annotations
 from fastapi import Depends, HTTPException, Request
 from redis import Redis
 
+from urlshortenerapi.core.config import settings
+from urlshortenerapi.core.metrics import RATE_LIMIT_DECISIONS
 from urlshortenerapi.core.redis import get_redis_client
-from urlshortenerapi.services.rate_limiter import check_rate_limit, check_token_bucket
+from urlshortenerapi.services.prelimiter import PRELIMIT_DENY, PRELIMIT_LOCAL, LocalPreLimiter
+from urlshortenerapi.services.rate_limiter import (
+    GCRA,
+    TOKEN_BUCKET,
+    RateLimitDecision,
+    RateLimitRule,
+    get_async_rate_limiter,
+    get_rate_limiter,
+)
 
 import os
 
 import hashlib
 from fastapi import Header
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from urlshortenerapi.db.session import get_db
-from urlshortenerapi.db.models import ApiKey
+from urlshortenerapi.core.redis import get_async_redis_client
+from urlshortenerapi.db.session import get_async_db, get_db
+from urlshortenerapi.services.api_key_cache import (
+    ApiKeyPrincipal,
+    resolve_api_key,
+    resolve_api_key_async,
+)
 
 
 REDIRECT_LIMIT = int(os.getenv("REDIRECT_LIMIT", "60"))
 REDIRECT_WINDOW = int(os.getenv("REDIRECT_WINDOW", "60"))
+REDIRECT_KEY_PREFIX = "rl:redirect:"
+
+redirect_prelimiter = (
+    LocalPreLimiter(
+        key_prefix=REDIRECT_KEY_PREFIX,
+        limit=REDIRECT_LIMIT,
+        window_seconds=REDIRECT_WINDOW,
+        burst=settings.redirect_prelimit_burst,
+    )
+    if settings.redirect_prelimit
+    else None
+)
+
+_PRELIMIT_ALLOWED = RATE_LIMIT_DECISIONS.labels("redirect_local", "allow")
+_PRELIMIT_DENIED = RATE_LIMIT_DECISIONS.labels("redirect_local", "deny")
 
 
 def get_client_ip(request: Request) -> str:
@@ -26,24 +57,40 @@ def get_client_ip(request: Request) -> str:
     return request.client.host if request.client else "unknown"
 
 
-def redirect_rate_limiter(
-    request: Request,
-    r: Redis = Depends(get_redis_client),
-) -> None:
-    ip = get_client_ip(request)
-    key = f"rl:redirect:{ip}"
+async def redirect_rate_limiter(request: Request) -> RateLimitRule | None:
+    """
+    Per-IP fixed-window limit for GET /{code}.
+    Returns the rule only; the redirect engine enforces it in the same
+    Redis round trip as the click increment. Declared async (no I/O) so
+    FastAPI does not dispatch it to the threadpool.
+    """
+    return redirect_rate_limit_rule(get_client_ip(request))
 
-    result = check_rate_limit(r, key=key, limit=REDIRECT_LIMIT, window_seconds=REDIRECT_WINDOW)
 
-    # Optional: include headers so clients can see remaining + reset
-    request.state.rate_limit_remaining = result.remaining
-    request.state.rate_limit_reset = result.reset_seconds
+def redirect_rate_limit_rule(ip: str) -> RateLimitRule | None:
+    """
+    The rule the redirect script should enforce for this client, or None
+    when the local pre-limiter already admitted the hit (it is counted in
+    Redis on the next sync). Raises 429 when the pre-limiter knows the
+    client is over quota.
+    """
+    if redirect_prelimiter is not None:
+        verdict = redirect_prelimiter.admit(ip)
+        if verdict.decision == PRELIMIT_LOCAL:
+            _PRELIMIT_ALLOWED.inc()
+            return None
+        if verdict.decision == PRELIMIT_DENY:
+            _PRELIMIT_DENIED.inc()
+            raise HTTPException(
+                status_code=429,
+                detail=f"Rate limit exceeded. Try again in {verdict.retry_after}s.",
+            )
 
-    if not result.allowed:
-        raise HTTPException(
-            status_code=429,
-            detail=f"Rate limit exceeded. Try again in {result.reset_seconds}s.",
-        )
+    return RateLimitRule(
+        key=f"{REDIRECT_KEY_PREFIX}{ip}",
+        limit=REDIRECT_LIMIT,
+        window_seconds=REDIRECT_WINDOW,
+    )
 
 
 def hash_api_key(raw_key: str) -> str:
@@ -53,14 +100,20 @@ def hash_api_key(raw_key: str) -> str:
 
 def get_current_api_key(
     db: Session = Depends(get_db),
+    r: Redis = Depends(get_redis_client),
     x_api_key: str | None = Header(default=None, alias="X-API-Key"),
-) -> ApiKey:
+) -> ApiKeyPrincipal:
+    """
+    Resolved through the API key cache; Postgres is only asked on a cold
+    miss. FastAPI caches dependencies per request, so routes that also use
+    create_rate_limiter still resolve the key once.
+    """
     if not x_api_key:
         raise HTTPException(status_code=401, detail="Missing X-API-Key")
 
     key_hash = hash_api_key(x_api_key)
 
-    api_key = db.query(ApiKey).filter(ApiKey.key_hash == key_hash).first()
+    api_key = resolve_api_key(r, db, key_hash)
     if api_key is None:
         # Do not reveal whether a key exists; same error for missing/invalid
         raise HTTPException(status_code=401, detail="Invalid API key")
@@ -68,40 +121,139 @@ def get_current_api_key(
     return api_key
 
 
+async def get_current_api_key_async(
+    db: AsyncSession = Depends(get_async_db),
+    x_api_key: str | None = Header(default=None, alias="X-API-Key"),
+) -> ApiKeyPrincipal:
+    """get_current_api_key for the ASYNC_MODE routes."""
+    if not x_api_key:
+        raise HTTPException(status_code=401, detail="Missing X-API-Key")
+
+    api_key = await resolve_api_key_async(get_async_redis_client(), db, hash_api_key(x_api_key))
+    if api_key is None:
+        raise HTTPException(status_code=401, detail="Invalid API key")
+
+    return api_key
+
+
+def _admin_api_key_ids() -> set[str]:
+    return {part.strip().lower() for part in settings.admin_api_key_ids.split(",") if part.strip()}
+
+
+def require_admin_api_key(
+    api_key: ApiKeyPrincipal = Depends(get_current_api_key),
+) -> ApiKeyPrincipal:
+    """An authenticated key listed in ADMIN_API_KEY_IDS; 403 for any other key."""
+    if str(api_key.id) not in _admin_api_key_ids():
+        raise HTTPException(status_code=403, detail="Admin API key required")
+    return api_key
+
+
+async def require_admin_api_key_async(
+    api_key: ApiKeyPrincipal = Depends(get_current_api_key_async),
+) -> ApiKeyPrincipal:
+    if str(api_key.id) not in _admin_api_key_ids():
+        raise HTTPException(status_code=403, detail="Admin API key required")
+    return api_key
+
+
 def create_rate_limiter(
     request: Request,
-    api_key: ApiKey = Depends(get_current_api_key),
-    r: Redis = Depends(get_redis_client),
+    api_key: ApiKeyPrincipal = Depends(get_current_api_key),
 ) -> None:
     """
     Per-API-key token bucket limiter for POST /api/v1/links.
     Runtime env read so tests and deployments can change limits without reload.
     """
-    create_limit = int(os.getenv("CREATE_LIMIT", "60"))
+    charge_create_limit(request, api_key, cost=1)
+
+
+async def create_rate_limiter_async(
+    request: Request,
+    api_key: ApiKeyPrincipal = Depends(get_current_api_key_async),
+) -> None:
+    await charge_create_limit_async(request, api_key, cost=1)
+
+
+def create_limit_capacity() -> int:
+    return int(os.getenv("CREATE_LIMIT", "60"))
+
+
+def create_global_limit() -> int:
+    return int(os.getenv("CREATE_GLOBAL_LIMIT", "0"))
+
+
+def create_batch_capacity() -> int:
+    """
+    Largest batch the create limits can ever admit at once: the per-key
+    bucket size, or the global limit's burst if that is smaller.
+    """
+    capacity = create_limit_capacity()
+    global_limit = create_global_limit()
+    return min(capacity, global_limit) if global_limit > 0 else capacity
+
+
+def charge_create_limit(request: Request, api_key: ApiKeyPrincipal, cost: int) -> None:
+    """
+    Take `cost` tokens from the API key's create bucket (batch creates pay
+    one token per item). Stores the limit headers on request.state and
+    raises 429 when the bucket is short.
+
+    CREATE_GLOBAL_LIMIT (creates per CREATE_WINDOW across all keys, 0 = off)
+    is checked in the same Redis call.
+    """
+    rules = _create_limit_rules(api_key, cost)
+    _apply_create_decision(request, get_rate_limiter().check(rules))
+
+
+async def charge_create_limit_async(request: Request, api_key: ApiKeyPrincipal, cost: int) -> None:
+    """charge_create_limit through the async rate limiter."""
+    rules = _create_limit_rules(api_key, cost)
+    _apply_create_decision(request, await get_async_rate_limiter().check(rules))
+
+
+def _create_limit_rules(api_key: ApiKeyPrincipal, cost: int) -> list[RateLimitRule]:
     create_window = int(os.getenv("CREATE_WINDOW", "60"))
+    global_limit = create_global_limit()
 
-    key = f"rate:create:{api_key.id}"
+    rules = [
+        RateLimitRule(
+            key=f"rate:create:{api_key.id}",
+            limit=create_limit_capacity(),
+            window_seconds=create_window,
+            algorithm=TOKEN_BUCKET,
+            cost=cost,
+        )
+    ]
+    if global_limit > 0:
+        rules.append(
+            RateLimitRule(
+                key="rate:create:global",
+                limit=global_limit,
+                window_seconds=create_window,
+                algorithm=GCRA,
+                cost=cost,
+            )
+        )
+    return rules
 
-    result = check_token_bucket(
-        r,
-        key=key,
-        capacity=create_limit,
-        window_seconds=create_window,
-        cost=1,
-        ttl_seconds=create_window * 2,
-    )
+
+def _apply_create_decision(request: Request, decision: RateLimitDecision) -> None:
+    result = decision.outcomes[0]
+    create_limit = result.rule.limit
+    RATE_LIMIT_DECISIONS.labels("create", "allow" if decision.allowed else "deny").inc()
 
     # Store for route to set headers on success
     request.state.create_rl_limit = create_limit
     request.state.create_rl_remaining = result.remaining
-    request.state.create_rl_retry_after = result.retry_after
+    request.state.create_rl_retry_after = decision.retry_after
 
-    if not result.allowed:
+    if not decision.allowed:
         raise HTTPException(
             status_code=429,
-            detail=f"Too many create requests. Try again in {result.retry_after} seconds.",
+            detail=f"Too many create requests. Try again in {decision.retry_after} seconds.",
             headers={
-                "Retry-After": str(result.retry_after),
+                "Retry-After": str(decision.retry_after),
                 "X-RateLimit-Limit": str(create_limit),
                 "X-RateLimit-Remaining": str(result.remaining),
             },
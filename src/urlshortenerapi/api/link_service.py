@@ -0,0 +1,351 @@
+from __future__ import annotations
+
+import base64
+import uuid
+from datetime import datetime, timezone, timedelta
+from typing import NamedTuple
+
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import func, literal, literal_column, select, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from urlshortenerapi.api.deps import create_batch_capacity
+from urlshortenerapi.core.errors import STATUS_TO_ERROR_CODE
+from urlshortenerapi.db.models import Link, LinkClickHourly
+from urlshortenerapi.services.link_export import EXPORT_MEDIA_TYPES
+from urlshortenerapi.schemas.links import (
+    BatchCreateLinkResult,
+    BatchCreateLinksRequest,
+    BatchItemError,
+    ClickBucket,
+    CreateLinkRequest,
+    LinkListItem,
+    LinkListResponse,
+    LinkResponse,
+)
+
+# Queries, validation and response shapes of the management API, shared by
+# the sync router (api.routes) and the ASYNC_MODE router (api.async_routes).
+# Nothing here does I/O, so each router only adds its own awaits.
+
+CREATE_CODE_ATTEMPTS = 10
+BATCH_CODE_ATTEMPTS = 10
+
+
+def encode_cursor(created_at: datetime, link_id) -> str:
+    raw = f"{created_at.isoformat()}|{str(link_id)}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("utf-8")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("utf-8")).decode("utf-8")
+        ts_s, id_s = raw.split("|", 1)
+        return datetime.fromisoformat(ts_s), uuid.UUID(id_s)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _expires_at(req: CreateLinkRequest, now: datetime) -> datetime | None:
+    if getattr(req, "expires_in_seconds", None) is None:
+        return None
+    return now + timedelta(seconds=req.expires_in_seconds)
+
+
+def _normalize_max_clicks(req: CreateLinkRequest) -> int | None:
+    # 0 => unlimited => store None
+    if req.max_clicks is None or req.max_clicks == 0:
+        return None
+    return req.max_clicks
+
+
+def link_response(link, base_url: str) -> LinkResponse:
+    return LinkResponse(
+        code=link.code,
+        short_url=f"{base_url}/{link.code}",
+        long_url=link.long_url,
+        created_at=link.created_at,
+        expires_at=link.expires_at,
+        is_active=link.is_active,
+        max_clicks=link.max_clicks,
+    )
+
+
+def new_link(req: CreateLinkRequest, code: str, owner_id) -> Link:
+    now = datetime.now(timezone.utc)
+    return Link(
+        code=code,
+        long_url=str(req.url),
+        created_at=now,
+        expires_at=_expires_at(req, now),
+        max_clicks=_normalize_max_clicks(req),
+        owner_api_key_id=owner_id,
+    )
+
+
+def set_create_limit_headers(request: Request, response: Response) -> None:
+    # set headers using what deps.py stored
+    response.headers["X-RateLimit-Limit"] = str(request.state.create_rl_limit)
+    response.headers["X-RateLimit-Remaining"] = str(request.state.create_rl_remaining)
+
+
+def insert_ignoring_conflicts_stmt(rows: list[dict]):
+    """
+    Multi-row INSERT ... ON CONFLICT (code) DO NOTHING RETURNING. Rows that
+    collided are absent from the result.
+    """
+    return (
+        pg_insert(Link)
+        .values(rows)
+        .on_conflict_do_nothing(index_elements=[Link.code])
+        .returning(
+            Link.code,
+            Link.long_url,
+            Link.created_at,
+            Link.expires_at,
+            Link.is_active,
+            Link.max_clicks,
+        )
+    )
+
+
+def _batch_error(index: int, status_code: int, message: str) -> BatchCreateLinkResult:
+    return BatchCreateLinkResult(
+        index=index,
+        error=BatchItemError(code=STATUS_TO_ERROR_CODE[status_code], message=message),
+    )
+
+
+def _validation_message(exc: ValidationError) -> str:
+    err = exc.errors()[0]
+    loc = ".".join(str(part) for part in err["loc"])
+    return f"{loc}: {err['msg']}" if loc else err["msg"]
+
+
+def check_batch_size(cost: int) -> None:
+    capacity = create_batch_capacity()
+    if cost > capacity:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch of {cost} items exceeds the create limit of {capacity} per window",
+        )
+
+
+class BatchPlan(NamedTuple):
+    # One slot per item, in input order; filled as items fail or are created
+    results: list[BatchCreateLinkResult | None]
+    aliased: dict[int, dict]
+    generated: dict[int, dict]
+
+    @property
+    def cost(self) -> int:
+        # One create token per item that passed validation
+        return len(self.aliased) + len(self.generated)
+
+
+def plan_batch(body: BatchCreateLinksRequest, owner_id) -> BatchPlan:
+    """
+    Validate every item and build its row. Invalid items and repeated
+    aliases get their error result here; the rest are split into rows with
+    a custom alias and rows that still need a generated code.
+    """
+    now = datetime.now(timezone.utc)
+    plan = BatchPlan(results=[None] * len(body.items), aliased={}, generated={})
+    seen_aliases: set[str] = set()
+
+    for i, raw in enumerate(body.items):
+        try:
+            req = CreateLinkRequest.model_validate(raw)
+        except ValidationError as exc:
+            plan.results[i] = _batch_error(i, 422, _validation_message(exc))
+            continue
+
+        row = {
+            "id": uuid.uuid4(),
+            "long_url": str(req.url),
+            "created_at": now,
+            "expires_at": _expires_at(req, now),
+            "max_clicks": _normalize_max_clicks(req),
+            "owner_api_key_id": owner_id,
+        }
+        if req.custom_alias is None:
+            plan.generated[i] = row
+        elif req.custom_alias in seen_aliases:
+            plan.results[i] = _batch_error(i, 409, "Alias already taken")
+        else:
+            seen_aliases.add(req.custom_alias)
+            plan.aliased[i] = {**row, "code": req.custom_alias}
+    return plan
+
+
+def _batch_created(i: int, row, base_url: str) -> BatchCreateLinkResult:
+    return BatchCreateLinkResult(index=i, link=link_response(row, base_url))
+
+
+def record_aliased(plan: BatchPlan, inserted: dict, base_url: str) -> None:
+    for i, row in plan.aliased.items():
+        hit = inserted.get(row["code"])
+        plan.results[i] = (
+            _batch_created(i, hit, base_url) if hit else _batch_error(i, 409, "Alias already taken")
+        )
+
+
+def record_generated(plan: BatchPlan, inserted: dict, base_url: str) -> None:
+    """Fill in the generated rows that were inserted; collided ones stay pending."""
+    for i, row in list(plan.generated.items()):
+        hit = inserted.get(row["code"])
+        if hit:
+            plan.results[i] = _batch_created(i, hit, base_url)
+            del plan.generated[i]
+
+
+def fail_pending(plan: BatchPlan) -> None:
+    for i in plan.generated:
+        plan.results[i] = _batch_error(i, 500, "Failed to generate unique short code")
+
+
+def link_page_query(owner_id, limit: int, cursor: str | None):
+    """One page of the owner's links, newest first, plus one row to detect a next page."""
+    stmt = (
+        select(Link)
+        .where(Link.owner_api_key_id == owner_id)
+        .order_by(Link.created_at.desc(), Link.id.desc())
+    )
+
+    if cursor is not None:
+        # Row-value comparison: a single range bound on
+        # ix_links_owner_created_id, unlike the equivalent OR expression
+        cursor_created_at, cursor_id = decode_cursor(cursor)
+        stmt = stmt.where(
+            tuple_(Link.created_at, Link.id)
+            < tuple_(
+                literal(cursor_created_at, Link.created_at.type),
+                literal(cursor_id, Link.id.type),
+            )
+        )
+
+    return stmt.limit(limit + 1)
+
+
+def link_page(rows, limit: int) -> LinkListResponse:
+    has_next = len(rows) > limit
+    items = rows[:limit]
+
+    next_cursor = None
+    if has_next and items:
+        last = items[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+
+    return LinkListResponse(
+        items=[LinkListItem.model_validate(x) for x in items],
+        next_cursor=next_cursor,
+    )
+
+
+def export_response(body, format: str, gzip: bool, compress) -> StreamingResponse:
+    filename = f"links.{format}"
+    media_type = EXPORT_MEDIA_TYPES[format]
+    if gzip:
+        body = compress(body)
+        filename += ".gz"
+        media_type = "application/gzip"
+
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+def owned_link_query(code: str, owner_id):
+    return select(Link).where(Link.code == code, Link.owner_api_key_id == owner_id).limit(1)
+
+
+def require_owned_link(link: Link | None) -> Link:
+    if link is None:
+        # 404 prevents leaking link existence across tenants
+        raise HTTPException(status_code=404, detail="Link not found")
+    return link
+
+
+_BUCKET_STEPS = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+_DEFAULT_RANGES = {"hour": timedelta(hours=24), "day": timedelta(days=30)}
+ANALYTICS_MAX_BUCKETS = 1000
+
+
+def _as_utc(dt: datetime) -> datetime:
+    # Naive timestamps are taken as UTC
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+
+
+def _bucket_start(dt: datetime, granularity: str) -> datetime:
+    dt = dt.replace(minute=0, second=0, microsecond=0)
+    return dt.replace(hour=0) if granularity == "day" else dt
+
+
+# Earlier than any retained day; retained_days() clamps it to the window
+RETAINED_FROM = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def analytics_range(
+    from_: datetime | None, to: datetime | None, granularity: str | None
+) -> tuple[datetime, datetime, str]:
+    granularity = granularity or "hour"
+    end = _as_utc(to) if to is not None else datetime.now(timezone.utc)
+    start = _as_utc(from_) if from_ is not None else end - _DEFAULT_RANGES[granularity]
+    start = _bucket_start(start, granularity)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="'from' must be before 'to'")
+    if (end - start) / _BUCKET_STEPS[granularity] > ANALYTICS_MAX_BUCKETS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Range covers more than {ANALYTICS_MAX_BUCKETS} {granularity} buckets",
+        )
+    return start, end, granularity
+
+
+def click_buckets_query(link_id, granularity: str, start: datetime, end: datetime):
+    """
+    Clicks per bucket in [start, end), read from the hourly rollups. Clicks
+    still buffered in Redis (up to one flush interval) are not included yet.
+    """
+    if granularity == "day":
+        # Inline literals so the SELECT and GROUP BY expressions match exactly
+        bucket = func.date_trunc(
+            literal_column("'day'"), LinkClickHourly.bucket, literal_column("'UTC'")
+        )
+    else:
+        bucket = LinkClickHourly.bucket
+
+    return (
+        select(bucket.label("start"), func.sum(LinkClickHourly.clicks).label("clicks"))
+        .where(
+            LinkClickHourly.link_id == link_id,
+            LinkClickHourly.bucket >= start,
+            LinkClickHourly.bucket < end,
+        )
+        .group_by(bucket)
+    )
+
+
+def dense_buckets(rows, granularity: str, start: datetime, end: datetime) -> list[ClickBucket]:
+    """The click_buckets_query rows as a series with empty buckets filled in."""
+    counts = {row.start: int(row.clicks) for row in rows}
+
+    step = _BUCKET_STEPS[granularity]
+    out = []
+    t = start
+    while t < end:
+        out.append(ClickBucket(start=t, clicks=counts.get(t, 0)))
+        t += step
+    return out
+
+
+def owner_analytics_range(from_: datetime | None, to: datetime | None) -> tuple[datetime, datetime]:
+    end = _as_utc(to) if to is not None else datetime.now(timezone.utc)
+    start = _as_utc(from_) if from_ is not None else RETAINED_FROM
+    if start >= end:
+        raise HTTPException(status_code=400, detail="'from' must be before 'to'")
+    return start, end
@@ -1,49 +1,72 @@
 from __future__ import annotations
 
-import base64
-import secrets
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone
+from typing import Literal
 
 from fastapi import APIRouter, status, HTTPException, Depends, Request, Response, Query
-from sqlalchemy import and_, or_
+from fastapi.responses import StreamingResponse
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from urlshortenerapi.api.deps import get_current_api_key, create_rate_limiter
-from urlshortenerapi.db.models import Link, ApiKey
-from urlshortenerapi.db.session import get_db
+from urlshortenerapi.api.deps import (
+    charge_create_limit,
+    create_rate_limiter,
+    get_current_api_key,
+    require_admin_api_key,
+)
+from urlshortenerapi.api.link_service import (
+    BATCH_CODE_ATTEMPTS,
+    CREATE_CODE_ATTEMPTS,
+    RETAINED_FROM,
+    analytics_range,
+    check_batch_size,
+    click_buckets_query,
+    dense_buckets,
+    export_response,
+    fail_pending,
+    insert_ignoring_conflicts_stmt,
+    link_page,
+    link_page_query,
+    link_response,
+    new_link,
+    owned_link_query,
+    owner_analytics_range,
+    plan_batch,
+    record_aliased,
+    record_generated,
+    require_owned_link,
+    set_create_limit_headers,
+)
+from urlshortenerapi.core.profiling import profiler, request_profile_window
+from urlshortenerapi.core.redis import get_redis_client
+from urlshortenerapi.db.session import SessionLocal, get_db
+from urlshortenerapi.services.api_key_cache import ApiKeyPrincipal
+from urlshortenerapi.services.code_allocator import get_code_allocator
+from urlshortenerapi.services.link_cache import invalidate_link, register_new_codes
+from urlshortenerapi.services.link_export import gzip_chunks, iter_export
+from urlshortenerapi.services.unique_visitors import (
+    count_link_visitors,
+    count_owner_visitors,
+    daily_link_visitors,
+    day_key,
+    retained_days,
+)
+from urlshortenerapi.schemas.admin import ProfileWindowRequest, ProfileWindowResponse
 from urlshortenerapi.schemas.links import (
+    BatchCreateLinksRequest,
+    BatchCreateLinksResponse,
+    ClickBucket,
     CreateLinkRequest,
     LinkResponse,
     LinkStatsResponse,
     LinkListResponse,
-    LinkListItem,
     PatchLinkRequest,
     LinkAnalyticsResponse,
+    OwnerAnalyticsResponse,
 )
 
 router = APIRouter(prefix="/api/v1")
 
-_BASE62_ALPHABET = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
-
-
-def _base62_code(length: int) -> str:
-    return "".join(secrets.choice(_BASE62_ALPHABET) for _ in range(length))
-
-
-def _encode_cursor(created_at: datetime, link_id) -> str:
-    raw = f"{created_at.isoformat()}|{str(link_id)}"
-    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("utf-8")
-
-
-def _decode_cursor(cursor: str) -> tuple[datetime, str]:
-    try:
-        raw = base64.urlsafe_b64decode(cursor.encode("utf-8")).decode("utf-8")
-        ts_s, id_s = raw.split("|", 1)
-        return datetime.fromisoformat(ts_s), id_s
-    except Exception:
-        raise HTTPException(status_code=400, detail="Invalid cursor")
-
 
 @router.post("/links", response_model=LinkResponse, status_code=status.HTTP_201_CREATED)
 def create_link(
@@ -52,32 +75,14 @@ def create_link(
     response: Response,
     _: None = Depends(create_rate_limiter),
     db: Session = Depends(get_db),
-    api_key: ApiKey = Depends(get_current_api_key),
+    api_key: ApiKeyPrincipal = Depends(get_current_api_key),
 ):
-    # set headers using what deps.py stored
-    response.headers["X-RateLimit-Limit"] = str(request.state.create_rl_limit)
-    response.headers["X-RateLimit-Remaining"] = str(request.state.create_rl_remaining)
-
-    # Compute expires_at
-    expires_at = None
-    if getattr(req, "expires_in_seconds", None) is not None:
-        expires_at = datetime.now(timezone.utc) + timedelta(seconds=req.expires_in_seconds)
-
-    # Normalize max_clicks: 0 => unlimited => store None
-    max_clicks = None
-    if hasattr(req, "max_clicks"):
-        max_clicks = None if (req.max_clicks is None or req.max_clicks == 0) else req.max_clicks
+    set_create_limit_headers(request, response)
+    base_url = str(request.base_url).rstrip("/")
 
     # If custom alias is provided, try it once and return 409 on collision
     if getattr(req, "custom_alias", None) is not None:
-        link = Link(
-            code=req.custom_alias,
-            long_url=str(req.url),
-            created_at=datetime.now(timezone.utc),
-            expires_at=expires_at,
-            max_clicks=max_clicks,
-            owner_api_key_id=api_key.id,
-        )
+        link = new_link(req, req.custom_alias, api_key.id)
         db.add(link)
         try:
             db.commit()
@@ -85,117 +90,187 @@ def create_link(
             db.rollback()
             raise HTTPException(status_code=409, detail="Alias already taken")
         db.refresh(link)
-
-        short_url = str(request.base_url).rstrip("/") + f"/{link.code}"
-        return LinkResponse(
-            code=link.code,
-            short_url=short_url,
-            long_url=link.long_url,
-            created_at=link.created_at,
-            expires_at=link.expires_at,
-            is_active=link.is_active,
-            max_clicks=link.max_clicks,
-        )
-
-    # Otherwise generate a random base62 code and retry on collision
-    for _ in range(10):
-        code = _base62_code(7)  # 6–8 chars spec
-
-        link = Link(
-            code=code,
-            long_url=str(req.url),
-            created_at=datetime.now(timezone.utc),
-            expires_at=expires_at,
-            max_clicks=max_clicks,
-            owner_api_key_id=api_key.id,
-        )
+        register_new_codes(get_redis_client(), [link.code])
+        return link_response(link, base_url)
+
+    # Otherwise allocate a code. Allocated codes are unique among themselves;
+    # the retry only covers clashes with aliases or legacy random codes.
+    allocator = get_code_allocator()
+    for _ in range(CREATE_CODE_ATTEMPTS):
+        link = new_link(req, allocator.next_code(), api_key.id)
         db.add(link)
         try:
             db.commit()
-            db.refresh(link)
-            short_url = str(request.base_url).rstrip("/") + f"/{link.code}"
-            return LinkResponse(
-                code=link.code,
-                short_url=short_url,
-                long_url=link.long_url,
-                created_at=link.created_at,
-                expires_at=link.expires_at,
-                is_active=link.is_active,
-                max_clicks=link.max_clicks,
-            )
         except IntegrityError:
             db.rollback()
             continue
+        db.refresh(link)
+        register_new_codes(get_redis_client(), [link.code])
+        return link_response(link, base_url)
 
     raise HTTPException(status_code=500, detail="Failed to generate unique short code")
 
 
+def _insert_ignoring_conflicts(db: Session, rows: list[dict]) -> dict:
+    """
+    Multi-row INSERT ... ON CONFLICT (code) DO NOTHING RETURNING.
+    Returns the inserted rows keyed by code; rows that collided are absent.
+    """
+    if not rows:
+        return {}
+    return {row.code: row for row in db.execute(insert_ignoring_conflicts_stmt(rows))}
+
+
+@router.post("/links:batch", response_model=BatchCreateLinksResponse)
+def create_links_batch(
+    body: BatchCreateLinksRequest,
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db),
+    api_key: ApiKeyPrincipal = Depends(get_current_api_key),
+):
+    """
+    Create many links in one request and one transaction.
+
+    Items are validated individually; results come back in input order,
+    each with either the created link or an error. Custom aliases get one
+    attempt (taken => CONFLICT); generated codes that collide are the only
+    rows regenerated and re-inserted. The batch costs one create token per
+    item that passes validation; items rejected up front are free.
+    """
+    plan = plan_batch(body, api_key.id)
+    check_batch_size(plan.cost)
+
+    r = get_redis_client()
+    charge_create_limit(request, api_key, cost=plan.cost)
+    set_create_limit_headers(request, response)
+
+    base_url = str(request.base_url).rstrip("/")
+
+    inserted = _insert_ignoring_conflicts(db, list(plan.aliased.values()))
+    record_aliased(plan, inserted, base_url)
+    new_codes = list(inserted)
+
+    allocator = get_code_allocator()
+    taken = {row["code"] for row in plan.aliased.values()}
+    for _ in range(BATCH_CODE_ATTEMPTS):
+        if not plan.generated:
+            break
+        for row in plan.generated.values():
+            code = allocator.next_code()
+            while code in taken:
+                code = allocator.next_code()
+            taken.add(code)
+            row["code"] = code
+
+        inserted = _insert_ignoring_conflicts(db, list(plan.generated.values()))
+        record_generated(plan, inserted, base_url)
+        new_codes.extend(inserted)
+
+    fail_pending(plan)
+
+    db.commit()
+    if new_codes:
+        register_new_codes(r, new_codes)
+
+    return BatchCreateLinksResponse(items=plan.results)
+
+
 @router.get("/links", response_model=LinkListResponse)
 def list_links(
     limit: int = Query(50, ge=1, le=100),
     cursor: str | None = None,
     db: Session = Depends(get_db),
-    api_key: ApiKey = Depends(get_current_api_key),
+    api_key: ApiKeyPrincipal = Depends(get_current_api_key),
 ):
-    q = (
-        db.query(Link)
-        .filter(Link.owner_api_key_id == api_key.id)
-        .order_by(Link.created_at.desc(), Link.id.desc())
-    )
+    rows = db.scalars(link_page_query(api_key.id, limit, cursor)).all()
+    return link_page(rows, limit)
 
-    if cursor is not None:
-        cursor_created_at, cursor_id = _decode_cursor(cursor)
-        q = q.filter(
-            or_(
-                Link.created_at < cursor_created_at,
-                and_(Link.created_at == cursor_created_at, Link.id < cursor_id),
-            )
-        )
-
-    rows = q.limit(limit + 1).all()
-    has_next = len(rows) > limit
-    items = rows[:limit]
-
-    next_cursor = None
-    if has_next and items:
-        last = items[-1]
-        next_cursor = _encode_cursor(last.created_at, last.id)
-
-    return LinkListResponse(
-        items=[LinkListItem.model_validate(x) for x in items],
-        next_cursor=next_cursor,
-    )
+
+@router.get("/links/export", response_class=StreamingResponse)
+def export_links(
+    format: Literal["ndjson", "csv"] = Query("ndjson"),
+    gzip: bool = Query(False),
+    api_key: ApiKeyPrincipal = Depends(get_current_api_key),
+):
+    """
+    Stream every link the caller owns, newest first, in one response.
+    Rows are read from a server-side cursor and written as they arrive,
+    so memory use does not depend on how many links there are.
+    """
+    return export_response(iter_export(SessionLocal, api_key.id, format), format, gzip, gzip_chunks)
 
 
 @router.get("/links/{code}", response_model=LinkStatsResponse)
 def get_link_stats(
     code: str,
     db: Session = Depends(get_db),
-    api_key: ApiKey = Depends(get_current_api_key),
+    api_key: ApiKeyPrincipal = Depends(get_current_api_key),
 ):
-    link = db.query(Link).filter(Link.code == code, Link.owner_api_key_id == api_key.id).first()
+    return require_owned_link(db.scalars(owned_link_query(code, api_key.id)).first())
 
-    if link is None:
-        raise HTTPException(status_code=404, detail="Link not found")
 
-    return link
+def _click_buckets(
+    db: Session, link_id, granularity: str, start: datetime, end: datetime
+) -> list[ClickBucket]:
+    """Dense series of clicks per bucket in [start, end)."""
+    rows = db.execute(click_buckets_query(link_id, granularity, start, end)).all()
+    return dense_buckets(rows, granularity, start, end)
 
 
 @router.get("/links/{code}/analytics", response_model=LinkAnalyticsResponse)
 def get_link_analytics(
     code: str,
+    from_: datetime | None = Query(default=None, alias="from"),
+    to: datetime | None = Query(default=None),
+    granularity: Literal["hour", "day"] | None = Query(default=None),
     db: Session = Depends(get_db),
-    api_key: ApiKey = Depends(get_current_api_key),
+    api_key: ApiKeyPrincipal = Depends(get_current_api_key),
 ):
-    link = db.query(Link).filter(Link.code == code, Link.owner_api_key_id == api_key.id).first()
-    if link is None:
-        # 404 prevents leaking cross-tenant existence
-        raise HTTPException(status_code=404, detail="Link not found")
-
-    return LinkAnalyticsResponse(
+    """
+    Lifetime totals, plus clicks per hour or day when a range is asked for.
+    `to` defaults to now and `from` to 24 hours (hour) or 30 days (day)
+    before it; the range is [from, to) in UTC buckets.
+    """
+    link = require_owned_link(db.scalars(owned_link_query(code, api_key.id)).first())
+
+    r = get_redis_client()
+    response = LinkAnalyticsResponse(
         click_count=int(link.click_count),
         last_accessed_at=link.last_accessed_at,
     )
+    if from_ is None and to is None and granularity is None:
+        now = datetime.now(timezone.utc)
+        response.unique_visitors = count_link_visitors(r, link.code, RETAINED_FROM, now)
+        return response
+
+    start, end, granularity = analytics_range(from_, to, granularity)
+    response.granularity = granularity
+    response.buckets = _click_buckets(db, link.id, granularity, start, end)
+    response.unique_visitors = count_link_visitors(r, link.code, start, end)
+
+    if granularity == "day":
+        per_day = daily_link_visitors(r, link.code, retained_days(start, end))
+        for bucket in response.buckets:
+            bucket.unique_visitors = per_day.get(day_key(bucket.start))
+    return response
+
+
+@router.get("/analytics", response_model=OwnerAnalyticsResponse)
+def get_owner_analytics(
+    from_: datetime | None = Query(default=None, alias="from"),
+    to: datetime | None = Query(default=None),
+    api_key: ApiKeyPrincipal = Depends(get_current_api_key),
+):
+    """
+    Distinct visitors across all of the caller's links in [from, to),
+    defaulting to the whole retention window. Answered from per-owner
+    daily HyperLogLogs, so the cost does not grow with the number of links.
+    """
+    start, end = owner_analytics_range(from_, to)
+    return OwnerAnalyticsResponse(
+        unique_visitors=count_owner_visitors(get_redis_client(), str(api_key.id), start, end)
+    )
 
 
 @router.patch("/links/{code}", response_model=LinkStatsResponse)
@@ -203,20 +278,40 @@ def patch_link(
     code: str,
     req: PatchLinkRequest,
     db: Session = Depends(get_db),
-    api_key: ApiKey = Depends(get_current_api_key),
+    api_key: ApiKeyPrincipal = Depends(get_current_api_key),
 ):
-    link = db.query(Link).filter(Link.code == code, Link.owner_api_key_id == api_key.id).first()
-
-    if link is None:
-        # 404 prevents leaking link existence across tenants
-        raise HTTPException(status_code=404, detail="Link not found")
+    link = require_owned_link(db.scalars(owned_link_query(code, api_key.id)).first())
 
     link.is_active = req.is_active
     db.commit()
     db.refresh(link)
 
-    from urlshortenerapi.main import get_redis_client, LINK_CACHE_PREFIX
-
-    get_redis_client().delete(f"{LINK_CACHE_PREFIX}{code}")
+    invalidate_link(get_redis_client(), code)
 
     return link
+
+
+@router.post(
+    "/admin/profile",
+    response_model=ProfileWindowResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+def start_profile_window(
+    req: ProfileWindowRequest | None = None,
+    api_key: ApiKeyPrincipal = Depends(require_admin_api_key),
+):
+    """
+    Sample every worker's stacks for `seconds`. Each worker writes its own
+    profile to PROFILE_DIR when the window ends; a worker that is already
+    running a window ignores the request.
+    """
+    req = req or ProfileWindowRequest()
+    fmt = req.format or profiler.format
+    workers = request_profile_window(get_redis_client(), req.seconds, fmt)
+    if workers == 0:
+        # No worker is listening (e.g. the subscription failed): profile this one
+        workers = int(profiler.start_window(req.seconds, fmt))
+
+    return ProfileWindowResponse(
+        seconds=req.seconds, format=fmt, workers=workers, directory=profiler.directory
+    )
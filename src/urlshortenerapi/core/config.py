@@ -1,5 +1,8 @@
 from pydantic_settings import BaseSettings
 
+# Default CODE_PERMUTATION_KEY; only accepted with APP_ENV=dev
+DEV_CODE_PERMUTATION_KEY = "dev-only-change-me"
+
 
 class Settings(BaseSettings):
     # Application
@@ -8,9 +11,107 @@ class Settings(BaseSettings):
     # Database
     database_url: str
 
+    # Postgres connection pool, per engine (sync and async each have one) and
+    # per worker process: a worker opens at most db_pool_size + db_max_overflow
+    # connections per engine, so keep workers x that below max_connections.
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    # Seconds a request waits for a free connection before failing
+    db_pool_timeout: float = 30.0
+    # Replace connections older than this many seconds (-1 = never), e.g.
+    # to stay under a proxy's or server's idle timeout
+    db_pool_recycle: int = -1
+    # Test each connection with a round trip on checkout (survives server
+    # restarts and dropped connections at the cost of one extra round trip)
+    db_pool_pre_ping: bool = False
+
     # Redis
     redis_url: str
 
+    # Redis connection pool per client (sync and async) and worker process.
+    # 0 = unbounded; otherwise callers wait up to redis_pool_timeout seconds
+    # for a free connection. Each pub/sub listener holds one for good.
+    redis_max_connections: int = 0
+    redis_pool_timeout: float = 5.0
+    # Socket connect / read timeouts in seconds (0 = none)
+    redis_socket_connect_timeout: float = 0
+    redis_socket_timeout: float = 0
+
+    # Serve redirects with async handlers (redis.asyncio + async SQLAlchemy)
+    # instead of sync handlers on Starlette's threadpool.
+    async_mode: bool = False
+
+    # Answer GET/HEAD /{code} from a raw ASGI handler in front of FastAPI
+    # (always async; uses the same clients as ASYNC_MODE).
+    redirect_fast_path: bool = False
+
+    # Per-worker (L1) link cache in front of the Redis link cache.
+    # max_entries = 0 disables it.
+    local_cache_max_entries: int = 10_000
+    local_cache_max_bytes: int = 16 * 1024 * 1024
+    local_cache_ttl_seconds: float = 10.0
+
+    # XFetch early refresh of Redis link cache entries: higher refreshes
+    # earlier (more Postgres reads, fewer expiries under load). 0 disables.
+    link_cache_xfetch_beta: float = 1.0
+
+    # Preload this many of the most clicked links into the Redis and local
+    # caches at worker start (one worker per deploy window queries Postgres,
+    # the rest copy from Redis); /health/ready reports 503 until it is done.
+    # 0 disables it.
+    cache_warmup_links: int = 0
+
+    # Expiry sweeper: the click flush lease holder marks expired and used-up
+    # links swept and purges their cache entries, in batches of
+    # expiry_sweep_batch_size, at most expiry_sweep_max_batches per pass,
+    # every expiry_sweep_interval_seconds. 0 disables it.
+    expiry_sweep_interval_seconds: float = 60.0
+    expiry_sweep_batch_size: int = 500
+    expiry_sweep_max_batches: int = 20
+
+    # Bloom filter of existing codes, used to answer 404s without Postgres.
+    code_filter_capacity: int = 1_000_000
+    code_filter_error_rate: float = 0.001
+
+    # Count redirect rate-limit hits in memory per worker and sync them to
+    # Redis in batches; see services.prelimiter for the overshoot bound.
+    redirect_prelimit: bool = False
+    redirect_prelimit_sync_ms: int = 100
+    redirect_prelimit_burst: int = 10
+
+    # Unique visitors: daily HyperLogLogs per link and per owner, kept for
+    # this many days. Client IPs are hashed with the key before storage.
+    unique_visitors_retention_days: int = 30
+    visitor_hash_key: str = "dev-only-change-me"
+
+    # Sampling profiler (core.profiling). profile_sample_rate is the fraction
+    # of requests during which the worker's stacks are sampled; 0 disables
+    # it. Time-boxed windows can also be started via POST /api/v1/admin/profile.
+    # Each worker writes its own files to profile_dir ("collapsed" or "speedscope").
+    profile_sample_rate: float = 0.0
+    profile_interval_ms: float = 10.0
+    profile_dir: str = "profiles"
+    profile_format: str = "collapsed"
+
+    # Comma-separated API key ids allowed to call /api/v1/admin endpoints
+    admin_api_key_ids: str = ""
+
+    # Per-worker cache of authenticated API keys (in front of Redis).
+    # max_entries = 0 disables it.
+    api_key_cache_max_entries: int = 10_000
+    api_key_cache_ttl_seconds: float = 30.0
+
+    # How generated short codes are allocated:
+    #   sequence — id blocks from a Postgres sequence, permuted and base62-encoded
+    #   redis    — same, with id blocks from a Redis counter
+    #   random   — random codes, retried on collision
+    code_allocator: str = "sequence"
+    # Secret for the id permutation. Changing it after codes were issued can
+    # make new codes collide with old ones, so set it once per deployment.
+    # Outside APP_ENV=dev the sequence and redis allocators refuse to start
+    # with the default.
+    code_permutation_key: str = DEV_CODE_PERMUTATION_KEY
+
     class Config:
         env_file = ".env"
 
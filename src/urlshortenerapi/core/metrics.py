@@ -0,0 +1,563 @@
+from __future__ import annotations
+
+import json
+import logging
+import math
+import os
+import socket
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from typing import Callable, Iterable
+
+from redis import Redis
+from redis.exceptions import WatchError
+
+logger = logging.getLogger(__name__)
+
+# In-process metrics with Prometheus text exposition.
+#
+# Recording is a bisect and two additions on a pre-resolved child, with no
+# lock: under the GIL these statements are not interrupted by a thread
+# switch in practice, and a rare lost increment is an acceptable error for
+# metrics (prometheus_client locks instead, at several times the cost). Workers
+# publish snapshots of their totals to Redis every few seconds and /metrics
+# sums the snapshots of every worker on this host, so a scrape sees the
+# whole gunicorn instance whichever worker answers it.
+#
+# A worker that crashes loses at most its last publish interval. Its last
+# snapshot keeps counting towards the host, and a restarted worker gets a
+# new field, so host counters never go backwards. After
+# METRICS_RETENTION_SECONDS the counters and histograms of a dead worker are
+# folded into RETIRED_FIELD instead of being dropped.
+
+METRICS_KEY_PREFIX = "metrics:"
+METRICS_PUBLISH_SECONDS = 5
+# Snapshots of workers that stopped publishing are kept this long, so a
+# worker restart does not make the host's counters go backwards right away.
+METRICS_RETENTION_SECONDS = 86_400
+# Accumulated counters and histograms of workers past retention
+RETIRED_FIELD = "retired"
+# Summed gauges describe live state (open connections), so only snapshots
+# of workers that published recently count towards them.
+LIVE_SNAPSHOT_SECONDS = 3 * METRICS_PUBLISH_SECONDS
+
+# Seconds; tuned for a redirect path that is mostly sub-millisecond
+LATENCY_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+)
+
+
+class _Family:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        self._children: dict[tuple[str, ...], object] = {}
+
+    def labels(self, *values: str):
+        """The child for these label values; hold on to it on hot paths."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+
+class Counter(_Family):
+    kind = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+
+class _GaugeChild:
+    __slots__ = ("value", "updated")
+
+    def __init__(self) -> None:
+        self.value = 0.0
+        self.updated = 0.0
+
+    def set(self, value: float) -> None:
+        # single store; the timestamp picks the newest value across workers
+        self.value, self.updated = value, time.time()
+
+
+class Gauge(_Family):
+    """
+    Across workers, the most recently set value wins (aggregate="latest"),
+    or the values of the live workers are added up (aggregate="sum").
+    """
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple[str, ...] = (),
+        aggregate: str = "latest",
+    ) -> None:
+        if aggregate not in ("latest", "sum"):
+            raise ValueError(f"Unknown gauge aggregate: {aggregate!r}")
+        super().__init__(name, help, labelnames)
+        self.aggregate = aggregate
+
+    def _new_child(self) -> _GaugeChild:
+        return _GaugeChild()
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+
+class _HistogramChild:
+    __slots__ = ("_buckets", "counts", "sum")
+
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        self._buckets = buckets
+        # one slot per bucket plus +Inf; not cumulative until exposition
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self._buckets, value)] += 1
+        self.sum += value
+
+
+class Histogram(_Family):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = buckets
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._families: dict[str, _Family] = {}
+        self._collectors: list[Callable[[], None]] = []
+
+    def register(self, family: _Family) -> _Family:
+        if family.name in self._families:
+            raise ValueError(f"Metric {family.name} already registered")
+        self._families[family.name] = family
+        return family
+
+    def counter(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple[str, ...] = (),
+        aggregate: str = "latest",
+    ) -> Gauge:
+        return self.register(Gauge(name, help, labelnames, aggregate))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def add_collector(self, collect: Callable[[], None]) -> None:
+        """Run `collect` before every snapshot, to set gauges from live state."""
+        self._collectors.append(collect)
+
+    def snapshot(self) -> dict:
+        """JSON-safe copy of every sample, keyed by family then label values."""
+        for collect in self._collectors:
+            try:
+                collect()
+            except Exception:
+                logger.exception("Metrics collector failed")
+        out = {}
+        for family in self._families.values():
+            samples = {}
+            for labels, child in list(family._children.items()):
+                key = "\x1f".join(labels)
+                if family.kind == "counter":
+                    samples[key] = child.value
+                elif family.kind == "gauge":
+                    samples[key] = [child.value, child.updated]
+                else:
+                    samples[key] = [list(child.counts), child.sum]
+            out[family.name] = samples
+        return out
+
+    def retire(self, snapshots: Iterable[dict]) -> dict:
+        """
+        Sum the counters and histograms of these snapshots into one. Gauges
+        are dropped: a retired worker has no live state.
+        """
+        out: dict[str, dict] = {}
+        for snap in snapshots:
+            for name, samples in snap.items():
+                family = self._families.get(name)
+                if family is None or family.kind == "gauge":
+                    continue
+                target = out.setdefault(name, {})
+                for key, value in samples.items():
+                    _merge_sample(family, target, key, value)
+        return out
+
+    def render(self, snapshots: Iterable[dict]) -> str:
+        """Merge worker snapshots and render the Prometheus text format."""
+        merged: dict[str, dict] = {name: {} for name in self._families}
+        live_after = time.time() - LIVE_SNAPSHOT_SECONDS
+        for snap in snapshots:
+            # this worker's own snapshot has no _published_at: it is live
+            live = snap.get("_published_at", math.inf) >= live_after
+            for name, samples in snap.items():
+                family = self._families.get(name)
+                if family is None:
+                    # unknown to this release, or bookkeeping like _published_at
+                    continue
+                if not live and getattr(family, "aggregate", None) == "sum":
+                    continue
+                target = merged[name]
+                for key, value in samples.items():
+                    _merge_sample(family, target, key, value)
+
+        lines = []
+        for name, family in self._families.items():
+            lines.append(f"# HELP {name} {family.help}")
+            lines.append(f"# TYPE {name} {family.kind}")
+            for key, value in sorted(merged[name].items()):
+                labels = _label_pairs(family.labelnames, key)
+                if family.kind == "counter":
+                    lines.append(f"{name}{_fmt_labels(labels)} {_fmt(value)}")
+                elif family.kind == "gauge":
+                    lines.append(f"{name}{_fmt_labels(labels)} {_fmt(value[0])}")
+                else:
+                    counts, total = value
+                    running = 0
+                    for bound, count in zip(family.buckets + (math.inf,), counts):
+                        running += count
+                        le = labels + [("le", "+Inf" if bound == math.inf else _fmt(bound))]
+                        lines.append(f"{name}_bucket{_fmt_labels(le)} {running}")
+                    lines.append(f"{name}_sum{_fmt_labels(labels)} {_fmt(total)}")
+                    lines.append(f"{name}_count{_fmt_labels(labels)} {running}")
+        return "\n".join(lines) + "\n"
+
+
+def _merge_sample(family: _Family, target: dict, key: str, value) -> None:
+    current = target.get(key)
+    if family.kind == "counter":
+        target[key] = (current or 0.0) + value
+    elif family.kind == "gauge":
+        if current is None:
+            target[key] = list(value)
+        elif family.aggregate == "sum":
+            target[key] = [current[0] + value[0], max(current[1], value[1])]
+        elif value[1] >= current[1]:
+            target[key] = value
+    elif current is None:
+        target[key] = [list(value[0]), value[1]]
+    else:
+        current[0] = [a + b for a, b in zip(current[0], value[0])]
+        current[1] += value[1]
+
+
+def _label_pairs(names: tuple[str, ...], key: str) -> list[tuple[str, str]]:
+    return list(zip(names, key.split("\x1f"))) if names else []
+
+
+def _fmt_labels(pairs: list[tuple[str, str]]) -> str:
+    if not pairs:
+        return ""
+    escaped = (
+        (k, v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')) for k, v in pairs
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def _fmt(value: float) -> str:
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+registry = Registry()
+
+# Published snapshots: one hash per host, one field per worker process.
+# The random suffix keeps a restarted worker that reuses a pid (common in
+# containers) from overwriting the totals of the one that died.
+_HOST = socket.gethostname()
+
+
+def _new_worker_id() -> str:
+    return f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+_WORKER = _new_worker_id()
+
+
+def _reset_worker_id() -> None:
+    global _WORKER
+    _WORKER = _new_worker_id()
+
+
+os.register_at_fork(after_in_child=_reset_worker_id)
+
+
+def metrics_key(host: str = _HOST) -> str:
+    return f"{METRICS_KEY_PREFIX}{host}"
+
+
+def publish_snapshot(r: Redis) -> None:
+    snapshot = registry.snapshot()
+    snapshot["_published_at"] = time.time()
+    key = metrics_key()
+    pipe = r.pipeline(transaction=False)
+    pipe.hset(key, _WORKER, json.dumps(snapshot, separators=(",", ":")))
+    pipe.expire(key, METRICS_RETENTION_SECONDS)
+    pipe.execute()
+
+
+def render_metrics(r: Redis) -> str:
+    """
+    Everything recorded on this host: the published snapshots of the other
+    workers plus this worker's live values. Falls back to this worker only
+    when Redis is unreachable.
+    """
+    try:
+        published = r.hgetall(metrics_key())
+    except Exception:
+        published = {}
+    published.pop(_WORKER, None)
+
+    cutoff = time.time() - METRICS_RETENTION_SECONDS
+    snapshots, expired = [], []
+    for worker, raw in published.items():
+        snapshot = json.loads(raw)
+        if worker != RETIRED_FIELD and snapshot.get("_published_at", 0) < cutoff:
+            expired.append(worker)
+        snapshots.append(snapshot)
+    if expired:
+        retire_workers(r, expired)
+
+    snapshots.append(registry.snapshot())
+    return registry.render(snapshots)
+
+
+def retire_workers(r: Redis, workers: list[str]) -> None:
+    """
+    Fold the snapshots of workers past retention into RETIRED_FIELD and
+    delete them, in one WATCHed transaction so that two workers scraping at
+    once cannot fold the same snapshot twice. On a conflict the next scrape
+    tries again.
+    """
+    key = metrics_key()
+    try:
+        with r.pipeline() as pipe:
+            pipe.watch(key)
+            retired, *raws = pipe.hmget(key, [RETIRED_FIELD, *workers])
+            found = [w for w, raw in zip(workers, raws) if raw is not None]
+            if not found:
+                return
+            folded = registry.retire(
+                [json.loads(retired or "{}"), *(json.loads(raw) for raw in raws if raw)]
+            )
+            pipe.multi()
+            pipe.hset(key, RETIRED_FIELD, json.dumps(folded, separators=(",", ":")))
+            pipe.hdel(key, *found)
+            pipe.execute()
+    except WatchError:
+        pass
+    except Exception:
+        logger.exception("Could not retire stale metrics snapshots")
+
+
+# ---------------------------------------------------------------------------
+# Application metrics
+# ---------------------------------------------------------------------------
+
+HTTP_REQUEST_DURATION = registry.histogram(
+    "http_request_duration_seconds",
+    "Request latency by route template",
+    ("route", "method"),
+)
+HTTP_REQUESTS = registry.counter(
+    "http_requests_total",
+    "Requests by route template and status code",
+    ("route", "method", "status"),
+)
+LINK_CACHE_LOOKUPS = registry.counter(
+    "link_cache_lookups_total",
+    "Link lookups by where they were answered: local_hit, redis_hit, "
+    "negative_hit (known missing) or miss (went to Postgres)",
+    ("result",),
+)
+REDIS_COMMAND_DURATION = registry.histogram(
+    "redis_command_duration_seconds",
+    "Redis round trips by command (PIPELINE for a whole pipeline)",
+    ("command",),
+)
+POSTGRES_QUERY_DURATION = registry.histogram(
+    "postgres_query_duration_seconds",
+    "Postgres statement execution time by statement type",
+    ("statement",),
+)
+CLICK_FLUSH_DURATION = registry.histogram(
+    "click_flush_duration_seconds",
+    "Duration of click flush cycles that held the flusher lease",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+CLICK_FLUSH_BACKLOG = registry.gauge(
+    "click_flush_backlog_links",
+    "Links with buffered clicks at the start of the last flush cycle",
+)
+CLICK_FLUSH_ROWS = registry.counter(
+    "click_flush_rows_total",
+    "Rows written to Postgres by the click flusher",
+    ("table",),
+)
+CLICK_FLUSHER_LEADER = registry.gauge(
+    "click_flusher_leader",
+    "1 on the worker holding the click flusher lease, 0 on the others (live workers only)",
+    ("worker",),
+    aggregate="sum",
+)
+RATE_LIMIT_DECISIONS = registry.counter(
+    "rate_limit_decisions_total",
+    "Rate limit outcomes by limiter (create, redirect, redirect_local) and decision",
+    ("limiter", "decision"),
+)
+LINKS_SWEPT = registry.counter(
+    "links_swept_total",
+    "Links swept by the expiry sweeper, by reason (expired, max_clicks)",
+    ("reason",),
+)
+DB_POOL_CHECKOUT_DURATION = registry.histogram(
+    "db_pool_checkout_duration_seconds",
+    "Time to get a Postgres connection from the pool, including opening one",
+    ("engine",),
+)
+DB_POOL_TIMEOUTS = registry.counter(
+    "db_pool_timeouts_total",
+    "Postgres checkouts that gave up after DB_POOL_TIMEOUT",
+    ("engine",),
+)
+DB_POOL_CONNECTIONS = registry.gauge(
+    "db_pool_connections",
+    "Postgres connections by state (in_use, idle, max), summed over live workers",
+    ("engine", "state"),
+    aggregate="sum",
+)
+REDIS_POOL_CHECKOUT_DURATION = registry.histogram(
+    "redis_pool_checkout_duration_seconds",
+    "Time to get a Redis connection from the pool, including opening one",
+    ("client",),
+)
+REDIS_POOL_TIMEOUTS = registry.counter(
+    "redis_pool_timeouts_total",
+    "Redis checkouts that gave up after REDIS_POOL_TIMEOUT",
+    ("client",),
+)
+REDIS_POOL_CONNECTIONS = registry.gauge(
+    "redis_pool_connections",
+    "Redis connections by state (in_use, idle, max), summed over live workers",
+    ("client", "state"),
+    aggregate="sum",
+)
+
+# (route, method, status) -> (latency histogram child, request counter child)
+_request_children: dict[tuple[str, str, int], tuple[_HistogramChild, _CounterChild]] = {}
+
+
+def record_request(route: str, method: str, status: int, elapsed: float) -> None:
+    """Count one request by route template (never the raw path)."""
+    key = (route, method, status)
+    children = _request_children.get(key)
+    if children is None:
+        children = _request_children[key] = (
+            HTTP_REQUEST_DURATION.labels(route, method),
+            HTTP_REQUESTS.labels(route, method, str(status)),
+        )
+    children[0].observe(elapsed)
+    children[1].value += 1
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing every request that reaches FastAPI, labelled
+    with the matched route template ("other" when nothing matched).
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_wrapper(message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            record_request(
+                route.path if route is not None else "other",
+                scope["method"],
+                status,
+                time.perf_counter() - started,
+            )
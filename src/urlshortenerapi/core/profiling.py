@@ -0,0 +1,348 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import random
+import re
+import socket
+import sys
+import sysconfig
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+
+from redis import Redis
+
+from urlshortenerapi.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Statistical profiler for live workers. A sampler thread reads every
+# thread's stack (sys._current_frames) at a fixed interval and counts
+# identical stacks; nothing is traced, so the profiled code runs at full
+# speed and the cost is the sampler's own CPU while it is running. With
+# profiling disabled there is no middleware and no thread at all.
+
+PROFILE_FORMATS = ("collapsed", "speedscope")
+PROFILE_EXTENSIONS = {"collapsed": "collapsed.txt", "speedscope": "speedscope.json"}
+
+# Published with {"seconds": ..., "format": ...} to start a window in every worker
+PROFILE_CHANNEL = "profiler:start"
+PROFILE_MAX_SECONDS = 300
+
+# How often request-sampling mode writes out what it has collected
+PROFILE_FLUSH_SECONDS = 60
+
+# Threads named like this are the profiler's own and are never sampled
+_PROFILER_THREAD_PREFIX = "profiler-"
+
+# Innermost Python frames of a thread with nothing to do: an idle event
+# loop, an idle threadpool worker, a pub/sub listener between messages.
+# Samples ending in them are dropped so the profile shows work, not waiting.
+_IDLE_FRAMES = frozenset(
+    {
+        ("selectors.py", "select"),
+        ("threading.py", "wait"),
+        ("threading.py", "join"),
+        ("queue.py", "get"),
+        ("socket.py", "readinto"),
+    }
+)
+
+# (function, file, first line of the function); the root frame of every
+# stack is the thread's name with an empty file
+Frame = tuple[str, str, int]
+
+
+_STDLIB = sysconfig.get_paths()["stdlib"] + os.sep
+
+
+@lru_cache(maxsize=4096)
+def _short_path(filename: str) -> str:
+    """Paths relative to site-packages, the stdlib or the working directory."""
+    _, sep, rest = filename.rpartition("site-packages/")
+    if sep:
+        return rest
+    for root in (_STDLIB, os.getcwd() + os.sep):
+        if filename.startswith(root):
+            return filename[len(root) :]
+    return filename
+
+
+def _thread_label(name: str) -> str:
+    # Pool threads differ only by a counter; merge them into one root
+    return re.sub(r"[-_ ]?\d+$", "", name) or name
+
+
+def _stack(thread: str, frame) -> tuple[Frame, ...]:
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append((code.co_name, _short_path(code.co_filename), code.co_firstlineno))
+        frame = frame.f_back
+    stack.append((_thread_label(thread), "", 0))
+    stack.reverse()
+    return tuple(stack)
+
+
+def _is_idle(stack: tuple[Frame, ...]) -> bool:
+    name, path, _ = stack[-1]
+    return (path.rpartition("/")[2], name) in _IDLE_FRAMES
+
+
+@dataclass(frozen=True)
+class Profile:
+    samples: dict[tuple[Frame, ...], int]
+    interval: float
+    started_at: float
+    ended_at: float
+
+
+class StackSampler:
+    """
+    Samples all threads of this process while at least one user holds it
+    (acquire/release nest), so concurrent sampled requests share one
+    sampler thread. take() hands over what was collected so far.
+    """
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._users = 0
+        self._thread: threading.Thread | None = None
+        self._samples: Counter = Counter()
+        self._started_at = time.time()
+
+    def acquire(self) -> None:
+        with self._lock:
+            self._users += 1
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name=f"{_PROFILER_THREAD_PREFIX}sampler", daemon=True
+                )
+                self._thread.start()
+
+    def release(self) -> None:
+        with self._lock:
+            self._users -= 1
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                if self._users <= 0:
+                    self._thread = None
+                    return
+            time.sleep(self.interval)
+            self.sample()
+
+    def sample(self) -> None:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        stacks = []
+        for ident, frame in sys._current_frames().items():
+            name = names.get(ident, "thread")
+            if name.startswith(_PROFILER_THREAD_PREFIX):
+                continue
+            stack = _stack(name, frame)
+            if not _is_idle(stack):
+                stacks.append(stack)
+        with self._lock:
+            self._samples.update(stacks)
+
+    def take(self) -> Profile:
+        with self._lock:
+            samples, self._samples = self._samples, Counter()
+            started_at, self._started_at = self._started_at, time.time()
+        return Profile(dict(samples), self.interval, started_at, self._started_at)
+
+
+def _frame_label(frame: Frame) -> str:
+    name, path, line = frame
+    return f"{name} ({path}:{line})" if path else name
+
+
+def render_collapsed(profile: Profile) -> str:
+    """Brendan Gregg's folded format: one `frame;frame;... count` line per stack."""
+    lines = [
+        ";".join(_frame_label(frame) for frame in stack) + f" {count}"
+        for stack, count in sorted(profile.samples.items())
+    ]
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+def render_speedscope(profile: Profile, name: str) -> str:
+    """A sampled profile in speedscope's file format, weighted in seconds."""
+    frames: list[dict] = []
+    index: dict[Frame, int] = {}
+    samples, weights = [], []
+    for stack, count in profile.samples.items():
+        ids = []
+        for frame in stack:
+            i = index.get(frame)
+            if i is None:
+                i = index[frame] = len(frames)
+                fn, path, line = frame
+                frames.append({"name": fn, "file": path, "line": line} if path else {"name": fn})
+            ids.append(i)
+        samples.append(ids)
+        weights.append(count * profile.interval)
+
+    return json.dumps(
+        {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "urlshortenerapi",
+            "shared": {"frames": frames},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": name,
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": sum(weights),
+                    "samples": samples,
+                    "weights": weights,
+                }
+            ],
+        }
+    )
+
+
+def write_profile(profile: Profile, directory: str, fmt: str, label: str) -> Path | None:
+    """
+    Write one profile file for this worker, named
+    <label>-<host>-<pid>-<UTC start>.<ext>. Returns None if nothing was sampled.
+    """
+    if not profile.samples:
+        return None
+    started = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime(profile.started_at))
+    name = f"{label}-{socket.gethostname()}-{os.getpid()}-{started}"
+    body = render_speedscope(profile, name) if fmt == "speedscope" else render_collapsed(profile)
+
+    path = Path(directory) / f"{name}.{PROFILE_EXTENSIONS[fmt]}"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(body)
+    return path
+
+
+class Profiler:
+    """Per-worker entry point: request sampling and time-boxed windows."""
+
+    def __init__(self, interval: float, directory: str, fmt: str, sample_rate: float) -> None:
+        if fmt not in PROFILE_FORMATS:
+            raise ValueError(f"Unknown profile format: {fmt!r}")
+        self.interval = interval
+        self.directory = directory
+        self.format = fmt
+        self.sample_rate = sample_rate
+        self.request_sampler = StackSampler(interval)
+        self._window_lock = threading.Lock()
+
+    @property
+    def sampling_requests(self) -> bool:
+        return self.sample_rate > 0
+
+    def write_sampled(self) -> Path | None:
+        return write_profile(self.request_sampler.take(), self.directory, self.format, "sampled")
+
+    def start_window(self, seconds: float, fmt: str | None = None) -> bool:
+        """
+        Sample this worker for `seconds` on a background thread, then write
+        the profile. Returns False if a window is already running here.
+        """
+        if not self._window_lock.acquire(blocking=False):
+            return False
+        threading.Thread(
+            target=self._run_window,
+            args=(seconds, fmt or self.format),
+            name=f"{_PROFILER_THREAD_PREFIX}window",
+            daemon=True,
+        ).start()
+        return True
+
+    def _run_window(self, seconds: float, fmt: str) -> None:
+        try:
+            sampler = StackSampler(self.interval)
+            sampler.acquire()
+            try:
+                time.sleep(seconds)
+            finally:
+                sampler.release()
+            path = write_profile(sampler.take(), self.directory, fmt, "window")
+            logger.info("Profile window finished: %s", path or "no samples")
+        except Exception:
+            logger.exception("Profile window failed")
+        finally:
+            self._window_lock.release()
+
+
+profiler = Profiler(
+    interval=settings.profile_interval_ms / 1000,
+    directory=settings.profile_dir,
+    fmt=settings.profile_format,
+    sample_rate=settings.profile_sample_rate,
+)
+
+
+class ProfilingMiddleware:
+    """
+    Samples the worker's stacks while a randomly chosen fraction of
+    requests is in flight. Only installed when PROFILE_SAMPLE_RATE > 0.
+    """
+
+    def __init__(self, app, profiler: Profiler = profiler) -> None:
+        self.app = app
+        self._sampler = profiler.request_sampler
+        self._rate = profiler.sample_rate
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or random.random() >= self._rate:
+            await self.app(scope, receive, send)
+            return
+
+        self._sampler.acquire()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self._sampler.release()
+
+
+def request_profile_window(r: Redis, seconds: float, fmt: str) -> int:
+    """Start a window in every subscribed worker; returns how many received it."""
+    return r.publish(PROFILE_CHANNEL, json.dumps({"seconds": seconds, "format": fmt}))
+
+
+async def request_profile_window_async(r, seconds: float, fmt: str) -> int:
+    return await r.publish(PROFILE_CHANNEL, json.dumps({"seconds": seconds, "format": fmt}))
+
+
+def _on_profile_message(message: dict) -> None:
+    try:
+        request = json.loads(message["data"])
+        seconds = min(float(request["seconds"]), PROFILE_MAX_SECONDS)
+        fmt = request.get("format") or profiler.format
+        if fmt not in PROFILE_FORMATS:
+            raise ValueError(fmt)
+    except (ValueError, KeyError, TypeError):
+        logger.warning("Ignoring malformed profile request: %r", message["data"])
+        return
+    if not profiler.start_window(seconds, fmt):
+        logger.info("Profile window already running in this worker; request ignored")
+
+
+def start_profile_listener(r: Redis):
+    """
+    Subscribe to profile window requests on a daemon thread.
+    Returns the worker thread (call .stop() on shutdown), or None if Redis
+    is unreachable.
+    """
+    try:
+        pubsub = r.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{PROFILE_CHANNEL: _on_profile_message})
+        return pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+    except Exception:
+        logger.exception("Could not subscribe to the profile channel")
+        return None
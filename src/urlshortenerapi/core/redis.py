@@ -1,13 +1,202 @@
 import os
-import redis
+import time
 from functools import lru_cache
 
+import redis
+import redis.asyncio
+import redis.asyncio.client
+import redis.client
+
+from urlshortenerapi.core.config import settings
+from urlshortenerapi.core.metrics import (
+    REDIS_COMMAND_DURATION,
+    REDIS_POOL_CHECKOUT_DURATION,
+    REDIS_POOL_CONNECTIONS,
+    REDIS_POOL_TIMEOUTS,
+    registry,
+)
+
+
+def _redis_url() -> str:
+    return os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+
+
+# Clients that time every round trip into redis_command_duration_seconds.
+# A pipeline is one round trip, recorded as PIPELINE when it executes.
+
+
+class _TimedPipeline(redis.client.Pipeline):
+    def execute(self, raise_on_error: bool = True):
+        started = time.perf_counter()
+        try:
+            return super().execute(raise_on_error)
+        finally:
+            REDIS_COMMAND_DURATION.labels("PIPELINE").observe(time.perf_counter() - started)
+
+
+class TimedRedis(redis.Redis):
+    def execute_command(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            return super().execute_command(*args, **options)
+        finally:
+            REDIS_COMMAND_DURATION.labels(str(args[0]).upper()).observe(
+                time.perf_counter() - started
+            )
+
+    def pipeline(self, transaction=True, shard_hint=None) -> redis.client.Pipeline:
+        return _TimedPipeline(
+            self.connection_pool, self.response_callbacks, transaction, shard_hint
+        )
+
+
+class _AsyncTimedPipeline(redis.asyncio.client.Pipeline):
+    async def execute(self, raise_on_error: bool = True):
+        started = time.perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        finally:
+            REDIS_COMMAND_DURATION.labels("PIPELINE").observe(time.perf_counter() - started)
+
+
+class AsyncTimedRedis(redis.asyncio.Redis):
+    async def execute_command(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            REDIS_COMMAND_DURATION.labels(str(args[0]).upper()).observe(
+                time.perf_counter() - started
+            )
+
+    def pipeline(self, transaction=True, shard_hint=None) -> redis.asyncio.client.Pipeline:
+        return _AsyncTimedPipeline(
+            self.connection_pool, self.response_callbacks, transaction, shard_hint
+        )
+
+
+# Pools that time every checkout into redis_pool_checkout_duration_seconds.
+# Both blocking pools raise this when REDIS_POOL_TIMEOUT runs out.
+_POOL_EXHAUSTED = "No connection available"
+
+
+class _TimedPoolMixin:
+    def _observe_checkout(self, started: float, error: Exception | None = None) -> None:
+        if error is not None and _POOL_EXHAUSTED in str(error):
+            REDIS_POOL_TIMEOUTS.labels(self.client_label).inc()
+        REDIS_POOL_CHECKOUT_DURATION.labels(self.client_label).observe(
+            time.perf_counter() - started
+        )
+
+
+class _TimedPool(_TimedPoolMixin):
+    client_label = "sync"
+
+    def get_connection(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            connection = super().get_connection(*args, **kwargs)
+        except redis.ConnectionError as exc:
+            self._observe_checkout(started, exc)
+            raise
+        self._observe_checkout(started)
+        return connection
+
+
+class _AsyncTimedPool(_TimedPoolMixin):
+    client_label = "async"
+
+    async def get_connection(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            connection = await super().get_connection(*args, **kwargs)
+        except redis.ConnectionError as exc:
+            self._observe_checkout(started, exc)
+            raise
+        self._observe_checkout(started)
+        return connection
+
+
+class TimedConnectionPool(_TimedPool, redis.ConnectionPool):
+    pass
+
+
+class TimedBlockingConnectionPool(_TimedPool, redis.BlockingConnectionPool):
+    pass
+
+
+class AsyncTimedConnectionPool(_AsyncTimedPool, redis.asyncio.ConnectionPool):
+    pass
+
+
+class AsyncTimedBlockingConnectionPool(_AsyncTimedPool, redis.asyncio.BlockingConnectionPool):
+    pass
+
+
+def _pool_options() -> dict:
+    options: dict = {"decode_responses": True}
+    if settings.redis_max_connections > 0:
+        options["max_connections"] = settings.redis_max_connections
+        options["timeout"] = settings.redis_pool_timeout
+    if settings.redis_socket_connect_timeout > 0:
+        options["socket_connect_timeout"] = settings.redis_socket_connect_timeout
+    if settings.redis_socket_timeout > 0:
+        options["socket_timeout"] = settings.redis_socket_timeout
+    return options
+
+
+def pool_usage(pool) -> tuple[int, int]:
+    """(in use, idle) connections of a redis-py pool, sync or async."""
+    if isinstance(pool, redis.BlockingConnectionPool):
+        # The queue holds idle connections and None placeholders for ones
+        # never opened; _connections is every connection it has opened.
+        idle = sum(1 for connection in list(pool.pool.queue) if connection is not None)
+        return len(pool._connections) - idle, idle
+    return len(pool._in_use_connections), len(pool._available_connections)
+
+
+def _collect_pool_usage(pool, label: str) -> None:
+    """Report the pool's connections in redis_pool_connections on every snapshot."""
+    in_use = REDIS_POOL_CONNECTIONS.labels(label, "in_use")
+    idle = REDIS_POOL_CONNECTIONS.labels(label, "idle")
+
+    def collect() -> None:
+        used, available = pool_usage(pool)
+        in_use.set(used)
+        idle.set(available)
+
+    if settings.redis_max_connections > 0:
+        REDIS_POOL_CONNECTIONS.labels(label, "max").set(settings.redis_max_connections)
+    registry.add_collector(collect)
+
 
 @lru_cache(maxsize=1)
 def get_redis_client() -> redis.Redis:
     """
     Creates a Redis client using REDIS_URL.
     decode_responses=True returns str instead of bytes.
+    With REDIS_MAX_CONNECTIONS set, the pool blocks callers (up to
+    REDIS_POOL_TIMEOUT) instead of opening more connections.
+    """
+    pool_class = (
+        TimedBlockingConnectionPool if settings.redis_max_connections > 0 else TimedConnectionPool
+    )
+    pool = pool_class.from_url(_redis_url(), **_pool_options())
+    _collect_pool_usage(pool, "sync")
+    return TimedRedis.from_pool(pool)
+
+
+@lru_cache(maxsize=1)
+def get_async_redis_client() -> redis.asyncio.Redis:
+    """
+    asyncio counterpart of get_redis_client, used in ASYNC_MODE.
+    The connection pool is bound to the event loop that first uses it.
     """
-    redis_url = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
-    return redis.Redis.from_url(redis_url, decode_responses=True)
+    pool_class = (
+        AsyncTimedBlockingConnectionPool
+        if settings.redis_max_connections > 0
+        else AsyncTimedConnectionPool
+    )
+    pool = pool_class.from_url(_redis_url(), **_pool_options())
+    _collect_pool_usage(pool, "async")
+    return AsyncTimedRedis.from_pool(pool)
@@ -7,6 +7,7 @@ from sqlalchemy import (
     DateTime,
     func,
     ForeignKey,
+    Index,
 )
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column
@@ -28,7 +29,6 @@ class Link(Base):
         UUID(as_uuid=True),
         ForeignKey("api_keys.id", ondelete="CASCADE"),
         nullable=False,
-        index=True,
     )
 
     code: Mapped[str] = mapped_column(
@@ -77,6 +77,44 @@ class Link(Base):
         nullable=True,
     )
 
+    swept_at: Mapped[DateTime | None] = mapped_column(
+        DateTime(timezone=True),
+        nullable=True,
+        comment="When the expiry sweeper found the link expired or used up",
+    )
+
+
+# Matches list_links' filter and sort order, so every page (first or
+# millionth) is one index range scan of `limit` entries. Its leading
+# column also serves plain owner lookups.
+Index(
+    "ix_links_owner_created_id",
+    Link.owner_api_key_id,
+    Link.created_at.desc(),
+    Link.id.desc(),
+)
+
+# Partial indexes over unswept links only, for the expiry sweeper: expired
+# and used-up links leave them as soon as they are swept.
+Index(
+    "ix_links_unswept_expires_at",
+    Link.expires_at,
+    postgresql_where=Link.swept_at.is_(None) & Link.expires_at.is_not(None),
+)
+Index(
+    "ix_links_unswept_capped",
+    Link.id,
+    postgresql_where=Link.swept_at.is_(None) & Link.max_clicks.is_not(None),
+)
+
+# Matches the cache warm-up's hottest-links order, so it reads the first
+# CACHE_WARMUP_LINKS index entries instead of sorting the whole table.
+Index(
+    "ix_links_click_count_last_accessed",
+    Link.click_count.desc(),
+    Link.last_accessed_at.desc().nulls_last(),
+)
+
 
 class ApiKey(Base):
     __tablename__ = "api_keys"
@@ -105,3 +143,31 @@ class ApiKey(Base):
         nullable=False,
         server_default=func.now(),
     )
+
+    revoked_at: Mapped[DateTime | None] = mapped_column(
+        DateTime(timezone=True),
+        nullable=True,
+    )
+
+
+class LinkClickHourly(Base):
+    """Clicks per link per UTC hour, rolled up from the Redis bucket buffer."""
+
+    __tablename__ = "link_clicks_hourly"
+
+    link_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True),
+        ForeignKey("links.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+
+    bucket: Mapped[DateTime] = mapped_column(
+        DateTime(timezone=True),
+        primary_key=True,
+        comment="Start of the UTC hour",
+    )
+
+    clicks: Mapped[int] = mapped_column(
+        BigInteger,
+        nullable=False,
+    )
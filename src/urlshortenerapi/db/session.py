@@ -1,8 +1,112 @@
-from sqlalchemy import create_engine
+import time
+from functools import lru_cache
+
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from urlshortenerapi.core.config import settings
+from urlshortenerapi.core.metrics import (
+    DB_POOL_CHECKOUT_DURATION,
+    DB_POOL_CONNECTIONS,
+    DB_POOL_TIMEOUTS,
+    POSTGRES_QUERY_DURATION,
+    registry,
+)
+
+_STATEMENT_KINDS = frozenset({"SELECT", "INSERT", "UPDATE", "DELETE", "WITH"})
+
+
+def _statement_kind(statement: str) -> str:
+    words = statement.lstrip()[:8].split(None, 1)
+    kind = words[0].upper() if words else ""
+    return kind if kind in _STATEMENT_KINDS else "OTHER"
+
+
+def _time_statements(target: Engine) -> None:
+    """
+    Record every statement's execution time in postgres_query_duration_seconds.
+    The start time lives on the statement's execution context, which is
+    dropped with it, so a statement that fails (no after_cursor_execute)
+    leaves nothing behind on the pooled connection.
+    """
+
+    @event.listens_for(target, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._query_started = time.perf_counter()
+
+    @event.listens_for(target, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_query_started", None)
+        if started is not None:
+            elapsed = time.perf_counter() - started
+            POSTGRES_QUERY_DURATION.labels(_statement_kind(statement)).observe(elapsed)
+
+
+def _timed_pool(base: type[QueuePool], label: str) -> type[QueuePool]:
+    """
+    `base` with every checkout timed into db_pool_checkout_duration_seconds
+    and checkouts that hit DB_POOL_TIMEOUT counted. A checkout that finds an
+    idle connection costs microseconds (plus the pre-ping round trip when
+    DB_POOL_PRE_PING is on); anything more is time spent opening a
+    connection or waiting for one to be returned.
+
+    Wraps the public Pool.connect(), which engines call for every checkout,
+    sync and async alike.
+    """
+    checkout = DB_POOL_CHECKOUT_DURATION.labels(label)
+    timeouts = DB_POOL_TIMEOUTS.labels(label)
+
+    class TimedPool(base):
+        def connect(self):
+            started = time.perf_counter()
+            try:
+                return super().connect()
+            except exc.TimeoutError:
+                timeouts.inc()
+                raise
+            finally:
+                checkout.observe(time.perf_counter() - started)
+
+    TimedPool.__name__ = TimedPool.__qualname__ = f"Timed{base.__name__}"
+    return TimedPool
 
-engine = create_engine(settings.database_url, echo=False)
+
+def _pool_options() -> dict:
+    return {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+
+
+def _collect_pool_usage(target: Engine, label: str) -> None:
+    """Report the pool's connections in db_pool_connections on every snapshot."""
+    in_use = DB_POOL_CONNECTIONS.labels(label, "in_use")
+    idle = DB_POOL_CONNECTIONS.labels(label, "idle")
+    maximum = DB_POOL_CONNECTIONS.labels(label, "max")
+
+    def collect() -> None:
+        pool = target.pool
+        in_use.set(pool.checkedout())
+        idle.set(pool.checkedin())
+        maximum.set(pool.size() + settings.db_max_overflow)
+
+    registry.add_collector(collect)
+
+
+engine = create_engine(
+    settings.database_url,
+    echo=False,
+    poolclass=_timed_pool(QueuePool, "sync"),
+    **_pool_options(),
+)
+_time_statements(engine)
+_collect_pool_usage(engine, "sync")
 
 SessionLocal = sessionmaker(
     bind=engine,
@@ -17,3 +121,29 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+@lru_cache(maxsize=1)
+def get_async_sessionmaker() -> async_sessionmaker[AsyncSession]:
+    """
+    Async engine on the same DATABASE_URL (psycopg 3 speaks asyncio natively).
+    Built lazily so sync-only deployments never open an async pool.
+    """
+    async_engine = create_async_engine(
+        settings.database_url,
+        echo=False,
+        poolclass=_timed_pool(AsyncAdaptedQueuePool, "async"),
+        **_pool_options(),
+    )
+    _time_statements(async_engine.sync_engine)
+    _collect_pool_usage(async_engine.sync_engine, "async")
+    return async_sessionmaker(
+        bind=async_engine,
+        autoflush=False,
+        expire_on_commit=False,
+    )
+
+
+async def get_async_db():
+    async with get_async_sessionmaker()() as db:
+        yield db
@@ -1,21 +1,100 @@
 import asyncio
 import json
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
 from datetime import datetime, timezone
+from functools import lru_cache
+from urllib.parse import quote
 
 from fastapi import FastAPI, HTTPException, Request, Depends
-from fastapi.responses import RedirectResponse, JSONResponse
+from fastapi.responses import PlainTextResponse, RedirectResponse, JSONResponse
 from fastapi.exceptions import RequestValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import update, func
+from sqlalchemy import select
 
+from urlshortenerapi.api.async_routes import router as async_api_router
 from urlshortenerapi.api.routes import router as api_router
-from urlshortenerapi.api.deps import redirect_rate_limiter
-from urlshortenerapi.db.session import get_db, SessionLocal
+from urlshortenerapi.api.deps import (
+    get_client_ip,
+    redirect_prelimiter,
+    redirect_rate_limit_rule,
+    redirect_rate_limiter,
+)
+from urlshortenerapi.db.session import get_async_db, get_async_sessionmaker, get_db, SessionLocal
 from urlshortenerapi.db.models import Link
 from urlshortenerapi.core.errors import normalize_http_exception, STATUS_TO_ERROR_CODE
-from urlshortenerapi.core.redis import get_redis_client
+from urlshortenerapi.core.config import settings
+from urlshortenerapi.core.metrics import (
+    CLICK_FLUSH_BACKLOG,
+    CLICK_FLUSH_DURATION,
+    CLICK_FLUSH_ROWS,
+    CLICK_FLUSHER_LEADER,
+    LINK_CACHE_LOOKUPS,
+    LINKS_SWEPT,
+    METRICS_PUBLISH_SECONDS,
+    RATE_LIMIT_DECISIONS,
+    MetricsMiddleware,
+    publish_snapshot,
+    record_request,
+    render_metrics,
+)
+from urlshortenerapi.core.profiling import (
+    PROFILE_FLUSH_SECONDS,
+    ProfilingMiddleware,
+    profiler,
+    start_profile_listener,
+)
+from urlshortenerapi.core.redis import get_async_redis_client, get_redis_client
+from urlshortenerapi.services.api_key_cache import start_api_key_invalidation_listener
+from urlshortenerapi.services.bloom import rebuild_code_filter
+from urlshortenerapi.services.cache_fill import (
+    FILL_MISSING,
+    AsyncFillLock,
+    AsyncSingleFlight,
+    FillLock,
+    FillTimer,
+    RecentMisses,
+    SingleFlight,
+    should_refresh_early,
+)
+from urlshortenerapi.services.cache_warmup import warm_link_cache_once
+from urlshortenerapi.services.click_buffer import (
+    CLICKS_KEY,
+    flush_click_buckets,
+    flush_click_buffer,
+)
+from urlshortenerapi.services.code_allocator import get_code_allocator
+from urlshortenerapi.services.expiry_sweeper import SweepStats, sweep_expired_links
+from urlshortenerapi.services.leases import RedisLease
+from urlshortenerapi.services.link_cache import (
+    LINK_CACHE_PREFIX,
+    LINK_CACHE_TTL,
+    CachedLink,
+    epoch_ms,
+    is_known_missing,
+    is_known_missing_async,
+    local_link_cache,
+    remember_missing,
+    remember_missing_async,
+    start_invalidation_listener,
+)
+from urlshortenerapi.services.rate_limiter import RateLimitRule
+from urlshortenerapi.services.unique_visitors import visitor_id
+from urlshortenerapi.services.redirect_engine import (
+    REDIRECT_DISABLED,
+    REDIRECT_EXPIRED,
+    REDIRECT_MAX_CLICKS,
+    REDIRECT_MISS,
+    REDIRECT_NOT_FOUND,
+    REDIRECT_RATE_LIMITED,
+    RedirectResult,
+    get_async_redirect_engine,
+    get_redirect_engine,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -23,121 +102,518 @@ logger = logging.getLogger(__name__)
 # Click-count buffering (Redis -> Postgres flush)
 # ---------------------------------------------------------------------------
 
-CLICK_KEY_PREFIX = "clicks:"
-LAST_ACCESSED_KEY_PREFIX = "last_accessed:"
 FLUSH_INTERVAL_SECONDS = 5
 
+# One flusher per deployment: workers compete for this lease every cycle.
+# If the holder dies, the lease lapses after a few intervals and another
+# worker takes over.
+FLUSH_LEASE_KEY = "lease:click_flusher"
+FLUSH_LEASE_TTL_MS = FLUSH_INTERVAL_SECONDS * 3 * 1000
+
+flush_lease = RedisLease(get_redis_client(), FLUSH_LEASE_KEY, FLUSH_LEASE_TTL_MS)
+
+
+_FLUSHED_LINK_ROWS = CLICK_FLUSH_ROWS.labels("links")
+_FLUSHED_BUCKET_ROWS = CLICK_FLUSH_ROWS.labels("link_clicks_hourly")
+_FLUSHER_LEADER = CLICK_FLUSHER_LEADER.labels(flush_lease.holder_id)
+
+
+async def _run_cycle(fn):
+    """
+    Run one background cycle on a worker thread. If the calling task is
+    cancelled (shutdown), wait for the thread to finish before re-raising,
+    so the flush lease is never released under a cycle that still runs.
+    """
+    cycle = asyncio.ensure_future(asyncio.to_thread(fn))
+    try:
+        return await asyncio.shield(cycle)
+    except asyncio.CancelledError:
+        await asyncio.wait([cycle])
+        raise
+
 
 async def _flush_click_counts() -> None:
     """
-    Background task: every FLUSH_INTERVAL_SECONDS, drain all
-    'clicks:{code}' keys from Redis and apply them to Postgres.
-    Uses GETDEL so counts are never double-counted if the flush is slow.
+    Background task: every FLUSH_INTERVAL_SECONDS, drain the dirty links
+    and hourly click buckets from Redis and apply them to Postgres in
+    set-based chunks (see services.click_buffer).
+
+    Runs in every worker, but only the flush lease holder does any work.
+    Chunks are popped atomically, so even an overlap during failover
+    cannot double-count clicks. The cycle runs on a thread so a large
+    flush does not stall the worker's event loop.
     """
     r = get_redis_client()
+
+    def run() -> None:
+        leader = flush_lease.acquire()
+        _FLUSHER_LEADER.set(int(leader))
+        if not leader:
+            return
+        started = time.perf_counter()
+        CLICK_FLUSH_BACKLOG.set(r.hlen(CLICKS_KEY))
+        with SessionLocal() as db:
+            stats = flush_click_buffer(r, db)
+            buckets = flush_click_buckets(r, db)
+        CLICK_FLUSH_DURATION.observe(time.perf_counter() - started)
+        _FLUSHED_LINK_ROWS.inc(stats.links)
+        _FLUSHED_BUCKET_ROWS.inc(buckets)
+
     while True:
         await asyncio.sleep(FLUSH_INTERVAL_SECONDS)
         try:
-            keys = list(r.scan_iter(f"{CLICK_KEY_PREFIX}*"))
-            if not keys:
-                continue
+            await _run_cycle(run)
+        except Exception:
+            logger.exception("Error flushing click counts from Redis to Postgres")
 
-            with SessionLocal() as db:
-                for key in keys:
-                    raw = r.getdel(key)
-                    if not raw:
-                        continue
-                    count = int(raw)
-                    code = key[len(CLICK_KEY_PREFIX) :]
-
-                    ts_raw = r.getdel(f"{LAST_ACCESSED_KEY_PREFIX}{code}")
-                    last_accessed = datetime.fromisoformat(ts_raw) if ts_raw else func.now()
-
-                    db.execute(
-                        update(Link)
-                        .where(Link.code == code)
-                        .values(
-                            click_count=Link.click_count + count,
-                            last_accessed_at=last_accessed,
-                        )
-                    )
-                db.commit()
 
+_SWEPT_EXPIRED = LINKS_SWEPT.labels("expired")
+_SWEPT_EXHAUSTED = LINKS_SWEPT.labels("max_clicks")
+
+
+async def _sweep_expired_links() -> None:
+    """
+    Background task: every EXPIRY_SWEEP_INTERVAL_SECONDS, sweep expired
+    and used-up links in bounded batches (see services.expiry_sweeper).
+    Runs in every worker, but only the click flush lease holder sweeps.
+    """
+
+    def run():
+        if not flush_lease.acquire():
+            return SweepStats(expired=0, exhausted=0)
+        with SessionLocal() as db:
+            return sweep_expired_links(
+                get_redis_client(),
+                db,
+                batch_size=settings.expiry_sweep_batch_size,
+                max_batches=settings.expiry_sweep_max_batches,
+            )
+
+    while True:
+        await asyncio.sleep(settings.expiry_sweep_interval_seconds)
+        try:
+            stats = await _run_cycle(run)
+            _SWEPT_EXPIRED.inc(stats.expired)
+            _SWEPT_EXHAUSTED.inc(stats.exhausted)
+        except Exception:
+            logger.exception("Error sweeping expired links")
+
+
+async def _rebuild_code_filter() -> None:
+    """Startup task: reload the Bloom filter of existing codes off the event loop."""
+
+    def run() -> None:
+        with SessionLocal() as db:
+            rebuild_code_filter(get_redis_client(), db)
+
+    try:
+        await asyncio.to_thread(run)
+    except Exception:
+        logger.exception("Error rebuilding the code filter")
+
+
+# Set once the startup cache warm-up has finished (or failed, or is off);
+# /health/ready answers 503 until then.
+cache_warmed = threading.Event()
+
+
+async def _warm_link_cache() -> None:
+    """Startup task: preload the hottest links so a deploy starts warm."""
+
+    def run() -> int:
+        return warm_link_cache_once(
+            get_redis_client(), SessionLocal, settings.cache_warmup_links, local_link_cache
+        )
+
+    try:
+        if settings.cache_warmup_links > 0:
+            started = asyncio.get_running_loop().time()
+            warmed = await asyncio.to_thread(run)
+            elapsed = asyncio.get_running_loop().time() - started
+            logger.info("Warmed %d links into the link cache in %.2fs", warmed, elapsed)
+    except Exception:
+        # A cold cache is slower, not broken: report ready anyway
+        logger.exception("Error warming the link cache")
+    finally:
+        cache_warmed.set()
+
+
+async def _publish_metrics() -> None:
+    """Background task: share this worker's metric totals for /metrics."""
+    r = get_redis_client()
+    while True:
+        await asyncio.sleep(METRICS_PUBLISH_SECONDS)
+        try:
+            await asyncio.to_thread(publish_snapshot, r)
         except Exception:
-            logger.exception("Error flushing click counts from Redis to Postgres")
+            logger.exception("Error publishing metrics to Redis")
+
+
+async def _write_sampled_profile() -> None:
+    """Background task: write out request-sampled stacks periodically."""
+    while True:
+        await asyncio.sleep(PROFILE_FLUSH_SECONDS)
+        try:
+            await asyncio.to_thread(profiler.write_sampled)
+        except Exception:
+            logger.exception("Error writing sampled profile")
+
+
+async def _sync_redirect_prelimiter() -> None:
+    """Background task: push locally counted redirect hits to Redis."""
+    r = get_redis_client()
+    interval = settings.redirect_prelimit_sync_ms / 1000
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(redirect_prelimiter.sync, r)
+        except Exception:
+            logger.exception("Error syncing the redirect pre-limiter to Redis")
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    # Refuse to start on an allocator misconfiguration, not on the first create
+    get_code_allocator()
     task = asyncio.create_task(_flush_click_counts())
+    prelimit_sync = (
+        asyncio.create_task(_sync_redirect_prelimiter()) if redirect_prelimiter else None
+    )
+    sweeper = (
+        asyncio.create_task(_sweep_expired_links())
+        if settings.expiry_sweep_interval_seconds > 0
+        else None
+    )
+    rebuild = asyncio.create_task(_rebuild_code_filter())
+    cache_warmed.clear()
+    warmup = asyncio.create_task(_warm_link_cache())
+    metrics_publisher = asyncio.create_task(_publish_metrics())
+    profile_writer = (
+        asyncio.create_task(_write_sampled_profile()) if profiler.sampling_requests else None
+    )
+    listeners = [
+        start_invalidation_listener(get_redis_client()),
+        start_api_key_invalidation_listener(get_redis_client()),
+        start_profile_listener(get_redis_client()),
+    ]
     yield
-    task.cancel()
+    for listener in listeners:
+        if listener is not None:
+            listener.stop()
+    if settings.async_mode:
+        await get_async_redis_client().aclose()
+    # Both loops finish a running cycle before their task ends, so the
+    # lease is released below only once nothing is flushing or sweeping
+    for loop_task in (task, sweeper):
+        if loop_task is None:
+            continue
+        loop_task.cancel()
+        try:
+            await loop_task
+        except asyncio.CancelledError:
+            pass
+    rebuild.cancel()
+    warmup.cancel()
+    metrics_publisher.cancel()
+    for refresh in list(_refresh_tasks):
+        refresh.cancel()
+    if profile_writer is not None:
+        profile_writer.cancel()
+        try:
+            profiler.write_sampled()
+        except Exception:
+            logger.exception("Could not write sampled profile on shutdown")
+    if prelimit_sync is not None:
+        prelimit_sync.cancel()
+        try:
+            # Hand the last buffered hits to Redis
+            redirect_prelimiter.sync(get_redis_client())
+        except Exception:
+            logger.exception("Could not sync the redirect pre-limiter on shutdown")
     try:
-        await task
-    except asyncio.CancelledError:
-        pass
+        flush_lease.release()
+        _FLUSHER_LEADER.set(0)
+    except Exception:
+        logger.exception("Could not release click flusher lease")
+    try:
+        # Keep this worker's final totals in the host aggregate
+        publish_snapshot(get_redis_client())
+    except Exception:
+        logger.exception("Could not publish final metrics")
 
 
 # ---------------------------------------------------------------------------
-# Redis link cache
+# Link cache (local LRU -> Redis -> Postgres)
 # ---------------------------------------------------------------------------
 
-LINK_CACHE_PREFIX = "link_cache:"
-LINK_CACHE_TTL = 60  # seconds — tune to taste
 
+_LOCAL_HIT = LINK_CACHE_LOOKUPS.labels("local_hit")
+_REDIS_HIT = LINK_CACHE_LOOKUPS.labels("redis_hit")
+_NEGATIVE_HIT = LINK_CACHE_LOOKUPS.labels("negative_hit")
+_CACHE_MISS = LINK_CACHE_LOOKUPS.labels("miss")
+
+_REDIRECT_ALLOWED = RATE_LIMIT_DECISIONS.labels("redirect", "allow")
+_REDIRECT_DENIED = RATE_LIMIT_DECISIONS.labels("redirect", "deny")
+
+_LINK_COLUMNS = (
+    Link.long_url,
+    Link.is_active,
+    Link.expires_at,
+    Link.max_clicks,
+    Link.click_count,
+    Link.owner_api_key_id,
+)
 
-def _get_link(code: str, db: Session, r) -> Link | None:
+
+def _get_link(code: str, db: Session, r) -> CachedLink | None:
     """
-    Look up a link by code. Checks Redis first; falls back to Postgres on
-    a cache miss and populates the cache for subsequent requests.
+    Look up a link by code. Checks the per-worker local cache, then Redis;
+    falls back to Postgres on a miss and populates both tiers for
+    subsequent requests.
 
     Only immutable / slow-changing fields are cached (long_url, is_active,
     expires_at, max_clicks). click_count is intentionally stored as the
-    Postgres value at cache-fill time; the redirect path adds the live Redis
-    buffer on top before enforcing max_clicks, so accuracy is maintained.
+    Postgres value at cache-fill time; the redirect script adds the live
+    Redis buffer on top before enforcing max_clicks, so accuracy is maintained.
     """
-    cache_key = f"{LINK_CACHE_PREFIX}{code}"
-    cached = r.get(cache_key)
+    link = local_link_cache.get(code)
+    if link is not None:
+        _LOCAL_HIT.inc()
+        return link
 
+    cached = r.get(f"{LINK_CACHE_PREFIX}{code}")
     if cached:
-        data = json.loads(cached)
-        link = Link()
-        link.id = data["id"]
-        link.code = data["code"]
-        link.long_url = data["long_url"]
-        link.is_active = data["is_active"]
-        link.expires_at = datetime.fromisoformat(data["expires_at"]) if data["expires_at"] else None
-        link.max_clicks = data["max_clicks"]
-        link.click_count = data["click_count"]
+        link = _link_from_payload(code, cached)
+        if link is not None:
+            _REDIS_HIT.inc()
+            return link
+
+    if is_known_missing(r, code):
+        _NEGATIVE_HIT.inc()
+        return None
+
+    _CACHE_MISS.inc()
+    return _load_link(code, db, r)
+
+
+def _link_from_payload(code: str, payload: str) -> CachedLink | None:
+    link = CachedLink.decode(payload)
+    if link is not None:
+        local_link_cache.set(code, link, len(payload))
+    return link
+
+
+def _cache_loaded_link(code: str, row) -> tuple[CachedLink, str]:
+    link = CachedLink.from_row(row)
+    payload = link.encode()
+    local_link_cache.set(code, link, len(payload))
+    return link, payload
+
+
+# Stampede protection for cache misses: within a worker, concurrent misses
+# on one code share a single load (single-flight); across workers, for
+# codes that keep missing, the holder of a short Redis fill lock reads
+# Postgres and the others wait for its cache entry. Hot entries are also
+# refreshed shortly before they expire (XFetch), in the background, so
+# they normally never go cold at all.
+link_fill_flight: SingleFlight[CachedLink | None] = SingleFlight()
+async_link_fill_flight: AsyncSingleFlight[CachedLink | None] = AsyncSingleFlight()
+fill_timer = FillTimer()
+recent_misses = RecentMisses()
+
+# Early refreshes in flight in this worker, so a hot code is queued once
+_refreshing: set[str] = set()
+_refreshing_lock = threading.Lock()
+# ASYNC_MODE refresh tasks; the loop only keeps weak references to tasks
+_refresh_tasks: set[asyncio.Task] = set()
+
+
+@lru_cache(maxsize=1)
+def _refresh_pool() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="link-refresh")
+
+
+@lru_cache(maxsize=1)
+def _fill_lock() -> FillLock:
+    return FillLock(get_redis_client())
+
+
+@lru_cache(maxsize=1)
+def _async_fill_lock() -> AsyncFillLock:
+    return AsyncFillLock(get_async_redis_client())
+
+
+def _waited_link(code: str, outcome: str | None) -> CachedLink | None | bool:
+    """Result another worker's fill left behind, or False to load it ourselves."""
+    if outcome == FILL_MISSING:
+        return None
+    if outcome is not None:
+        link = _link_from_payload(code, outcome)
+        if link is not None:
+            return link
+    return False
+
+
+def _load_link(code: str, db: Session, r) -> CachedLink | None:
+    """Cache miss — hit Postgres and populate both cache tiers (or the negative cache)."""
+    return link_fill_flight.do(code, lambda: _fill_link(code, db, r))
+
+
+def _fill_link(code: str, db: Session, r) -> CachedLink | None:
+    if not recent_misses.is_hot(code):
+        return _query_link(code, db, r)
+    lock = _fill_lock()
+    token = lock.acquire(code)
+    if token is None:
+        link = _waited_link(code, lock.wait_for_fill(code))
+        if link is not False:
+            return link
+    try:
+        return _query_link(code, db, r)
+    finally:
+        if token is not None:
+            lock.release(code, token)
+
+
+def _query_link(code: str, db: Session, r) -> CachedLink | None:
+    started = time.perf_counter()
+    row = db.execute(select(*_LINK_COLUMNS).where(Link.code == code)).first()
+    if row is None:
+        remember_missing(r, code)
+        return None
+
+    link, payload = _cache_loaded_link(code, row)
+    r.setex(f"{LINK_CACHE_PREFIX}{code}", LINK_CACHE_TTL, payload)
+    fill_timer.observe((time.perf_counter() - started) * 1000)
+    return link
+
+
+def _claim_refresh(code: str, result: RedirectResult) -> bool:
+    """XFetch: True if this request should reload the entry before it expires."""
+    if not should_refresh_early(
+        result.cache_ttl_ms, fill_timer.delta_ms, settings.link_cache_xfetch_beta
+    ):
+        return False
+    with _refreshing_lock:
+        if code in _refreshing:
+            return False
+        _refreshing.add(code)
+    return True
+
+
+def _refresh_done(code: str) -> None:
+    with _refreshing_lock:
+        _refreshing.discard(code)
+
+
+def _refresh_if_expiring(code: str, result: RedirectResult, r) -> None:
+    """Maybe reload a Redis cache entry on a background thread before it expires."""
+    if _claim_refresh(code, result):
+        _refresh_pool().submit(_refresh_link, code, r)
+
+
+def _refresh_link(code: str, r) -> None:
+    try:
+        lock = _fill_lock()
+        token = lock.acquire(code)
+        if token is None:
+            # someone is already refreshing or reloading it
+            return
+        try:
+            with SessionLocal() as db:
+                _query_link(code, db, r)
+        finally:
+            lock.release(code, token)
+    except Exception:
+        # the entry is still valid until its TTL runs out
+        logger.exception("Early refresh of link %s failed", code)
+    finally:
+        _refresh_done(code)
+
+
+async def _get_link_async(code: str, db: AsyncSession | None, r) -> CachedLink | None:
+    """asyncio counterpart of _get_link (redis.asyncio + AsyncSession)."""
+    link = local_link_cache.get(code)
+    if link is not None:
+        _LOCAL_HIT.inc()
         return link
 
-    # Cache miss — hit Postgres and populate
-    link = db.query(Link).filter(Link.code == code).first()
-    if link:
-        r.setex(
-            cache_key,
-            LINK_CACHE_TTL,
-            json.dumps(
-                {
-                    "id": str(link.id),
-                    "code": link.code,
-                    "long_url": link.long_url,
-                    "is_active": link.is_active,
-                    "expires_at": link.expires_at.isoformat() if link.expires_at else None,
-                    "max_clicks": link.max_clicks,
-                    "click_count": link.click_count,
-                }
-            ),
-        )
+    cached = await r.get(f"{LINK_CACHE_PREFIX}{code}")
+    if cached:
+        link = _link_from_payload(code, cached)
+        if link is not None:
+            _REDIS_HIT.inc()
+            return link
+
+    if await is_known_missing_async(r, code):
+        _NEGATIVE_HIT.inc()
+        return None
+
+    _CACHE_MISS.inc()
+    return await _load_link_async(code, db, r)
+
+
+async def _load_link_async(code: str, db: AsyncSession | None, r) -> CachedLink | None:
+    """db=None opens a session only now, so cache hits never touch the pool."""
+    return await async_link_fill_flight.do(code, lambda: _fill_link_async(code, db, r))
+
+
+async def _fill_link_async(code: str, db: AsyncSession | None, r) -> CachedLink | None:
+    if not recent_misses.is_hot(code):
+        return await _query_link_async(code, db, r)
+    lock = _async_fill_lock()
+    token = await lock.acquire(code)
+    if token is None:
+        link = _waited_link(code, await lock.wait_for_fill(code))
+        if link is not False:
+            return link
+    try:
+        return await _query_link_async(code, db, r)
+    finally:
+        if token is not None:
+            await lock.release(code, token)
+
+
+async def _query_link_async(code: str, db: AsyncSession | None, r) -> CachedLink | None:
+    if db is None:
+        async with get_async_sessionmaker()() as session:
+            return await _query_link_async(code, session, r)
+
+    started = time.perf_counter()
+    row = (await db.execute(select(*_LINK_COLUMNS).where(Link.code == code))).first()
+    if row is None:
+        await remember_missing_async(r, code)
+        return None
+
+    link, payload = _cache_loaded_link(code, row)
+    await r.setex(f"{LINK_CACHE_PREFIX}{code}", LINK_CACHE_TTL, payload)
+    fill_timer.observe((time.perf_counter() - started) * 1000)
     return link
 
 
-# ---------------------------------------------------------------------------
-# App
-# ---------------------------------------------------------------------------
+def _refresh_if_expiring_async(code: str, result: RedirectResult, r) -> None:
+    """_refresh_if_expiring as a task on the running event loop."""
+    if _claim_refresh(code, result):
+        task = asyncio.create_task(_refresh_link_async(code, r))
+        _refresh_tasks.add(task)
+        task.add_done_callback(_refresh_tasks.discard)
+
 
-app = FastAPI(title="URL Shortener API", lifespan=lifespan)
-app.include_router(api_router)
+async def _refresh_link_async(code: str, r) -> None:
+    try:
+        lock = _async_fill_lock()
+        token = await lock.acquire(code)
+        if token is None:
+            return
+        try:
+            # its own session: the request's is closed by the time this runs
+            await _query_link_async(code, None, r)
+        finally:
+            await lock.release(code, token)
+    except Exception:
+        logger.exception("Early refresh of link %s failed", code)
+    finally:
+        _refresh_done(code)
 
 
 # ---------------------------------------------------------------------------
@@ -145,7 +621,6 @@ app.include_router(api_router)
 # ---------------------------------------------------------------------------
 
 
-@app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
     err = normalize_http_exception(exc)
     headers = getattr(exc, "headers", None)
@@ -156,7 +631,6 @@ async def http_exception_handler(request: Request, exc: HTTPException):
     )
 
 
-@app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     return JSONResponse(
         status_code=422,
@@ -169,7 +643,6 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
     )
 
 
-@app.exception_handler(Exception)
 async def unhandled_exception_handler(request: Request, exc: Exception):
     return JSONResponse(
         status_code=500,
@@ -182,21 +655,35 @@ async def unhandled_exception_handler(request: Request, exc: Exception):
 # ---------------------------------------------------------------------------
 
 
-@app.get("/health")
 def health():
     return {"status": "ok"}
 
 
+def readiness():
+    """503 until this worker's startup cache warm-up has finished."""
+    if not cache_warmed.is_set():
+        return JSONResponse(status_code=503, content={"status": "warming"})
+    return {"status": "ready"}
+
+
+def metrics():
+    """Prometheus text format, summed over every worker on this host."""
+    return PlainTextResponse(
+        render_metrics(get_redis_client()),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
 # ---------------------------------------------------------------------------
 # Redirect helpers
 # ---------------------------------------------------------------------------
 
 
-def _raise_if_unusable(link: Link, now: datetime) -> None:
+def _raise_if_unusable(link: CachedLink, now_ms: int) -> None:
     if not link.is_active:
         raise HTTPException(status_code=403, detail="Link is disabled")
 
-    if link.expires_at is not None and now >= link.expires_at:
+    if link.expires_ms is not None and now_ms >= link.expires_ms:
         raise HTTPException(status_code=410, detail="Link is expired")
 
     if link.max_clicks is not None and link.click_count >= link.max_clicks:
@@ -208,38 +695,298 @@ def _raise_if_unusable(link: Link, now: datetime) -> None:
 # ---------------------------------------------------------------------------
 
 
-@app.head("/{code}")
 def redirect_head(code: str, db: Session = Depends(get_db)):
     r = get_redis_client()
     link = _get_link(code, db, r)
     if link is None:
         raise HTTPException(status_code=404, detail="Not Found")
 
-    now = datetime.now(timezone.utc)
-    _raise_if_unusable(link, now)
+    _raise_if_unusable(link, epoch_ms(datetime.now(timezone.utc)))
 
     # HEAD should not increment analytics
     return RedirectResponse(url=link.long_url, status_code=307)
 
 
-@app.get("/{code}")
-def redirect(code: str, db: Session = Depends(get_db), _: None = Depends(redirect_rate_limiter)):
+def _raise_for_result(result: RedirectResult) -> None:
+    if result.status == REDIRECT_NOT_FOUND:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if result.status == REDIRECT_RATE_LIMITED:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Rate limit exceeded. Try again in {result.retry_after}s.",
+        )
+    if result.status == REDIRECT_DISABLED:
+        raise HTTPException(status_code=403, detail="Link is disabled")
+    if result.status == REDIRECT_EXPIRED:
+        raise HTTPException(status_code=410, detail="Link is expired")
+    if result.status == REDIRECT_MAX_CLICKS:
+        raise HTTPException(status_code=410, detail="Max clicks exceeded")
+
+
+def _count_rate_limit(rate_limit: RateLimitRule | None, result: RedirectResult) -> None:
+    if rate_limit is not None:
+        denied = result.status == REDIRECT_RATE_LIMITED
+        (_REDIRECT_DENIED if denied else _REDIRECT_ALLOWED).inc()
+
+
+def _count_script_lookup(result: RedirectResult) -> None:
+    """Where the redirect script found (or did not find) the link."""
+    if result.status == REDIRECT_MISS:
+        _CACHE_MISS.inc()
+    elif result.status == REDIRECT_NOT_FOUND:
+        _NEGATIVE_HIT.inc()
+    elif result.status != REDIRECT_RATE_LIMITED:
+        _REDIS_HIT.inc()
+
+
+def redirect(
+    code: str,
+    request: Request,
+    db: Session = Depends(get_db),
+    rate_limit: RateLimitRule | None = Depends(redirect_rate_limiter),
+):
+    """
+    Rate limit, max_clicks check and click buffering run in a single Redis
+    script call. A local cache hit costs one round trip; a Redis cache hit
+    also costs one (the script returns the cached payload); only a full
+    miss goes to Postgres and re-runs the script without the rate limit.
+    """
     r = get_redis_client()
-    link = _get_link(code, db, r)
+    engine = get_redirect_engine()
+    now = datetime.now(timezone.utc)
+    visitor = visitor_id(get_client_ip(request))
+
+    now_ms = epoch_ms(now)
+
+    link = local_link_cache.get(code)
+    if link is not None:
+        _LOCAL_HIT.inc()
+        _raise_if_unusable(link, now_ms)
+        result = engine.run(code, now, rate_limit, link=link, visitor=visitor)
+        _count_rate_limit(rate_limit, result)
+    else:
+        result = engine.run(code, now, rate_limit, visitor=visitor)
+        _count_rate_limit(rate_limit, result)
+        _count_script_lookup(result)
+        if result.status == REDIRECT_MISS:
+            link = _load_link(code, db, r)
+            if link is None:
+                raise HTTPException(status_code=404, detail="Not Found")
+            _raise_if_unusable(link, now_ms)
+            # rate limit was already charged by the first call
+            result = engine.run(code, now, link=link, visitor=visitor)
+        elif result.payload is not None:
+            link = _link_from_payload(code, result.payload)
+            _refresh_if_expiring(code, result, r)
+
+    _raise_for_result(result)
+
+    # Click buffered in Redis — flushed to Postgres every FLUSH_INTERVAL_SECONDS
+    return RedirectResponse(url=link.long_url, status_code=307)
+
+
+# ---------------------------------------------------------------------------
+# Async redirect endpoints (ASYNC_MODE)
+# ---------------------------------------------------------------------------
+
 
+async def _head_target_async(code: str, db: AsyncSession | None) -> str:
+    r = get_async_redis_client()
+    link = await _get_link_async(code, db, r)
     if link is None:
         raise HTTPException(status_code=404, detail="Not Found")
 
+    _raise_if_unusable(link, epoch_ms(datetime.now(timezone.utc)))
+
+    # HEAD should not increment analytics
+    return link.long_url
+
+
+async def _redirect_target_async(
+    code: str, db: AsyncSession | None, rate_limit: RateLimitRule | None, client_ip: str
+) -> str:
+    """
+    Same flow as redirect, but awaits redis.asyncio and AsyncSession.
+    Returns the target URL or raises HTTPException.
+    """
+    r = get_async_redis_client()
+    engine = get_async_redirect_engine()
     now = datetime.now(timezone.utc)
+    now_ms = epoch_ms(now)
+    visitor = visitor_id(client_ip)
+
+    link = local_link_cache.get(code)
+    if link is not None:
+        _LOCAL_HIT.inc()
+        _raise_if_unusable(link, now_ms)
+        result = await engine.run(code, now, rate_limit, link=link, visitor=visitor)
+        _count_rate_limit(rate_limit, result)
+    else:
+        result = await engine.run(code, now, rate_limit, visitor=visitor)
+        _count_rate_limit(rate_limit, result)
+        _count_script_lookup(result)
+        if result.status == REDIRECT_MISS:
+            link = await _load_link_async(code, db, r)
+            if link is None:
+                raise HTTPException(status_code=404, detail="Not Found")
+            _raise_if_unusable(link, now_ms)
+            # rate limit was already charged by the first call
+            result = await engine.run(code, now, link=link, visitor=visitor)
+        elif result.payload is not None:
+            link = _link_from_payload(code, result.payload)
+            _refresh_if_expiring_async(code, result, r)
+
+    _raise_for_result(result)
+    return link.long_url
+
+
+async def redirect_head_async(code: str, db: AsyncSession = Depends(get_async_db)):
+    return RedirectResponse(url=await _head_target_async(code, db), status_code=307)
+
+
+async def redirect_async(
+    code: str,
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    rate_limit: RateLimitRule | None = Depends(redirect_rate_limiter),
+):
+    """Runs on the event loop so in-flight redirects are not capped by the threadpool."""
+    url = await _redirect_target_async(code, db, rate_limit, get_client_ip(request))
+    return RedirectResponse(url=url, status_code=307)
 
-    # Add unflushed Redis buffer to in-memory count so max_clicks is accurate
-    buffered = int(r.get(f"{CLICK_KEY_PREFIX}{link.code}") or 0)
-    link.click_count = link.click_count + buffered
 
-    _raise_if_unusable(link, now)
+# ---------------------------------------------------------------------------
+# Raw ASGI fast path (REDIRECT_FAST_PATH)
+# ---------------------------------------------------------------------------
 
-    # Buffer click in Redis — flushed to Postgres every FLUSH_INTERVAL_SECONDS
-    r.incr(f"{CLICK_KEY_PREFIX}{link.code}")
-    r.set(f"{LAST_ACCESSED_KEY_PREFIX}{link.code}", now.isoformat(), ex=300)
+# Same quoting as starlette's RedirectResponse, so Location headers match.
+_LOCATION_SAFE = ":/%#?=@[]!$&'()*+,;"
 
-    return RedirectResponse(url=link.long_url, status_code=307)
+
+@lru_cache(maxsize=256)
+def _error_response(status_code: int, message: str) -> tuple[list, bytes]:
+    """Pre-rendered error body, byte-identical to the JSON exception handlers."""
+    code = STATUS_TO_ERROR_CODE.get(status_code, "ERROR")
+    body = json.dumps(
+        {"error": {"code": code, "message": message}},
+        ensure_ascii=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+    headers = [
+        (b"content-length", str(len(body)).encode("latin-1")),
+        (b"content-type", b"application/json"),
+    ]
+    return headers, body
+
+
+class RedirectFastPath:
+    """
+    ASGI middleware answering GET/HEAD /{code} before FastAPI sees them.
+
+    Skips routing, the dependency graph, Request/Response objects and the
+    exception-handler machinery; a DB session is opened only on a cache
+    miss. Status codes and error bodies are the same as the regular
+    redirect routes. Every other request is passed through untouched.
+    """
+
+    def __init__(self, app, router) -> None:
+        self.app = app
+        self.router = router
+        self._reserved: frozenset[str] | None = None
+
+    def _is_redirect_path(self, path: str) -> bool:
+        if self._reserved is None:
+            # Static single-segment routes (/health, /docs, ...) win over /{code}
+            paths = (getattr(route, "path", "") for route in self.router.routes)
+            self._reserved = frozenset(p[1:] for p in paths if p and "{" not in p)
+        code = path[1:]
+        return bool(code) and "/" not in code and code not in self._reserved
+
+    async def __call__(self, scope, receive, send) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["method"] not in ("GET", "HEAD")
+            or not self._is_redirect_path(scope["path"])
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        code = scope["path"][1:]
+        started = time.perf_counter()
+        try:
+            if scope["method"] == "HEAD":
+                url = await _head_target_async(code, None)
+            else:
+                client = scope.get("client")
+                client_ip = client[0] if client else "unknown"
+                rate_limit = redirect_rate_limit_rule(client_ip)
+                url = await _redirect_target_async(code, None, rate_limit, client_ip)
+            status = 307
+            headers = [
+                (b"content-length", b"0"),
+                (b"location", quote(url, safe=_LOCATION_SAFE).encode("latin-1")),
+            ]
+            body = b""
+        except HTTPException as exc:
+            err = normalize_http_exception(exc)
+            status = exc.status_code
+            headers, body = _error_response(status, err.message)
+        except Exception:
+            logger.exception("Unhandled error in redirect fast path")
+            status = 500
+            headers, body = _error_response(500, "Internal server error.")
+
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send(
+            {"type": "http.response.body", "body": b"" if scope["method"] == "HEAD" else body}
+        )
+        # Timed here rather than by MetricsMiddleware, which sits inside
+        # this handler: wrapping send costs more than the rest of it.
+        record_request("/{code}", scope["method"], status, time.perf_counter() - started)
+
+
+# ---------------------------------------------------------------------------
+# App
+# ---------------------------------------------------------------------------
+
+
+def create_app(async_mode: bool | None = None) -> FastAPI:
+    """
+    Build the ASGI app. async_mode (default: ASYNC_MODE) picks the sync or
+    the asyncio handlers for the redirect and /api/v1 routes.
+    """
+    if async_mode is None:
+        async_mode = settings.async_mode
+
+    app = FastAPI(title="URL Shortener API", lifespan=lifespan)
+    app.include_router(async_api_router if async_mode else api_router)
+
+    app.add_exception_handler(HTTPException, http_exception_handler)
+    app.add_exception_handler(RequestValidationError, validation_exception_handler)
+    app.add_exception_handler(Exception, unhandled_exception_handler)
+
+    app.add_api_route("/health", health, methods=["GET"])
+    app.add_api_route("/health/ready", readiness, methods=["GET"])
+    app.add_api_route("/metrics", metrics, methods=["GET"], response_class=PlainTextResponse)
+
+    # Registered last so the catch-all /{code} never shadows /health or /api/v1.
+    if async_mode:
+        app.add_api_route("/{code}", redirect_head_async, methods=["HEAD"])
+        app.add_api_route("/{code}", redirect_async, methods=["GET"])
+    else:
+        app.add_api_route("/{code}", redirect_head, methods=["HEAD"])
+        app.add_api_route("/{code}", redirect, methods=["GET"])
+
+    app.add_middleware(MetricsMiddleware)
+
+    if settings.redirect_fast_path:
+        app.add_middleware(RedirectFastPath, router=app.router)
+
+    # Outermost, so sampled requests include the fast path
+    if profiler.sampling_requests:
+        app.add_middleware(ProfilingMiddleware)
+
+    return app
+
+
+app = create_app()
@@ -0,0 +1,20 @@
+from typing import Literal
+
+from pydantic import BaseModel, Field
+
+from urlshortenerapi.core.profiling import PROFILE_MAX_SECONDS
+
+
+class ProfileWindowRequest(BaseModel):
+    seconds: float = Field(default=30, gt=0, le=PROFILE_MAX_SECONDS)
+    # Defaults to PROFILE_FORMAT
+    format: Literal["collapsed", "speedscope"] | None = None
+
+
+class ProfileWindowResponse(BaseModel):
+    seconds: float
+    format: str
+    # Workers subscribed to the profile channel when the request was sent;
+    # each writes its own file to `directory`
+    workers: int
+    directory: str
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, HttpUrl, ConfigDict, field_validator
-from typing import Optional
+from pydantic import BaseModel, HttpUrl, ConfigDict, Field, field_validator
+from typing import Any, Dict, Optional
 from datetime import datetime
 import re
 from typing import List
@@ -7,6 +7,8 @@ from typing import List
 
 _ALIAS_RE = re.compile(r"^[a-zA-Z0-9_-]{3,32}$")
 
+BATCH_CREATE_MAX_ITEMS = 1000
+
 
 class CreateLinkRequest(BaseModel):
     url: HttpUrl
@@ -52,6 +54,26 @@ class LinkResponse(BaseModel):
     max_clicks: Optional[int] = None  # None means unlimited
 
 
+class BatchCreateLinksRequest(BaseModel):
+    # Items are validated one by one so a bad item fails alone, not the batch
+    items: List[Dict[str, Any]] = Field(min_length=1, max_length=BATCH_CREATE_MAX_ITEMS)
+
+
+class BatchItemError(BaseModel):
+    code: str
+    message: str
+
+
+class BatchCreateLinkResult(BaseModel):
+    index: int
+    link: Optional[LinkResponse] = None
+    error: Optional[BatchItemError] = None
+
+
+class BatchCreateLinksResponse(BaseModel):
+    items: List[BatchCreateLinkResult]
+
+
 class LinkStatsResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
@@ -86,6 +108,24 @@ class PatchLinkRequest(BaseModel):
     is_active: bool
 
 
+class ClickBucket(BaseModel):
+    start: datetime
+    clicks: int
+    # Daily buckets inside the unique-visitor retention window only
+    unique_visitors: Optional[int] = None
+
+
 class LinkAnalyticsResponse(BaseModel):
     click_count: int
     last_accessed_at: Optional[datetime] = None
+    # Approximate (HyperLogLog) distinct visitors over the requested range,
+    # or over the whole retention window when no range is given
+    unique_visitors: int = 0
+    # Set only when a range was requested (from/to/granularity)
+    granularity: Optional[str] = None
+    buckets: Optional[List[ClickBucket]] = None
+
+
+class OwnerAnalyticsResponse(BaseModel):
+    # Approximate distinct visitors across all of the caller's links
+    unique_visitors: int
@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import logging
+import uuid
+from datetime import datetime, timezone
+from typing import NamedTuple
+
+from redis import Redis
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from urlshortenerapi.core.config import settings
+from urlshortenerapi.db.models import ApiKey
+from urlshortenerapi.services.link_cache import LocalLinkCache
+
+logger = logging.getLogger(__name__)
+
+API_KEY_CACHE_PREFIX = "api_key:"
+# Also bounds how long a key revoked mid-lookup can stay usable: a lookup
+# that read the row just before the revoke commits may re-cache it.
+API_KEY_CACHE_TTL = 60  # seconds
+
+API_KEY_INVALIDATE_CHANNEL = "api_key:invalidate"
+
+
+class ApiKeyPrincipal(NamedTuple):
+    """
+    The authenticated caller, as far as the routes care.
+    Encoded for Redis as "id|name".
+    """
+
+    id: uuid.UUID
+    name: str
+
+    def encode(self) -> str:
+        return f"{self.id}|{self.name}"
+
+    @classmethod
+    def decode(cls, payload: str) -> ApiKeyPrincipal | None:
+        try:
+            id_s, name = payload.split("|", 1)
+            return cls(id=uuid.UUID(id_s), name=name)
+        except ValueError:
+            return None
+
+
+# Same LRU/TTL structure as the link cache, keyed by key hash.
+local_api_key_cache = LocalLinkCache(
+    max_entries=settings.api_key_cache_max_entries,
+    max_bytes=settings.api_key_cache_max_entries * 512,
+    ttl_seconds=settings.api_key_cache_ttl_seconds,
+)
+
+
+def _cache_locally(key_hash: str, principal: ApiKeyPrincipal) -> None:
+    local_api_key_cache.set(key_hash, principal, size=len(principal.name) + 64)
+
+
+def _active_key_query(key_hash: str):
+    return select(ApiKey.id, ApiKey.name).where(
+        ApiKey.key_hash == key_hash,
+        ApiKey.revoked_at.is_(None),
+    )
+
+
+def resolve_api_key(r: Redis, db: Session, key_hash: str) -> ApiKeyPrincipal | None:
+    """
+    Look up an active API key by hash: local cache, then Redis, then
+    Postgres. Returns None for unknown or revoked keys.
+    """
+    principal = local_api_key_cache.get(key_hash)
+    if principal is not None:
+        return principal
+
+    payload = r.get(f"{API_KEY_CACHE_PREFIX}{key_hash}")
+    principal = ApiKeyPrincipal.decode(payload) if payload else None
+
+    if principal is None:
+        row = db.execute(_active_key_query(key_hash)).first()
+        if row is None:
+            return None
+        principal = ApiKeyPrincipal(id=row.id, name=row.name)
+        r.setex(f"{API_KEY_CACHE_PREFIX}{key_hash}", API_KEY_CACHE_TTL, principal.encode())
+
+    _cache_locally(key_hash, principal)
+    return principal
+
+
+async def resolve_api_key_async(r, db: AsyncSession, key_hash: str) -> ApiKeyPrincipal | None:
+    """asyncio counterpart of resolve_api_key (redis.asyncio + AsyncSession)."""
+    principal = local_api_key_cache.get(key_hash)
+    if principal is not None:
+        return principal
+
+    payload = await r.get(f"{API_KEY_CACHE_PREFIX}{key_hash}")
+    principal = ApiKeyPrincipal.decode(payload) if payload else None
+
+    if principal is None:
+        row = (await db.execute(_active_key_query(key_hash))).first()
+        if row is None:
+            return None
+        principal = ApiKeyPrincipal(id=row.id, name=row.name)
+        await r.setex(f"{API_KEY_CACHE_PREFIX}{key_hash}", API_KEY_CACHE_TTL, principal.encode())
+
+    _cache_locally(key_hash, principal)
+    return principal
+
+
+def invalidate_api_key(r: Redis, key_hash: str) -> None:
+    """Drop a key from Redis and from every worker's local cache."""
+    r.delete(f"{API_KEY_CACHE_PREFIX}{key_hash}")
+    local_api_key_cache.invalidate(key_hash)
+    r.publish(API_KEY_INVALIDATE_CHANNEL, key_hash)
+
+
+def revoke_api_key(r: Redis, db: Session, api_key_id: uuid.UUID) -> bool:
+    """
+    Mark a key revoked and evict it from the caches.
+    Returns False if the key does not exist or was already revoked.
+    """
+    key_hash = db.execute(
+        update(ApiKey)
+        .where(ApiKey.id == api_key_id, ApiKey.revoked_at.is_(None))
+        .values(revoked_at=datetime.now(timezone.utc))
+        .returning(ApiKey.key_hash)
+    ).scalar_one_or_none()
+    db.commit()
+
+    if key_hash is None:
+        return False
+    invalidate_api_key(r, key_hash)
+    return True
+
+
+def _on_invalidate_message(message: dict) -> None:
+    local_api_key_cache.invalidate(message["data"])
+
+
+def start_api_key_invalidation_listener(r: Redis):
+    """
+    Subscribe to API key invalidations on a daemon thread.
+    Returns the worker thread (call .stop() on shutdown), or None if Redis
+    is unreachable — the local TTL still bounds staleness in that case.
+    """
+    if not local_api_key_cache.enabled:
+        return None
+
+    try:
+        pubsub = r.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{API_KEY_INVALIDATE_CHANNEL: _on_invalidate_message})
+        return pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+    except Exception:
+        logger.exception("Could not subscribe to API key invalidation channel")
+        return None
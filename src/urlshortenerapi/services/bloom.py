@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import math
+from datetime import datetime, timedelta, timezone
+from typing import Iterable
+
+from redis import Redis
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from urlshortenerapi.core.config import settings
+from urlshortenerapi.db.models import Link
+
+logger = logging.getLogger(__name__)
+
+# The bitmap key carries the filter's size and hash count
+# ("bloom:codes:<bits>:<hashes>"): a worker configured differently reads
+# and builds its own filter instead of checking bits that were never set.
+CODE_FILTER_KEY_PREFIX = "bloom:codes"
+# Every fully built filter, so creates keep all of them current while
+# workers with different settings overlap (e.g. in a rolling deploy).
+CODE_FILTERS_KEY = "bloom:filters"
+_REBUILD_LOCK_TTL = 300  # seconds; one rebuild per deploy window
+_REBUILD_BATCH_SIZE = 10_000
+
+
+class BloomFilter:
+    """
+    Bloom filter stored as a Redis bitmap.
+
+    Bit positions are computed client-side (double hashing over one
+    blake2b digest) so a lookup is k GETBITs, which callers can fold into
+    a pipeline or a Lua script. False positives fall through to Postgres;
+    there are no false negatives as long as every created code is add()-ed.
+    """
+
+    def __init__(self, prefix: str, size_bits: int, num_hashes: int) -> None:
+        self.size_bits = size_bits
+        self.num_hashes = num_hashes
+        self.key = f"{prefix}:{size_bits}:{num_hashes}"
+
+    @classmethod
+    def for_capacity(cls, prefix: str, capacity: int, error_rate: float) -> BloomFilter:
+        size_bits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        num_hashes = max(1, round(size_bits / capacity * math.log(2)))
+        return cls(prefix, size_bits, num_hashes)
+
+    @classmethod
+    def from_key(cls, key: str) -> BloomFilter:
+        prefix, size_bits, num_hashes = key.rsplit(":", 2)
+        return cls(prefix, int(size_bits), int(num_hashes))
+
+    def positions(self, code: str) -> list[int]:
+        digest = hashlib.blake2b(code.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size_bits for i in range(self.num_hashes)]
+
+    def add(self, r: Redis, codes: Iterable[str], key: str | None = None) -> None:
+        pipe = r.pipeline(transaction=False)
+        self._queue_add(pipe, codes, key or self.key)
+        pipe.execute()
+
+    def _queue_add(self, pipe, codes: Iterable[str], key: str) -> None:
+        for code in codes:
+            for pos in self.positions(code):
+                pipe.setbit(key, pos, 1)
+
+
+code_filter = BloomFilter.for_capacity(
+    CODE_FILTER_KEY_PREFIX,
+    capacity=settings.code_filter_capacity,
+    error_rate=settings.code_filter_error_rate,
+)
+
+
+def add_new_codes(r: Redis, codes: list[str]) -> None:
+    """
+    Add codes to every built filter, whatever its parameters. A filter that
+    is not built yet is left alone: bits set in a missing key would create
+    a partial filter that redirects trust (its rebuild picks the codes up).
+    """
+    keys = r.smembers(CODE_FILTERS_KEY)
+    if not keys:
+        return
+    pipe = r.pipeline(transaction=False)
+    for key in keys:
+        BloomFilter.from_key(key)._queue_add(pipe, codes, key)
+    pipe.execute()
+
+
+async def add_new_codes_async(r, codes: list[str]) -> None:
+    """asyncio counterpart of add_new_codes."""
+    keys = await r.smembers(CODE_FILTERS_KEY)
+    if not keys:
+        return
+    pipe = r.pipeline(transaction=False)
+    for key in keys:
+        BloomFilter.from_key(key)._queue_add(pipe, codes, key)
+    await pipe.execute()
+
+
+def rebuild_code_filter(r: Redis, db: Session) -> int | None:
+    """
+    Rebuild the code filter from Postgres into a scratch key, then swap it
+    in atomically. Codes created while the scan ran are re-added after the
+    swap so they can never be reported missing.
+
+    Returns the number of codes loaded, or None if another worker holds the
+    rebuild lock.
+    """
+    if not r.set(f"{code_filter.key}:rebuild", "1", nx=True, ex=_REBUILD_LOCK_TTL):
+        return None
+
+    started = datetime.now(timezone.utc)
+    scratch = f"{code_filter.key}:building"
+    r.delete(scratch)
+    # Allocate the whole bitmap once instead of growing it bit by bit
+    r.setbit(scratch, code_filter.size_bits - 1, 0)
+
+    count = 0
+    result = db.execute(select(Link.code).execution_options(yield_per=_REBUILD_BATCH_SIZE))
+    for batch in result.scalars().partitions():
+        code_filter.add(r, batch, key=scratch)
+        count += len(batch)
+
+    r.rename(scratch, code_filter.key)
+    r.sadd(CODE_FILTERS_KEY, code_filter.key)
+
+    # created_at is stamped just before commit, so allow some slack
+    since = started - timedelta(minutes=1)
+    late = db.execute(select(Link.code).where(Link.created_at >= since)).scalars().all()
+    if late:
+        code_filter.add(r, late)
+
+    logger.info("Rebuilt code filter with %d codes", count)
+    return count
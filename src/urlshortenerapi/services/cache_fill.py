@@ -0,0 +1,277 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import random
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Generic, TypeVar
+
+from redis import Redis
+
+from urlshortenerapi.services.leases import RELEASE_LUA
+from urlshortenerapi.services.link_cache import (
+    LINK_CACHE_PREFIX,
+    LINK_CACHE_TTL,
+    NEGATIVE_CACHE_PREFIX,
+)
+
+T = TypeVar("T")
+
+# Held by the one process reloading a link from Postgres. Short: it only
+# has to outlive one indexed query and a SETEX; if the holder dies, the
+# waiters load the link themselves once it lapses.
+FILL_LOCK_PREFIX = "link_fill:"
+FILL_LOCK_TTL_MS = 1000
+
+# How often a waiting process looks for the holder's result
+FILL_POLL_SECONDS = 0.01
+
+# A code that misses again within this window is hot enough for the fill
+# lock. Most codes miss once and are never requested again.
+FILL_HOT_WINDOW_SECONDS = 2 * LINK_CACHE_TTL
+FILL_HOT_MAX_CODES = 10_000
+
+# wait_for_fill results besides a payload
+FILL_MISSING = "missing"
+FILL_GIVE_UP = None
+
+
+class SingleFlight(Generic[T]):
+    """
+    Coalesces concurrent calls for the same key within one process: the
+    first caller runs the loader, later callers block until it finishes
+    and get the same result (or exception).
+
+    Thread-safe: sync route handlers run in Starlette's threadpool.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: dict[str, _Call[T]] = {}
+
+    def do(self, key: str, fn: Callable[[], T]) -> T:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+class _Call(Generic[T]):
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: T | None = None
+        self.error: BaseException | None = None
+
+
+class AsyncSingleFlight(Generic[T]):
+    """asyncio counterpart of SingleFlight (one event loop per worker)."""
+
+    def __init__(self) -> None:
+        self._calls: dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        while (pending := self._calls.get(key)) is not None:
+            try:
+                # shield: a cancelled follower must not cancel the leader's load
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # the leader was cancelled (client went away): take over
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            # followers re-raise it; don't warn when there are none
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+
+class RecentMisses:
+    """
+    Codes that missed the cache recently in this process, oldest first,
+    bounded to `max_codes`. A second miss within `window` seconds marks the
+    code as hot; only hot codes take the Redis fill lock, so a one-off miss
+    costs one query instead of a query plus a SET NX and a release.
+
+    Thread-safe: sync route handlers run in Starlette's threadpool.
+    """
+
+    def __init__(
+        self,
+        window: float = FILL_HOT_WINDOW_SECONDS,
+        max_codes: int = FILL_HOT_MAX_CODES,
+    ) -> None:
+        self.window = window
+        self._max_codes = max_codes
+        self._lock = threading.Lock()
+        self._misses: OrderedDict[str, float] = OrderedDict()
+
+    def is_hot(self, code: str, now: float | None = None) -> bool:
+        """Record a miss on `code`; True if it also missed within the window."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            last = self._misses.pop(code, None)
+            self._misses[code] = now
+            if len(self._misses) > self._max_codes:
+                self._misses.popitem(last=False)
+        return last is not None and now - last < self.window
+
+
+class FillTimer:
+    """
+    Moving average of how long a cache fill takes (the XFetch "delta").
+    One per process; the fill query is the same indexed lookup for every
+    code, so a shared estimate is close enough.
+    """
+
+    def __init__(self, initial_ms: float = 5.0, alpha: float = 0.1) -> None:
+        self.delta_ms = initial_ms
+        self._alpha = alpha
+
+    def observe(self, elapsed_ms: float) -> None:
+        self.delta_ms += self._alpha * (elapsed_ms - self.delta_ms)
+
+
+def should_refresh_early(
+    ttl_ms: int,
+    delta_ms: float,
+    beta: float,
+    rand: Callable[[], float] = random.random,
+) -> bool:
+    """
+    XFetch (Vattani et al.): refresh before expiry with a probability that
+    rises as the entry nears expiry and with how slow a fill is. Across all
+    requests for a key, one of them almost surely refreshes it shortly
+    before it expires, so it never goes cold while it is hot.
+    ttl_ms < 0 means no TTL information; beta = 0 disables it.
+    """
+    if ttl_ms < 0 or beta <= 0:
+        return False
+    # 1 - random() is in (0, 1], so the log is defined
+    return -delta_ms * beta * math.log(1.0 - rand()) >= ttl_ms
+
+
+def _lock_key(code: str) -> str:
+    return f"{FILL_LOCK_PREFIX}{code}"
+
+
+def _queue_fill_checks(pipe, code: str) -> None:
+    pipe.get(f"{LINK_CACHE_PREFIX}{code}")
+    pipe.exists(f"{NEGATIVE_CACHE_PREFIX}{code}")
+    pipe.exists(_lock_key(code))
+
+
+def _fill_outcome(results: list) -> str | None | bool:
+    """The payload, FILL_MISSING, FILL_GIVE_UP (lock gone) or True (keep waiting)."""
+    payload, missing, locked = results
+    if payload:
+        return payload
+    if missing:
+        return FILL_MISSING
+    return True if locked else FILL_GIVE_UP
+
+
+class FillLock:
+    """Short Redis lock so only one process reloads a given code."""
+
+    def __init__(self, r: Redis, ttl_ms: int = FILL_LOCK_TTL_MS) -> None:
+        self._r = r
+        self.ttl_ms = ttl_ms
+        self._release = r.register_script(RELEASE_LUA)
+
+    def acquire(self, code: str) -> str | None:
+        token = secrets.token_hex(8)
+        if self._r.set(_lock_key(code), token, nx=True, px=self.ttl_ms):
+            return token
+        return None
+
+    def release(self, code: str, token: str) -> None:
+        # Only the holder deletes it; a lapsed lock may belong to someone else now
+        self._release(keys=[_lock_key(code)], args=[token])
+
+    def wait_for_fill(self, code: str) -> str | None:
+        """
+        Wait for the holder to cache the link. Returns its payload,
+        FILL_MISSING if it turned out not to exist, or FILL_GIVE_UP if the
+        lock went away without a result (load it yourself).
+        """
+        deadline = time.monotonic() + self.ttl_ms / 1000
+        while time.monotonic() < deadline:
+            pipe = self._r.pipeline(transaction=False)
+            _queue_fill_checks(pipe, code)
+            outcome = _fill_outcome(pipe.execute())
+            if outcome is not True:
+                return outcome
+            time.sleep(FILL_POLL_SECONDS)
+        return FILL_GIVE_UP
+
+
+class AsyncFillLock:
+    """asyncio counterpart of FillLock."""
+
+    def __init__(self, r, ttl_ms: int = FILL_LOCK_TTL_MS) -> None:
+        self._r = r
+        self.ttl_ms = ttl_ms
+        self._release = r.register_script(RELEASE_LUA)
+
+    async def acquire(self, code: str) -> str | None:
+        token = secrets.token_hex(8)
+        if await self._r.set(_lock_key(code), token, nx=True, px=self.ttl_ms):
+            return token
+        return None
+
+    async def release(self, code: str, token: str) -> None:
+        await self._release(keys=[_lock_key(code)], args=[token])
+
+    async def wait_for_fill(self, code: str) -> str | None:
+        deadline = time.monotonic() + self.ttl_ms / 1000
+        while time.monotonic() < deadline:
+            pipe = self._r.pipeline(transaction=False)
+            _queue_fill_checks(pipe, code)
+            outcome = _fill_outcome(await pipe.execute())
+            if outcome is not True:
+                return outcome
+            await asyncio.sleep(FILL_POLL_SECONDS)
+        return FILL_GIVE_UP
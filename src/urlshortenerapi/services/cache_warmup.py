@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import logging
+import random
+import time
+from typing import Callable
+
+from redis import Redis
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from urlshortenerapi.db.models import Link
+from urlshortenerapi.services.link_cache import (
+    LINK_CACHE_PREFIX,
+    LINK_CACHE_TTL,
+    CachedLink,
+    LocalLinkCache,
+)
+
+logger = logging.getLogger(__name__)
+
+WARMUP_BATCH_SIZE = 500
+
+# One worker per deploy window runs the warm-up query: the one that takes
+# the lock. It publishes the warmed codes, hottest first, and the other
+# workers fill their local caches from the Redis entries those codes name.
+WARMUP_LOCK_KEY = "link_cache:warmup:lock"
+WARMUP_CODES_KEY = "link_cache:warmup:codes"
+# Seconds. The holder renews the lock with every batch, so a dead holder
+# lets it lapse quickly; a finished warm-up keeps it (and the codes) for
+# the deploy window.
+_WARMUP_LOCK_TTL = 30
+_WARMUP_WINDOW = 300
+_WARMUP_POLL_SECONDS = 0.5
+# Longest a worker waits for another worker's warm-up before going ready cold
+_WARMUP_MAX_WAIT_SECONDS = 60
+
+_WARMUP_COLUMNS = (
+    Link.code,
+    Link.long_url,
+    Link.is_active,
+    Link.expires_at,
+    Link.max_clicks,
+    Link.click_count,
+    Link.owner_api_key_id,
+)
+
+
+def _warmup_ttl() -> int:
+    # Spread expiries over a second TTL so the warmed set does not go
+    # cold all at once one TTL after the deploy.
+    return LINK_CACHE_TTL + random.randrange(LINK_CACHE_TTL)
+
+
+def warm_link_cache(
+    r: Redis,
+    db: Session,
+    limit: int,
+    local_cache: LocalLinkCache | None = None,
+    batch_size: int = WARMUP_BATCH_SIZE,
+    codes_key: str | None = None,
+    lock_key: str | None = None,
+) -> int:
+    """
+    Preload the `limit` most clicked links (most recently used first on
+    ties) into the Redis link cache, one pipelined batch of SETEX per
+    `batch_size` rows, and into `local_cache` while it has room. With
+    `codes_key`, the warmed codes are also appended to that Redis list.
+    With `lock_key`, each batch also renews that lock for _WARMUP_LOCK_TTL.
+
+    Entries are written the same way a cache miss fills them, so a link
+    changed mid-warm-up is at worst stale for one TTL, as with any fill.
+    Returns the number of links warmed.
+    """
+    if limit <= 0:
+        return 0
+
+    stmt = (
+        select(*_WARMUP_COLUMNS)
+        .order_by(Link.click_count.desc(), Link.last_accessed_at.desc().nulls_last())
+        .limit(limit)
+        .execution_options(yield_per=batch_size)
+    )
+    local_room = local_cache.max_entries if local_cache is not None and local_cache.enabled else 0
+
+    warmed = 0
+    for rows in db.execute(stmt).partitions():
+        pipe = r.pipeline(transaction=False)
+        for row in rows:
+            link = CachedLink.from_row(row)
+            payload = link.encode()
+            pipe.setex(f"{LINK_CACHE_PREFIX}{row.code}", _warmup_ttl(), payload)
+            if warmed < local_room:
+                local_cache.set(row.code, link, len(payload))
+            warmed += 1
+        if codes_key is not None:
+            pipe.rpush(codes_key, *[row.code for row in rows])
+        if lock_key is not None:
+            pipe.expire(lock_key, _WARMUP_LOCK_TTL)
+        pipe.execute()
+    return warmed
+
+
+def fill_local_cache(
+    r: Redis, local_cache: LocalLinkCache, batch_size: int = WARMUP_BATCH_SIZE
+) -> int:
+    """
+    Fill `local_cache` from the Redis link cache with the codes listed at
+    WARMUP_CODES_KEY, hottest first, one MGET per `batch_size` codes.
+    Entries that expired or were invalidated since are skipped. Returns the
+    number of links cached.
+    """
+    codes = r.lrange(WARMUP_CODES_KEY, 0, local_cache.max_entries - 1)
+    filled = 0
+    for i in range(0, len(codes), batch_size):
+        batch = codes[i : i + batch_size]
+        payloads = r.mget([f"{LINK_CACHE_PREFIX}{code}" for code in batch])
+        for code, payload in zip(batch, payloads):
+            link = CachedLink.decode(payload) if payload else None
+            if link is not None:
+                local_cache.set(code, link, len(payload))
+                filled += 1
+    return filled
+
+
+def warm_link_cache_once(
+    r: Redis,
+    session_factory: Callable[[], Session],
+    limit: int,
+    local_cache: LocalLinkCache | None = None,
+    batch_size: int = WARMUP_BATCH_SIZE,
+    poll_seconds: float = _WARMUP_POLL_SECONDS,
+    max_wait: float = _WARMUP_MAX_WAIT_SECONDS,
+) -> int:
+    """
+    Startup warm-up shared by all workers, so Postgres runs the
+    hottest-links query once per deploy window instead of once per worker.
+
+    The worker that takes WARMUP_LOCK_KEY runs warm_link_cache and then
+    publishes the warmed codes. The others wait for that list and only
+    fill their local caches from Redis. They stop waiting when the lock
+    goes away (the warm-up failed or its holder died) or after `max_wait`
+    seconds. Returns the number of links this worker warmed.
+    """
+    if limit <= 0:
+        return 0
+
+    if r.set(WARMUP_LOCK_KEY, "1", nx=True, ex=_WARMUP_LOCK_TTL):
+        scratch = f"{WARMUP_CODES_KEY}:building"
+        try:
+            r.delete(scratch, WARMUP_CODES_KEY)
+            with session_factory() as db:
+                warmed = warm_link_cache(
+                    r,
+                    db,
+                    limit,
+                    local_cache,
+                    batch_size,
+                    codes_key=scratch,
+                    lock_key=WARMUP_LOCK_KEY,
+                )
+        except Exception:
+            # Let a later worker retry; the waiting ones give up
+            r.delete(WARMUP_LOCK_KEY, scratch)
+            raise
+        if warmed == 0:
+            r.delete(WARMUP_LOCK_KEY)
+            return 0
+        pipe = r.pipeline()
+        pipe.rename(scratch, WARMUP_CODES_KEY)
+        pipe.expire(WARMUP_CODES_KEY, _WARMUP_WINDOW)
+        pipe.expire(WARMUP_LOCK_KEY, _WARMUP_WINDOW)
+        pipe.execute()
+        return warmed
+
+    if local_cache is None or not local_cache.enabled:
+        return 0
+    deadline = time.monotonic() + max_wait
+    while not r.exists(WARMUP_CODES_KEY):
+        if not r.exists(WARMUP_LOCK_KEY):
+            logger.info("Link cache warm-up by another worker did not finish")
+            return 0
+        if time.monotonic() >= deadline:
+            logger.info("Gave up waiting %.0fs for another worker's link cache warm-up", max_wait)
+            return 0
+        time.sleep(poll_seconds)
+    return fill_local_cache(r, local_cache, batch_size)
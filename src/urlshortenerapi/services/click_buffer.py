@@ -0,0 +1,348 @@
+from __future__ import annotations
+
+import logging
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from redis import Redis
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from urlshortenerapi.core.config import settings
+from urlshortenerapi.services.link_cache import LINK_CACHE_TTL, invalidate_links
+
+logger = logging.getLogger(__name__)
+
+# Buffered clicks live in two hashes keyed by link code, so the set of
+# dirty links is exactly the hash fields — no keyspace SCAN needed.
+CLICKS_KEY = "clicks"
+LAST_ACCESSED_KEY = "last_accessed"
+
+# Counts popped by a flush that may still sit in a cached click_count
+# taken before the commit. The redirect script adds them to the buffered
+# count for max_clicks, so a click never disappears from both Redis and
+# the cached click_count.
+CLICKS_IN_FLIGHT_KEY = "clicks:inflight"
+
+# Each drained chunk is journaled in a hash of its own (code -> count) and
+# its id in a sorted set scored by the epoch ms after which it may leave the
+# in-flight totals. Whichever worker holds the flush lease settles overdue
+# chunks, so a flusher that dies or fails mid-chunk leaves no ghost counts.
+CLICK_CHUNKS_DUE_KEY = "clicks:inflight:due"
+CLICK_CHUNK_PREFIX = "clicks:inflight:chunk:"
+
+# Deadline set at drain time, for a chunk whose flusher never confirms it:
+# outlives a warmed Redis entry (up to two cache TTLs) filled just before
+# the commit plus a local copy taken from it.
+UNCONFIRMED_SETTLE_MS = int((2 * LINK_CACHE_TTL + settings.local_cache_ttl_seconds + 1) * 1000)
+# Deadline once the Redis copies are deleted and the invalidation is
+# published: local copies taken before then expire within their TTL even
+# on a worker whose listener has died.
+PUBLISHED_SETTLE_MS = int((settings.local_cache_ttl_seconds + 1) * 1000)
+
+SETTLE_DUE_BATCH = 100
+
+# Clicks per link per UTC hour, field "<code>|<hour start, epoch seconds>".
+# Drained into the link_clicks_hourly rollup table.
+CLICK_BUCKETS_KEY = "clicks:hourly"
+BUCKET_SECONDS = 3600
+
+FLUSH_CHUNK_SIZE = 1000
+
+
+# Atomically pops up to ARGV[1] dirty links, moves their counts to the
+# in-flight hash and journals them as chunk ARGV[2], due in ARGV[3] ms.
+# Returns a flat [code, count, last_accessed_iso_or_empty, ...] list.
+DRAIN_CHUNK_LUA = r"""
+local fields = redis.call("HRANDFIELD", KEYS[1], ARGV[1], "WITHVALUES")
+local out = {}
+for i = 1, #fields, 2 do
+  local code = fields[i]
+  local ts = redis.call("HGET", KEYS[2], code)
+  out[#out + 1] = code
+  out[#out + 1] = fields[i + 1]
+  out[#out + 1] = ts or ""
+  redis.call("HINCRBY", KEYS[3], code, fields[i + 1])
+  redis.call("HSET", KEYS[4], code, fields[i + 1])
+  redis.call("HDEL", KEYS[1], code)
+  redis.call("HDEL", KEYS[2], code)
+end
+if #fields > 0 then
+  local t = redis.call("TIME")
+  local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+  redis.call("ZADD", KEYS[5], now + tonumber(ARGV[3]), ARGV[2])
+end
+return out
+"""
+
+# Takes codes ARGV[3..] of chunk ARGV[1] out of the in-flight hash, using
+# the journaled counts so a chunk already settled as overdue is not taken
+# out twice. What is left of the chunk becomes due in ARGV[2] ms, or keeps
+# its deadline when ARGV[2] is empty.
+SETTLE_CHUNK_LUA = r"""
+for i = 3, #ARGV do
+  local count = redis.call("HGET", KEYS[2], ARGV[i])
+  if count then
+    redis.call("HDEL", KEYS[2], ARGV[i])
+    if redis.call("HINCRBY", KEYS[1], ARGV[i], -tonumber(count)) <= 0 then
+      redis.call("HDEL", KEYS[1], ARGV[i])
+    end
+  end
+end
+if redis.call("EXISTS", KEYS[2]) == 0 then
+  redis.call("ZREM", KEYS[3], ARGV[1])
+elseif ARGV[2] ~= "" then
+  local t = redis.call("TIME")
+  local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+  redis.call("ZADD", KEYS[3], "XX", now + tonumber(ARGV[2]), ARGV[1])
+end
+return 1
+"""
+
+# Settles up to ARGV[2] chunks whose deadline has passed. Chunk journal
+# keys are built from the ARGV[1] prefix, so like the redirect script this
+# assumes a single Redis rather than a cluster.
+SETTLE_DUE_LUA = r"""
+local t = redis.call("TIME")
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local ids = redis.call("ZRANGEBYSCORE", KEYS[2], "-inf", now, "LIMIT", 0, tonumber(ARGV[2]))
+for _, id in ipairs(ids) do
+  local chunk = ARGV[1] .. id
+  local fields = redis.call("HGETALL", chunk)
+  for i = 1, #fields, 2 do
+    if redis.call("HINCRBY", KEYS[1], fields[i], -tonumber(fields[i + 1])) <= 0 then
+      redis.call("HDEL", KEYS[1], fields[i])
+    end
+  end
+  redis.call("DEL", chunk)
+  redis.call("ZREM", KEYS[2], id)
+end
+return #ids
+"""
+
+# Atomically pops up to ARGV[1] fields of a hash. Returns {field, value, ...}.
+DRAIN_HASH_LUA = r"""
+local fields = redis.call("HRANDFIELD", KEYS[1], ARGV[1], "WITHVALUES")
+for i = 1, #fields, 2 do
+  redis.call("HDEL", KEYS[1], fields[i])
+end
+return fields
+"""
+
+# One statement per chunk: the arrays play the role of a VALUES list but keep
+# the parameter count fixed (3) no matter how many rows the chunk has.
+APPLY_CHUNK_SQL = text(
+    """
+    UPDATE links AS l
+    SET click_count = l.click_count + v.clicks,
+        last_accessed_at = COALESCE(v.last_accessed_at, now())
+    FROM unnest(
+        CAST(:codes AS text[]),
+        CAST(:counts AS bigint[]),
+        CAST(:last_accessed AS timestamptz[])
+    ) AS v(code, clicks, last_accessed_at)
+    WHERE l.code = v.code
+    RETURNING l.code, l.max_clicks
+    """
+)
+
+
+# Buckets of links deleted since the click was buffered find no join row
+# and are dropped.
+APPLY_BUCKETS_SQL = text(
+    """
+    INSERT INTO link_clicks_hourly (link_id, bucket, clicks)
+    SELECT l.id, v.bucket, v.clicks
+    FROM unnest(
+        CAST(:codes AS text[]),
+        CAST(:buckets AS timestamptz[]),
+        CAST(:counts AS bigint[])
+    ) AS v(code, bucket, clicks)
+    JOIN links AS l ON l.code = v.code
+    ON CONFLICT (link_id, bucket)
+    DO UPDATE SET clicks = link_clicks_hourly.clicks + EXCLUDED.clicks
+    """
+)
+
+
+def bucket_field(code: str, bucket_start: int) -> str:
+    return f"{code}|{bucket_start}"
+
+
+@dataclass(frozen=True)
+class FlushStats:
+    links: int
+    clicks: int
+
+
+def _restore_chunk(
+    r: Redis,
+    codes: list[str],
+    counts: list[int],
+    key: str = CLICKS_KEY,
+    last_accessed: list[str] | None = None,
+) -> None:
+    """Put a popped chunk back so a failed Postgres write loses no clicks."""
+    pipe = r.pipeline(transaction=False)
+    for code, count in zip(codes, counts):
+        pipe.hincrby(key, code, count)
+    # HSETNX: a click since the drain has a newer timestamp; keep it
+    for code, ts in zip(codes, last_accessed or ()):
+        if ts:
+            pipe.hsetnx(LAST_ACCESSED_KEY, code, ts)
+    pipe.execute()
+
+
+def _chunk_key(chunk_id: str) -> str:
+    return f"{CLICK_CHUNK_PREFIX}{chunk_id}"
+
+
+def settle_overdue_chunks(r: Redis, batch: int = SETTLE_DUE_BATCH) -> int:
+    """
+    Take chunks past their deadline out of the in-flight hash: ones whose
+    flusher died, failed after its commit, or finished and is waiting out
+    the local cache TTL. Returns the number of chunks settled.
+    """
+    settle_due = r.register_script(SETTLE_DUE_LUA)
+    settled = 0
+    while True:
+        n = int(
+            settle_due(
+                keys=[CLICKS_IN_FLIGHT_KEY, CLICK_CHUNKS_DUE_KEY], args=[CLICK_CHUNK_PREFIX, batch]
+            )
+        )
+        settled += n
+        if n < batch:
+            return settled
+
+
+def flush_click_buffer(r: Redis, db: Session, chunk_size: int = FLUSH_CHUNK_SIZE) -> FlushStats:
+    """
+    Drain buffered clicks into Postgres, one atomic chunk at a time.
+
+    Work is bounded by the number of links dirty at the start of the cycle
+    (HLEN), so a flush under heavy traffic cannot chase its own tail; links
+    clicked meanwhile are picked up by the next cycle.
+
+    Links with max_clicks have their cached copies invalidated, because the
+    redirect path checks the cached click_count plus the live buffer. Their
+    drained counts stay in the in-flight hash, which the redirect path also
+    counts, until every copy that could predate the commit is gone: Redis
+    entries are deleted here, and workers' local copies expire within
+    local_cache_ttl_seconds of the publish whether or not the invalidation
+    message reaches them. Until then those clicks count twice, so a link
+    near its cap may be rejected a little early. A cache fill that read
+    Postgres before the commit and wrote Redis after the delete can still
+    serve the old count for one cache TTL. Counts of other links are settled
+    as soon as their chunk commits.
+
+    Chunks are journaled when drained (see settle_overdue_chunks), so
+    in-flight counts left by a flusher that died or failed are settled by
+    the next lease holder. Clicks of a chunk whose transaction never
+    committed and could not be restored are lost.
+    """
+    settle_overdue_chunks(r)
+    drain = r.register_script(DRAIN_CHUNK_LUA)
+    settle = r.register_script(SETTLE_CHUNK_LUA)
+    remaining = int(r.hlen(CLICKS_KEY))
+    links = 0
+    clicks = 0
+
+    while remaining > 0:
+        chunk_id = uuid.uuid4().hex
+        settle_keys = [CLICKS_IN_FLIGHT_KEY, _chunk_key(chunk_id), CLICK_CHUNKS_DUE_KEY]
+        raw = drain(
+            keys=[
+                CLICKS_KEY,
+                LAST_ACCESSED_KEY,
+                CLICKS_IN_FLIGHT_KEY,
+                _chunk_key(chunk_id),
+                CLICK_CHUNKS_DUE_KEY,
+            ],
+            args=[min(chunk_size, remaining), chunk_id, UNCONFIRMED_SETTLE_MS],
+        )
+        if not raw:
+            break
+
+        codes = raw[0::3]
+        counts = [int(c) for c in raw[1::3]]
+        raw_last_accessed = raw[2::3]
+        last_accessed = [datetime.fromisoformat(ts) if ts else None for ts in raw_last_accessed]
+
+        try:
+            rows = db.execute(
+                APPLY_CHUNK_SQL,
+                {"codes": codes, "counts": counts, "last_accessed": last_accessed},
+            ).all()
+            db.commit()
+        except Exception:
+            db.rollback()
+            try:
+                _restore_chunk(r, codes, counts, last_accessed=raw_last_accessed)
+            finally:
+                # Restored or lost, these counts are no longer in flight
+                settle(keys=settle_keys, args=[chunk_id, "", *codes])
+            raise
+
+        capped = [row.code for row in rows if row.max_clicks is not None]
+        # Capped links wait out their cached copies; if the invalidation
+        # fails they keep the drain-time deadline.
+        capped_delay_ms = ""
+        try:
+            if capped:
+                invalidate_links(r, capped)
+                capped_delay_ms = PUBLISHED_SETTLE_MS
+        finally:
+            uncapped = set(codes).difference(capped)
+            settle(
+                keys=settle_keys,
+                args=[chunk_id, capped_delay_ms, *(c for c in codes if c in uncapped)],
+            )
+
+        remaining -= len(codes)
+        links += len(codes)
+        clicks += sum(counts)
+
+    return FlushStats(links=links, clicks=clicks)
+
+
+def flush_click_buckets(r: Redis, db: Session, chunk_size: int = FLUSH_CHUNK_SIZE) -> int:
+    """
+    Drain the hourly click buckets into link_clicks_hourly, one atomic
+    chunk and one upsert per chunk. Bounded by HLEN at the start, like
+    flush_click_buffer. Returns the number of buckets applied.
+    """
+    drain = r.register_script(DRAIN_HASH_LUA)
+    remaining = int(r.hlen(CLICK_BUCKETS_KEY))
+    applied = 0
+
+    while remaining > 0:
+        raw = drain(keys=[CLICK_BUCKETS_KEY], args=[min(chunk_size, remaining)])
+        if not raw:
+            break
+
+        fields = raw[0::2]
+        counts = [int(c) for c in raw[1::2]]
+        codes = []
+        buckets = []
+        for field in fields:
+            code, start = field.rsplit("|", 1)
+            codes.append(code)
+            buckets.append(datetime.fromtimestamp(int(start), tz=timezone.utc))
+
+        try:
+            db.execute(
+                APPLY_BUCKETS_SQL,
+                {"codes": codes, "buckets": buckets, "counts": counts},
+            )
+            db.commit()
+        except Exception:
+            db.rollback()
+            _restore_chunk(r, fields, counts, key=CLICK_BUCKETS_KEY)
+            raise
+
+        remaining -= len(fields)
+        applied += len(fields)
+
+    return applied
@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import secrets
+import threading
+from functools import lru_cache
+from typing import Callable, Protocol
+
+from redis import Redis
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from urlshortenerapi.core.config import DEV_CODE_PERMUTATION_KEY, settings
+from urlshortenerapi.core.redis import get_redis_client
+from urlshortenerapi.db.session import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+BASE62_ALPHABET = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+CODE_LENGTH = 7
+
+# Every id below 2**40 (~1.1e12) fits in 7 base62 characters (62**7 ~ 3.5e12),
+# so permuted ids always encode to exactly CODE_LENGTH characters.
+CODE_ID_BITS = 40
+
+# Created by migration 5c1f0e7a9b21 with INCREMENT BY CODE_ID_BLOCK_SIZE,
+# so one nextval() reserves a whole block.
+CODE_ID_SEQUENCE = "link_code_id_seq"
+CODE_ID_BLOCK_SIZE = 1000
+
+CODE_ID_COUNTER_KEY = "code_alloc:next_id"
+
+# Start fetching the next block once the current one is this far down.
+_PREFETCH_LOW_WATER = 0.2
+
+
+def random_code(length: int = CODE_LENGTH) -> str:
+    return "".join(secrets.choice(BASE62_ALPHABET) for _ in range(length))
+
+
+def base62_encode(n: int, width: int) -> str:
+    chars = []
+    while n:
+        n, rem = divmod(n, 62)
+        chars.append(BASE62_ALPHABET[rem])
+    return "".join(reversed(chars)).rjust(width, BASE62_ALPHABET[0])
+
+
+class FeistelPermutation:
+    """
+    Keyed bijection on [0, 2**bits) built from a balanced Feistel network.
+
+    Consecutive ids come out scattered across the whole domain, so codes
+    do not reveal creation order or volume to anyone without the key.
+    """
+
+    def __init__(self, key: bytes, bits: int = CODE_ID_BITS, rounds: int = 4) -> None:
+        if bits % 2:
+            raise ValueError("bits must be even")
+        self.key = key
+        self.bits = bits
+        self.rounds = rounds
+        self._half_bits = bits // 2
+        self._half_mask = (1 << self._half_bits) - 1
+
+    def _f(self, round_no: int, half: int) -> int:
+        digest = hashlib.blake2b(
+            half.to_bytes(8, "little"),
+            key=self.key,
+            digest_size=8,
+            salt=round_no.to_bytes(16, "little"),
+        ).digest()
+        return int.from_bytes(digest, "little") & self._half_mask
+
+    def permute(self, n: int) -> int:
+        left, right = n >> self._half_bits, n & self._half_mask
+        for i in range(self.rounds):
+            left, right = right, left ^ self._f(i, right)
+        return (left << self._half_bits) | right
+
+    def invert(self, n: int) -> int:
+        left, right = n >> self._half_bits, n & self._half_mask
+        for i in reversed(range(self.rounds)):
+            left, right = right ^ self._f(i, left), left
+        return (left << self._half_bits) | right
+
+
+class IdBlockSource(Protocol):
+    def next_block(self) -> range: ...
+
+
+class PostgresSequenceBlockSource:
+    """Reserves ids from CODE_ID_SEQUENCE; durable across Redis restarts."""
+
+    def __init__(
+        self, session_factory: Callable[[], Session], block_size: int = CODE_ID_BLOCK_SIZE
+    ) -> None:
+        self._session_factory = session_factory
+        self.block_size = block_size
+
+    def next_block(self) -> range:
+        with self._session_factory() as db:
+            start = db.execute(text(f"SELECT nextval('{CODE_ID_SEQUENCE}')")).scalar_one()
+        return range(start, start + self.block_size)
+
+
+class RedisCounterBlockSource:
+    """
+    Reserves ids with INCRBY on a Redis counter. The counter must survive
+    for the lifetime of the data (persistence on, never flushed), otherwise
+    ids are handed out twice and creates fall back to collision retries.
+    """
+
+    def __init__(
+        self, r: Redis, key: str = CODE_ID_COUNTER_KEY, block_size: int = CODE_ID_BLOCK_SIZE
+    ) -> None:
+        self._r = r
+        self.key = key
+        self.block_size = block_size
+
+    def next_block(self) -> range:
+        end = int(self._r.incrby(self.key, self.block_size))
+        return range(end - self.block_size + 1, end + 1)
+
+
+class CodeAllocator(Protocol):
+    def next_code(self) -> str: ...
+
+    async def next_code_async(self) -> str: ...
+
+
+class RandomCodeAllocator:
+    """Random 7-character codes; uniqueness is left to the unique index."""
+
+    def next_code(self) -> str:
+        return random_code()
+
+    async def next_code_async(self) -> str:
+        return random_code()
+
+
+class SequentialCodeAllocator:
+    """
+    Unique codes from reserved id blocks: id -> Feistel permutation -> base62.
+
+    Each worker holds one block and fetches the next one on a background
+    thread when the current block runs low, so next_code() is normally a
+    pure in-memory operation. Ids left in a block when the worker exits are
+    simply never used.
+
+    Thread-safe: sync route handlers run in Starlette's threadpool.
+    """
+
+    def __init__(self, source: IdBlockSource, permutation: FeistelPermutation) -> None:
+        self._source = source
+        self._permutation = permutation
+        self._lock = threading.Lock()
+        self._current: range = range(0)
+        self._pos = 0
+        self._next: range | None = None
+        self._prefetching = False
+
+    def next_code(self) -> str:
+        with self._lock:
+            if self._pos >= len(self._current):
+                self._current = self._next if self._next is not None else self._source.next_block()
+                self._next = None
+                self._pos = 0
+
+            n = self._current[self._pos]
+            self._pos += 1
+
+            left = len(self._current) - self._pos
+            if left <= len(self._current) * _PREFETCH_LOW_WATER and self._next is None:
+                self._start_prefetch()
+
+        if n >= 1 << self._permutation.bits:
+            raise RuntimeError("Short code id space exhausted")
+        return base62_encode(self._permutation.permute(n), CODE_LENGTH)
+
+    async def next_code_async(self) -> str:
+        """
+        next_code for async handlers. Only a block fetch does I/O, and it
+        only happens inline when prefetching fell behind; that call is
+        moved to a worker thread instead of blocking the event loop.
+        """
+        with self._lock:
+            ready = self._pos < len(self._current) or self._next is not None
+        if ready:
+            return self.next_code()
+        return await asyncio.to_thread(self.next_code)
+
+    def _start_prefetch(self) -> None:
+        if self._prefetching:
+            return
+        self._prefetching = True
+        threading.Thread(target=self._prefetch, daemon=True).start()
+
+    def _prefetch(self) -> None:
+        try:
+            block = self._source.next_block()
+        except Exception:
+            # next_code() will fetch inline when the block runs out
+            logger.exception("Could not prefetch short code id block")
+            block = None
+        with self._lock:
+            if block is not None and self._next is None:
+                self._next = block
+            self._prefetching = False
+
+
+@lru_cache(maxsize=1)
+def get_code_allocator() -> CodeAllocator:
+    if settings.code_allocator == "random":
+        return RandomCodeAllocator()
+
+    if settings.app_env != "dev" and settings.code_permutation_key == DEV_CODE_PERMUTATION_KEY:
+        # A published default key lets anyone invert codes back to ids
+        raise ValueError("CODE_PERMUTATION_KEY must be set when APP_ENV is not dev")
+    key = hashlib.sha256(settings.code_permutation_key.encode("utf-8")).digest()
+    permutation = FeistelPermutation(key)
+    if settings.code_allocator == "redis":
+        source: IdBlockSource = RedisCounterBlockSource(get_redis_client())
+    elif settings.code_allocator == "sequence":
+        source = PostgresSequenceBlockSource(SessionLocal)
+    else:
+        raise ValueError(f"Unknown CODE_ALLOCATOR: {settings.code_allocator!r}")
+    return SequentialCodeAllocator(source, permutation)
@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from redis import Redis
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from urlshortenerapi.services.link_cache import invalidate_links
+
+# Links past expires_at or max_clicks are rejected by the redirect path
+# anyway; the sweeper stamps swept_at so they drop out of the unswept
+# partial indexes and their cache entries stop taking Redis memory.
+# is_active is left alone: it is the owner's switch, and a swept link keeps
+# answering 410 with its reason. Rows are kept: owners still list, export
+# and read analytics for them.
+#
+# Only the click flush lease holder sweeps. Each batch still locks its rows
+# with FOR UPDATE SKIP LOCKED, so rows locked by a click flush or a PATCH
+# are skipped rather than waited for (the next pass picks them up), and an
+# overlap during lease failover takes disjoint batches.
+
+# Walks ix_links_unswept_expires_at in expiry order and stops after :limit.
+SWEEP_EXPIRED_SQL = text(
+    """
+    UPDATE links AS l
+    SET swept_at = :now
+    FROM (
+        SELECT id FROM links
+        WHERE swept_at IS NULL AND expires_at IS NOT NULL AND expires_at <= :now
+        ORDER BY expires_at
+        LIMIT :limit
+        FOR UPDATE SKIP LOCKED
+    ) AS batch
+    WHERE l.id = batch.id
+    RETURNING l.code
+    """
+)
+
+# Only links with a click cap are candidates (ix_links_unswept_capped).
+# click_count is deliberately not in that index: the click flush updates it
+# on every cycle, and indexing it would rule out HOT updates.
+SWEEP_EXHAUSTED_SQL = text(
+    """
+    UPDATE links AS l
+    SET swept_at = :now
+    FROM (
+        SELECT id FROM links
+        WHERE swept_at IS NULL AND max_clicks IS NOT NULL AND click_count >= max_clicks
+        LIMIT :limit
+        FOR UPDATE SKIP LOCKED
+    ) AS batch
+    WHERE l.id = batch.id
+    RETURNING l.code
+    """
+)
+
+
+@dataclass(frozen=True)
+class SweepStats:
+    expired: int
+    exhausted: int
+
+
+def _sweep(
+    r: Redis,
+    db: Session,
+    statement,
+    params: dict,
+    batch_size: int,
+    max_batches: int,
+) -> int:
+    swept = 0
+    for _ in range(max_batches):
+        try:
+            codes = db.execute(statement, {**params, "limit": batch_size}).scalars().all()
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        if codes:
+            # One pipeline per batch: cache deletes and invalidation messages
+            invalidate_links(r, codes)
+            swept += len(codes)
+        if len(codes) < batch_size:
+            break
+    return swept
+
+
+def sweep_expired_links(
+    r: Redis,
+    db: Session,
+    batch_size: int,
+    max_batches: int,
+    now: datetime | None = None,
+) -> SweepStats:
+    """
+    Mark expired and used-up links swept, batch_size rows per transaction
+    and at most max_batches batches of each kind per call, so one pass
+    holds row locks briefly and its work is bounded however large the
+    backlog. Swept links are dropped from the Redis and local caches.
+
+    Buffered clicks of swept links are left alone: the click flush applies
+    them to swept links too.
+    """
+    now = now or datetime.now(timezone.utc)
+    expired = _sweep(r, db, SWEEP_EXPIRED_SQL, {"now": now}, batch_size, max_batches)
+    exhausted = _sweep(r, db, SWEEP_EXHAUSTED_SQL, {"now": now}, batch_size, max_batches)
+    return SweepStats(expired=expired, exhausted=exhausted)
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import os
+import socket
+
+from redis import Redis
+
+# Take the lease if it is free, extend it if we already hold it.
+ACQUIRE_LUA = r"""
+local holder = redis.call("GET", KEYS[1])
+if holder == ARGV[1] then
+  redis.call("PEXPIRE", KEYS[1], ARGV[2])
+  return 1
+end
+if not holder then
+  redis.call("SET", KEYS[1], ARGV[1], "PX", ARGV[2])
+  return 1
+end
+return 0
+"""
+
+# Only the holder may release; a stale holder must not drop a newer lease.
+RELEASE_LUA = r"""
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+  return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+
+def default_holder_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class RedisLease:
+    """
+    Leader lease stored in a single Redis key.
+
+    Every candidate calls acquire() on each cycle; the holder keeps
+    extending it, everyone else gets False. If the holder dies the key
+    expires after ttl_ms and the next caller takes over.
+    """
+
+    def __init__(self, r: Redis, key: str, ttl_ms: int, holder_id: str | None = None) -> None:
+        self._r = r
+        self.key = key
+        self.ttl_ms = ttl_ms
+        self.holder_id = holder_id or default_holder_id()
+        self._acquire = r.register_script(ACQUIRE_LUA)
+        self._release = r.register_script(RELEASE_LUA)
+        self.is_held = False
+
+    def acquire(self) -> bool:
+        self.is_held = bool(int(self._acquire(keys=[self.key], args=[self.holder_id, self.ttl_ms])))
+        return self.is_held
+
+    def release(self) -> None:
+        if self.is_held:
+            self._release(keys=[self.key], args=[self.holder_id])
+            self.is_held = False
@@ -0,0 +1,320 @@
+from __future__ import annotations
+
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, NamedTuple
+
+from redis import Redis
+from redis.exceptions import RedisError
+
+from urlshortenerapi.core.config import settings
+from urlshortenerapi.services.bloom import add_new_codes, add_new_codes_async, code_filter
+
+logger = logging.getLogger(__name__)
+
+LINK_CACHE_PREFIX = "link_cache:"
+LINK_CACHE_TTL = 60  # seconds — tune to taste
+
+# Short-lived markers for codes Postgres did not have, so repeated lookups
+# of unknown codes (scanners, typos) stop reaching the database.
+NEGATIVE_CACHE_PREFIX = "link_missing:"
+NEGATIVE_CACHE_TTL = 10  # seconds
+
+# Published with the link code as payload whenever a cached link changes.
+LINK_CACHE_INVALIDATE_CHANNEL = "link_cache:invalidate"
+
+# Rough per-entry bookkeeping cost (dict slot, tuple, key string) on top of
+# the payload size, so the byte cap stays honest for very short URLs.
+_ENTRY_OVERHEAD_BYTES = 200
+
+
+_OWNER_ID_RE = re.compile(r"[0-9a-f-]{36}")
+
+
+def epoch_ms(dt: datetime) -> int:
+    return int(dt.timestamp() * 1000)
+
+
+class CachedLink(NamedTuple):
+    """
+    What the redirect path needs to know about a link, without an ORM object.
+
+    Encoded for Redis as
+    "active|expires_ms|max_clicks|click_count|owner_id|long_url"
+    (empty field = None). It stays text because the shared client decodes
+    responses, and the redirect Lua script parses the same layout.
+    long_url goes last so it may contain the separator.
+    """
+
+    long_url: str
+    is_active: bool
+    expires_ms: int | None
+    max_clicks: int | None
+    click_count: int
+    owner_id: str = ""
+
+    @classmethod
+    def from_row(cls, row) -> CachedLink:
+        """Build from a Link (or any row with the same attribute names)."""
+        owner = getattr(row, "owner_api_key_id", None)
+        return cls(
+            long_url=row.long_url,
+            is_active=row.is_active,
+            expires_ms=epoch_ms(row.expires_at) if row.expires_at else None,
+            max_clicks=row.max_clicks,
+            click_count=row.click_count,
+            owner_id=str(owner) if owner else "",
+        )
+
+    def encode(self) -> str:
+        return (
+            f"{int(self.is_active)}"
+            f"|{'' if self.expires_ms is None else self.expires_ms}"
+            f"|{'' if self.max_clicks is None else self.max_clicks}"
+            f"|{self.click_count}"
+            f"|{self.owner_id}"
+            f"|{self.long_url}"
+        )
+
+    @classmethod
+    def decode(cls, payload: str) -> CachedLink | None:
+        """Returns None for anything not in the current layout (e.g. older entries)."""
+        try:
+            active, expires_ms, max_clicks, click_count, owner_id, long_url = payload.split("|", 5)
+            if owner_id and not _OWNER_ID_RE.fullmatch(owner_id):
+                return None
+            return cls(
+                long_url=long_url,
+                is_active=active == "1",
+                expires_ms=int(expires_ms) if expires_ms else None,
+                max_clicks=int(max_clicks) if max_clicks else None,
+                click_count=int(click_count),
+                owner_id=owner_id,
+            )
+        except ValueError:
+            return None
+
+
+@dataclass(frozen=True)
+class LocalCacheStats:
+    hits: int
+    misses: int
+    evictions: int
+    entries: int
+    bytes: int
+
+
+class LocalLinkCache:
+    """
+    Bounded per-process LRU cache with a TTL.
+
+    Sits in front of the Redis link cache so hot codes are served without a
+    network round-trip. Bounded both by entry count and by an approximate
+    memory cap; the least recently used entries are evicted first.
+
+    Thread-safe: sync route handlers run in Starlette's threadpool.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        max_bytes: int,
+        ttl_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        # code -> (expires_at, size, value)
+        self._entries: OrderedDict[str, tuple[float, int, Any]] = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    def get(self, code: str) -> Any | None:
+        with self._lock:
+            entry = self._entries.get(code)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, _, value = entry
+            if self._clock() >= expires_at:
+                self._remove(code)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(code)
+            self.hits += 1
+            return value
+
+    def set(self, code: str, value: Any, size: int) -> None:
+        if not self.enabled:
+            return
+
+        size = size + len(code) + _ENTRY_OVERHEAD_BYTES
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if code in self._entries:
+                self._remove(code)
+
+            self._entries[code] = (self._clock() + self.ttl_seconds, size, value)
+            self._bytes += size
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, code: str) -> None:
+        with self._lock:
+            if code in self._entries:
+                self._remove(code)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> LocalCacheStats:
+        with self._lock:
+            return LocalCacheStats(
+                hits=self.hits,
+                misses=self.misses,
+                evictions=self.evictions,
+                entries=len(self._entries),
+                bytes=self._bytes,
+            )
+
+    def _remove(self, code: str) -> None:
+        _, size, _ = self._entries.pop(code)
+        self._bytes -= size
+
+
+local_link_cache = LocalLinkCache(
+    max_entries=settings.local_cache_max_entries,
+    max_bytes=settings.local_cache_max_bytes,
+    ttl_seconds=settings.local_cache_ttl_seconds,
+)
+
+
+def invalidate_link(r: Redis, code: str) -> None:
+    """
+    Drop a link from the Redis cache and from every worker's local cache.
+    The local copy in this process is dropped immediately; other workers
+    drop theirs when the pub/sub message arrives.
+    """
+    r.delete(f"{LINK_CACHE_PREFIX}{code}")
+    local_link_cache.invalidate(code)
+    r.publish(LINK_CACHE_INVALIDATE_CHANNEL, code)
+
+
+async def invalidate_link_async(r, code: str) -> None:
+    await r.delete(f"{LINK_CACHE_PREFIX}{code}")
+    local_link_cache.invalidate(code)
+    await r.publish(LINK_CACHE_INVALIDATE_CHANNEL, code)
+
+
+def invalidate_links(r: Redis, codes: list[str]) -> None:
+    """Pipelined invalidate_link for many codes."""
+    pipe = r.pipeline(transaction=False)
+    for code in codes:
+        pipe.delete(f"{LINK_CACHE_PREFIX}{code}")
+        pipe.publish(LINK_CACHE_INVALIDATE_CHANNEL, code)
+        local_link_cache.invalidate(code)
+    pipe.execute()
+
+
+def remember_missing(r: Redis, code: str) -> None:
+    r.setex(f"{NEGATIVE_CACHE_PREFIX}{code}", NEGATIVE_CACHE_TTL, 1)
+
+
+async def remember_missing_async(r, code: str) -> None:
+    await r.setex(f"{NEGATIVE_CACHE_PREFIX}{code}", NEGATIVE_CACHE_TTL, 1)
+
+
+def register_new_codes(r: Redis, codes: list[str]) -> None:
+    """
+    Call after new links are committed: adds them to the code filters and
+    clears any negative-cache marker left by an earlier 404.
+
+    The links already exist by then, so a Redis error is logged rather
+    than turned into a 500 for a create that succeeded.
+    """
+    try:
+        add_new_codes(r, codes)
+        r.delete(*[f"{NEGATIVE_CACHE_PREFIX}{code}" for code in codes])
+    except RedisError:
+        logger.exception("Could not register %d new codes in Redis", len(codes))
+
+
+async def register_new_codes_async(r, codes: list[str]) -> None:
+    try:
+        await add_new_codes_async(r, codes)
+        await r.delete(*[f"{NEGATIVE_CACHE_PREFIX}{code}" for code in codes])
+    except RedisError:
+        logger.exception("Could not register %d new codes in Redis", len(codes))
+
+
+def _known_missing(results: list) -> bool:
+    negative, filter_exists, *bits = results
+    if negative:
+        return True
+    # Filter not built yet (fresh Redis) — fall through to Postgres
+    return bool(filter_exists) and not all(bits)
+
+
+def _queue_missing_checks(pipe, code: str) -> None:
+    pipe.exists(f"{NEGATIVE_CACHE_PREFIX}{code}")
+    pipe.exists(code_filter.key)
+    for pos in code_filter.positions(code):
+        pipe.getbit(code_filter.key, pos)
+
+
+def is_known_missing(r: Redis, code: str) -> bool:
+    """True if the negative cache or the code filter rules the code out."""
+    pipe = r.pipeline(transaction=False)
+    _queue_missing_checks(pipe, code)
+    return _known_missing(pipe.execute())
+
+
+async def is_known_missing_async(r, code: str) -> bool:
+    pipe = r.pipeline(transaction=False)
+    _queue_missing_checks(pipe, code)
+    return _known_missing(await pipe.execute())
+
+
+def _on_invalidate_message(message: dict) -> None:
+    local_link_cache.invalidate(message["data"])
+
+
+def start_invalidation_listener(r: Redis):
+    """
+    Subscribe to the invalidation channel on a daemon thread.
+    Returns the worker thread (call .stop() on shutdown), or None if Redis
+    is unreachable — the local TTL still bounds staleness in that case.
+    """
+    if not local_link_cache.enabled:
+        return None
+
+    try:
+        pubsub = r.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{LINK_CACHE_INVALIDATE_CHANNEL: _on_invalidate_message})
+        return pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+    except Exception:
+        logger.exception("Could not subscribe to link cache invalidation channel")
+        return None
@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+import uuid
+import zlib
+from typing import AsyncIterable, AsyncIterator, Callable, Iterable, Iterator
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from urlshortenerapi.db.models import Link
+
+EXPORT_FORMATS = ("ndjson", "csv")
+
+# Rows fetched per server-side cursor round trip; also the number of rows
+# serialized into one chunk of the response body.
+EXPORT_BATCH_ROWS = 1000
+
+# Same fields as a list_links item, in this order (also the CSV header)
+EXPORT_COLUMNS = (
+    "code",
+    "long_url",
+    "created_at",
+    "expires_at",
+    "is_active",
+    "click_count",
+    "last_accessed_at",
+    "max_clicks",
+)
+
+_EXPORT_SELECT = [getattr(Link, column) for column in EXPORT_COLUMNS]
+
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _iso(dt) -> str | None:
+    return dt.isoformat() if dt is not None else None
+
+
+def _ndjson_chunk(rows) -> bytes:
+    lines = []
+    for row in rows:
+        lines.append(
+            json.dumps(
+                {
+                    "code": row.code,
+                    "long_url": row.long_url,
+                    "created_at": _iso(row.created_at),
+                    "expires_at": _iso(row.expires_at),
+                    "is_active": row.is_active,
+                    "click_count": row.click_count,
+                    "last_accessed_at": _iso(row.last_accessed_at),
+                    "max_clicks": row.max_clicks,
+                },
+                separators=(",", ":"),
+            )
+        )
+    lines.append("")
+    return "\n".join(lines).encode("utf-8")
+
+
+class _CsvChunks:
+    """Reuses one writer and buffer, emptied after every chunk."""
+
+    def __init__(self) -> None:
+        self._buf = io.StringIO()
+        self._writer = csv.writer(self._buf, lineterminator="\n")
+
+    def _take(self) -> bytes:
+        data = self._buf.getvalue().encode("utf-8")
+        self._buf.seek(0)
+        self._buf.truncate()
+        return data
+
+    def header(self) -> bytes:
+        self._writer.writerow(EXPORT_COLUMNS)
+        return self._take()
+
+    def __call__(self, rows) -> bytes:
+        self._writer.writerows(
+            (
+                row.code,
+                row.long_url,
+                _iso(row.created_at),
+                _iso(row.expires_at) or "",
+                "true" if row.is_active else "false",
+                row.click_count,
+                _iso(row.last_accessed_at) or "",
+                "" if row.max_clicks is None else row.max_clicks,
+            )
+            for row in rows
+        )
+        return self._take()
+
+
+def _export_query(owner_id: uuid.UUID, batch_rows: int):
+    return (
+        select(*_EXPORT_SELECT)
+        .where(Link.owner_api_key_id == owner_id)
+        .order_by(Link.created_at.desc(), Link.id.desc())
+        .execution_options(yield_per=batch_rows)
+    )
+
+
+def _encoder(fmt: str) -> tuple[bytes | None, Callable[..., bytes]]:
+    """(header chunk or None, rows -> chunk) for an export format."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt!r}")
+    if fmt == "csv":
+        encode = _CsvChunks()
+        return encode.header(), encode
+    return None, _ndjson_chunk
+
+
+def iter_export(
+    session_factory: Callable[[], Session],
+    owner_id: uuid.UUID,
+    fmt: str,
+    batch_rows: int = EXPORT_BATCH_ROWS,
+) -> Iterator[bytes]:
+    """
+    Yield the owner's links, newest first, as encoded chunks of `batch_rows`
+    rows each.
+
+    The rows come from a server-side cursor (yield_per), so memory stays
+    flat however many links are exported. The generator opens its own
+    session because it runs after the request's dependencies have exited.
+    """
+    header, encode = _encoder(fmt)
+    stmt = _export_query(owner_id, batch_rows)
+    if header is not None:
+        yield header
+
+    with session_factory() as db:
+        for rows in db.execute(stmt).partitions():
+            yield encode(rows)
+
+
+async def iter_export_async(
+    session_factory: Callable[[], AsyncSession],
+    owner_id: uuid.UUID,
+    fmt: str,
+    batch_rows: int = EXPORT_BATCH_ROWS,
+) -> AsyncIterator[bytes]:
+    """asyncio counterpart of iter_export, streaming from AsyncSession.stream."""
+    header, encode = _encoder(fmt)
+    stmt = _export_query(owner_id, batch_rows)
+    if header is not None:
+        yield header
+
+    async with session_factory() as db:
+        result = await db.stream(stmt)
+        async for rows in result.partitions():
+            yield encode(rows)
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Compress a chunk stream incrementally into one gzip member."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+async def gzip_chunks_async(chunks: AsyncIterable[bytes], level: int = 6) -> AsyncIterator[bytes]:
+    """asyncio counterpart of gzip_chunks."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import math
+import threading
+import time
+from typing import Callable, NamedTuple
+
+from redis import Redis
+
+PRELIMIT_LOCAL = "local"
+PRELIMIT_REDIS = "redis"
+PRELIMIT_DENY = "deny"
+
+# Applies buffered per-client deltas to the shared fixed-window counters
+# (the same keys the redirect script INCRs) and reports where each stands.
+SYNC_LUA = r"""
+-- KEYS: window counters
+-- ARGV: 1 window (ms), 2.. delta per key (0 = only read it)
+-- Returns a flat {count, pttl_ms, ...} list
+local out = {}
+for i, key in ipairs(KEYS) do
+  local delta = tonumber(ARGV[i + 1])
+  local count
+  if delta > 0 then
+    count = redis.call("INCRBY", key, delta)
+  else
+    count = tonumber(redis.call("GET", key) or "0")
+  end
+  local ttl = redis.call("PTTL", key)
+  if ttl == -1 then
+    redis.call("PEXPIRE", key, ARGV[1])
+    ttl = tonumber(ARGV[1])
+  end
+  out[#out + 1] = count
+  out[#out + 1] = ttl
+end
+return out
+"""
+
+
+class PreLimitVerdict(NamedTuple):
+    decision: str
+    retry_after: int = 0
+
+
+class _ClientState:
+    __slots__ = ("pending", "interval_admits", "needs_refresh", "seen", "window_ends")
+
+    def __init__(self) -> None:
+        # Admitted locally, not yet added to the Redis counter
+        self.pending = 0
+        # Local admits since the last successful sync (capped by burst)
+        self.interval_admits = 0
+        # Sent to Redis since the last sync; re-read its counter next sync
+        self.needs_refresh = False
+        # Redis counter as of the last sync, and when that window ends
+        self.seen = 0
+        self.window_ends = 0.0
+
+
+class LocalPreLimiter:
+    """
+    Per-worker first tier in front of a Redis fixed-window limit.
+
+    While a client is comfortably under its limit, hits are admitted and
+    counted in memory; sync() (run every ~100 ms) adds the buffered deltas
+    to the Redis counters in one script call. Only clients near or over
+    their quota are sent to Redis per request, and once a sync shows a
+    client over quota it is denied locally until its window ends.
+
+    Overshoot bound: each worker admits at most `burst` hits per client
+    between two successful syncs, and only while its last known count plus
+    its own pending hits is under the limit. A client can therefore get at
+    most limit + 2 * workers * burst hits per window (the interval in which
+    the limit is crossed, plus the one before every worker has synced).
+
+    Thread-safe: sync route handlers run in Starlette's threadpool.
+    """
+
+    def __init__(
+        self,
+        key_prefix: str,
+        limit: int,
+        window_seconds: int,
+        burst: int,
+        max_clients: int = 100_000,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.key_prefix = key_prefix
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.burst = burst
+        self.max_clients = max_clients
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._clients: dict[str, _ClientState] = {}
+        self._script = None
+        self.local_admits = 0
+        self.local_denies = 0
+        self.redis_checks = 0
+
+    def admit(self, client: str) -> PreLimitVerdict:
+        now = self._clock()
+        with self._lock:
+            state = self._clients.get(client)
+            if state is None:
+                if len(self._clients) >= self.max_clients:
+                    self.redis_checks += 1
+                    return PreLimitVerdict(PRELIMIT_REDIS)
+                state = self._clients[client] = _ClientState()
+
+            if state.window_ends and now >= state.window_ends:
+                state.seen = 0
+                state.window_ends = 0.0
+
+            if state.seen >= self.limit and state.window_ends:
+                self.local_denies += 1
+                return PreLimitVerdict(PRELIMIT_DENY, math.ceil(state.window_ends - now))
+
+            if state.interval_admits < self.burst and state.seen + state.pending < self.limit:
+                state.pending += 1
+                state.interval_admits += 1
+                self.local_admits += 1
+                return PreLimitVerdict(PRELIMIT_LOCAL)
+
+            state.needs_refresh = True
+            self.redis_checks += 1
+            return PreLimitVerdict(PRELIMIT_REDIS)
+
+    def sync(self, r: Redis) -> int:
+        """
+        Push buffered deltas to Redis and refresh the counters of clients
+        that went to Redis. Returns the number of clients synced.
+        """
+        if self._script is None:
+            self._script = r.register_script(SYNC_LUA)
+
+        now = self._clock()
+        with self._lock:
+            batch = []
+            for client, state in list(self._clients.items()):
+                if state.pending or state.needs_refresh:
+                    batch.append((client, state.pending))
+                    state.pending = 0
+                    state.needs_refresh = False
+                elif not state.window_ends or now >= state.window_ends:
+                    # idle and nothing to enforce: forget it
+                    del self._clients[client]
+
+        if not batch:
+            with self._lock:
+                for state in self._clients.values():
+                    state.interval_admits = 0
+            return 0
+
+        try:
+            raw = self._script(
+                keys=[f"{self.key_prefix}{client}" for client, _ in batch],
+                args=[self.window_seconds * 1000, *(delta for _, delta in batch)],
+            )
+        except Exception:
+            # Put the deltas back so they are sent next time
+            with self._lock:
+                for client, delta in batch:
+                    state = self._clients.setdefault(client, _ClientState())
+                    state.pending += delta
+                    state.needs_refresh = True
+            raise
+
+        with self._lock:
+            for i, (client, _) in enumerate(batch):
+                state = self._clients.get(client)
+                if state is None:
+                    continue
+                state.seen = int(raw[i * 2])
+                state.window_ends = now + max(0, int(raw[i * 2 + 1])) / 1000
+            for state in self._clients.values():
+                state.interval_admits = 0
+        return len(batch)
@@ -1,81 +1,254 @@
 from __future__ import annotations
+
+import math
 from dataclasses import dataclass
+from functools import lru_cache
+from typing import Sequence
 
 from redis import Redis
-import time
+from redis.asyncio import Redis as AsyncRedis
+
+from urlshortenerapi.core.redis import get_async_redis_client, get_redis_client
+
+FIXED_WINDOW = "fixed_window"
+TOKEN_BUCKET = "token_bucket"
+GCRA = "gcra"
+
+_ALGORITHM_IDS = {FIXED_WINDOW: "fw", TOKEN_BUCKET: "tb", GCRA: "gcra"}
 
 
 @dataclass(frozen=True)
-class RateLimitResult:
+class RateLimitRule:
+    key: str
+    limit: int
+    window_seconds: int
+    algorithm: str = FIXED_WINDOW
+    cost: int = 1
+    # Token bucket only: how long an idle bucket key is kept
+    # (None = two windows, by when it has refilled anyway)
+    ttl_seconds: int | None = None
+
+
+@dataclass(frozen=True)
+class RuleOutcome:
+    rule: RateLimitRule
     allowed: bool
     remaining: int
+    # Seconds until this rule would admit the request (0 when allowed)
+    retry_after: int
+    # Seconds until this rule is back to its full quota
     reset_seconds: int
 
 
-def check_rate_limit(
-    r: Redis,
-    key: str,
-    limit: int,
-    window_seconds: int,
-) -> RateLimitResult:
+@dataclass(frozen=True)
+class RateLimitDecision:
+    allowed: bool
+    outcomes: tuple[RuleOutcome, ...]
+
+    @property
+    def retry_after(self) -> int:
+        return max((o.retry_after for o in self.outcomes), default=0)
+
+
+# Checks every rule first and only records the hit if all of them admit it,
+# so a request denied by one limit does not use up quota on the others.
+# Time comes from the Redis server, so workers with skewed clocks agree.
+RATE_LIMIT_LUA = r"""
+-- KEYS: one per rule
+-- ARGV: 5 per rule: algorithm ("fw" | "tb" | "gcra"), limit, window_ms, cost,
+--       ttl_ms (token bucket key expiry; 0 = two windows)
+-- Returns {all_allowed, then per rule: allowed, remaining, retry_after_ms, reset_ms}
+local t = redis.call("TIME")
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+local out = {1}
+local writes = {}
+
+for i = 1, #KEYS do
+  local key = KEYS[i]
+  local base = (i - 1) * 5
+  local algo = ARGV[base + 1]
+  local limit = tonumber(ARGV[base + 2])
+  local window = tonumber(ARGV[base + 3])
+  local cost = tonumber(ARGV[base + 4])
+  local ttl_ms = tonumber(ARGV[base + 5])
+  local allowed, remaining, retry_after, reset
+
+  if algo == "fw" then
+    local count = tonumber(redis.call("GET", key) or "0")
+    local ttl = redis.call("PTTL", key)
+    if ttl < 0 then ttl = window end
+    reset = ttl
+    if count + cost > limit then
+      allowed, remaining, retry_after = 0, math.max(0, limit - count), ttl
+    else
+      allowed, remaining, retry_after = 1, limit - count - cost, 0
+      writes[#writes + 1] = {"fw", key, cost, ttl}
+    end
+
+  elseif algo == "tb" then
+    local data = redis.call("HMGET", key, "tokens", "ts")
+    local tokens = tonumber(data[1]) or limit
+    local ts = tonumber(data[2]) or now
+    local rate = limit / window
+    tokens = math.min(limit, tokens + math.max(0, now - ts) * rate)
+    if tokens >= cost then
+      tokens = tokens - cost
+      allowed, retry_after = 1, 0
+      if ttl_ms <= 0 then ttl_ms = window * 2 end
+      writes[#writes + 1] = {"tb", key, tokens, now, ttl_ms}
+    else
+      allowed, retry_after = 0, math.ceil((cost - tokens) / rate)
+    end
+    remaining = math.floor(tokens)
+    reset = math.ceil((limit - tokens) / rate)
+
+  else
+    -- GCRA: the key holds the theoretical arrival time (TAT). Each hit
+    -- pushes it by one emission interval; a hit is admitted while the TAT
+    -- stays within one window of now, which allows bursts of `limit`.
+    local interval = window / limit
+    local tat = math.max(tonumber(redis.call("GET", key) or "0"), now)
+    local new_tat = tat + interval * cost
+    local allow_at = new_tat - window
+    if now < allow_at then
+      allowed, retry_after = 0, math.ceil(allow_at - now)
+      remaining = math.max(0, math.floor((now + window - tat) / interval))
+      reset = math.ceil(tat - now)
+    else
+      allowed, retry_after = 1, 0
+      remaining = math.floor((now + window - new_tat) / interval)
+      reset = math.ceil(new_tat - now)
+      writes[#writes + 1] = {"gcra", key, new_tat, reset}
+    end
+  end
+
+  if allowed == 0 then out[1] = 0 end
+  out[#out + 1] = allowed
+  out[#out + 1] = remaining
+  out[#out + 1] = retry_after
+  out[#out + 1] = reset
+end
+
+if out[1] == 1 then
+  for _, w in ipairs(writes) do
+    if w[1] == "fw" then
+      redis.call("INCRBY", w[2], w[3])
+      redis.call("PEXPIRE", w[2], w[4])
+    elseif w[1] == "tb" then
+      redis.call("HSET", w[2], "tokens", w[3], "ts", w[4])
+      redis.call("PEXPIRE", w[2], w[5])
+    else
+      redis.call("SET", w[2], string.format("%.3f", w[3]), "PX", math.max(1, w[4]))
+    end
+  end
+end
+
+return out
+"""
+
+
+def _ms_to_seconds(ms) -> int:
+    return math.ceil(int(ms) / 1000)
+
+
+def _script_args(rules: Sequence[RateLimitRule]) -> list:
+    args: list = []
+    for rule in rules:
+        args += [
+            _ALGORITHM_IDS[rule.algorithm],
+            rule.limit,
+            rule.window_seconds * 1000,
+            rule.cost,
+            (rule.ttl_seconds or 0) * 1000,
+        ]
+    return args
+
+
+def _parse_decision(rules: Sequence[RateLimitRule], raw: list) -> RateLimitDecision:
+    outcomes = tuple(
+        RuleOutcome(
+            rule=rule,
+            allowed=bool(int(raw[1 + i * 4])),
+            remaining=max(0, int(raw[2 + i * 4])),
+            retry_after=_ms_to_seconds(raw[3 + i * 4]),
+            reset_seconds=_ms_to_seconds(raw[4 + i * 4]),
+        )
+        for i, rule in enumerate(rules)
+    )
+    return RateLimitDecision(allowed=bool(int(raw[0])), outcomes=outcomes)
+
+
+class RateLimiter:
     """
-    Algorithm:
-    - Increment key
-    - If this is the first hit, set expiry window_seconds
-    - If count > limit => block
-    - remaining = max(0, limit - count)
-    - reset_seconds from TTL (best-effort)
+    Checks any number of rate-limit rules (mixed algorithms) in one EVALSHA
+    round trip. Either every rule admits the request and all of them record
+    it, or nothing is recorded.
     """
-    count = r.incr(key)
 
-    if count == 1:
-        # first request in the window; start the window timer
-        r.expire(key, window_seconds)
+    def __init__(self, r: Redis) -> None:
+        # register_script uses EVALSHA and falls back to EVAL on NOSCRIPT
+        self._script = r.register_script(RATE_LIMIT_LUA)
 
-    ttl = r.ttl(key)
-    reset_seconds = ttl if isinstance(ttl, int) and ttl > 0 else window_seconds
+    def check(self, rules: Sequence[RateLimitRule]) -> RateLimitDecision:
+        if not rules:
+            return RateLimitDecision(allowed=True, outcomes=())
+        raw = self._script(keys=[rule.key for rule in rules], args=_script_args(rules))
+        return _parse_decision(rules, raw)
 
-    remaining = max(0, limit - int(count))
-    allowed = int(count) <= limit
 
-    return RateLimitResult(allowed=allowed, remaining=remaining, reset_seconds=reset_seconds)
+class AsyncRateLimiter:
+    """asyncio counterpart of RateLimiter (same script, same decision)."""
 
+    def __init__(self, r: AsyncRedis) -> None:
+        self._script = r.register_script(RATE_LIMIT_LUA)
 
-TOKEN_BUCKET_LUA = r"""
-local key = KEYS[1]
-local capacity = tonumber(ARGV[1])
-local refill_rate = tonumber(ARGV[2])
-local now = tonumber(ARGV[3])
-local cost = tonumber(ARGV[4])
-local ttl = tonumber(ARGV[5])
+    async def check(self, rules: Sequence[RateLimitRule]) -> RateLimitDecision:
+        if not rules:
+            return RateLimitDecision(allowed=True, outcomes=())
+        raw = await self._script(keys=[rule.key for rule in rules], args=_script_args(rules))
+        return _parse_decision(rules, raw)
 
-local data = redis.call("HMGET", key, "tokens", "ts")
-local tokens = tonumber(data[1])
-local ts = tonumber(data[2])
 
-if tokens == nil then tokens = capacity end
-if ts == nil then ts = now end
+@lru_cache(maxsize=8)
+def _rate_limiter_for(r: Redis) -> RateLimiter:
+    # Keyed by client identity, so the script is registered once per client
+    return RateLimiter(r)
 
--- refill tokens based on elapsed time
-local delta = math.max(0, now - ts)
-tokens = math.min(capacity, tokens + (delta * refill_rate))
 
-local allowed = 0
-local retry_after = 0
+def get_rate_limiter() -> RateLimiter:
+    return _rate_limiter_for(get_redis_client())
 
-if tokens >= cost then
-  allowed = 1
-  tokens = tokens - cost
-else
-  allowed = 0
-  retry_after = math.ceil((cost - tokens) / refill_rate)
-end
 
-redis.call("HMSET", key, "tokens", tokens, "ts", now)
-redis.call("EXPIRE", key, ttl)
+@lru_cache(maxsize=1)
+def get_async_rate_limiter() -> AsyncRateLimiter:
+    return AsyncRateLimiter(get_async_redis_client())
 
-return {allowed, tokens, retry_after}
-"""
+
+@dataclass(frozen=True)
+class RateLimitResult:
+    allowed: bool
+    remaining: int
+    reset_seconds: int
+
+
+def check_rate_limit(
+    r: Redis,
+    key: str,
+    limit: int,
+    window_seconds: int,
+) -> RateLimitResult:
+    """
+    Fixed window: at most `limit` hits per `window_seconds`, counted and
+    expired atomically in one script call. Denied hits are not counted.
+    """
+    decision = _rate_limiter_for(r).check([RateLimitRule(key, limit, window_seconds)])
+    outcome = decision.outcomes[0]
+    return RateLimitResult(
+        allowed=outcome.allowed,
+        remaining=outcome.remaining,
+        reset_seconds=outcome.reset_seconds or window_seconds,
+    )
 
 
 @dataclass(frozen=True)
@@ -98,28 +271,22 @@ def check_token_bucket(
     - capacity tokens
     - refills linearly: capacity / window_seconds tokens per second
     - each request costs 'cost'
-    - retry_after tells client when 1 token will be available
+    - retry_after tells client when 'cost' tokens will be available
 
-    Uses Redis Lua for atomicity.
+    The bucket key expires after `ttl_seconds` without an admitted request,
+    two windows by default (it is full by then anyway).
     """
-    refill_rate = capacity / float(window_seconds)
-    now = time.time()
-    ttl = ttl_seconds if ttl_seconds is not None else window_seconds * 2
-
-    allowed, tokens, retry_after = r.eval(
-        TOKEN_BUCKET_LUA,
-        1,
+    rule = RateLimitRule(
         key,
         capacity,
-        refill_rate,
-        now,
-        cost,
-        ttl,
+        window_seconds,
+        algorithm=TOKEN_BUCKET,
+        cost=cost,
+        ttl_seconds=ttl_seconds,
+    )
+    outcome = _rate_limiter_for(r).check([rule]).outcomes[0]
+    return TokenBucketResult(
+        allowed=outcome.allowed,
+        remaining=outcome.remaining,
+        retry_after=outcome.retry_after,
     )
-
-    # redis-py may return ints/floats; be defensive
-    allowed_bool = bool(int(allowed))
-    remaining_int = max(0, int(float(tokens)))
-    retry_int = int(retry_after)
-
-    return TokenBucketResult(allowed=allowed_bool, remaining=remaining_int, retry_after=retry_int)
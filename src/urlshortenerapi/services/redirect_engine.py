@@ -0,0 +1,258 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache
+
+from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
+
+from urlshortenerapi.core.redis import get_async_redis_client, get_redis_client
+from urlshortenerapi.services.click_buffer import (
+    BUCKET_SECONDS,
+    CLICK_BUCKETS_KEY,
+    CLICKS_IN_FLIGHT_KEY,
+    CLICKS_KEY,
+    LAST_ACCESSED_KEY,
+)
+from urlshortenerapi.services.bloom import code_filter
+from urlshortenerapi.services.link_cache import (
+    LINK_CACHE_PREFIX,
+    NEGATIVE_CACHE_PREFIX,
+    CachedLink,
+    epoch_ms,
+)
+from urlshortenerapi.services.rate_limiter import RateLimitRule
+from urlshortenerapi.services.unique_visitors import (
+    OWNER_VISITORS_PREFIX,
+    day_key,
+    link_visitors_key,
+    visitors_expire_at,
+)
+
+# Placeholder key passed when no rate limit applies; the script never touches it.
+_NO_RATE_LIMIT_KEY = "rl:none"
+
+REDIRECT_OK = "ok"
+REDIRECT_MISS = "miss"
+REDIRECT_NOT_FOUND = "not_found"
+REDIRECT_RATE_LIMITED = "rate_limited"
+REDIRECT_DISABLED = "disabled"
+REDIRECT_EXPIRED = "expired"
+REDIRECT_MAX_CLICKS = "max_clicks"
+
+
+REDIRECT_LUA = r"""
+-- KEYS: 1 rate-limit counter, 2 link cache entry, 3 click buffer hash, 4 last-accessed hash,
+--       5 negative cache entry, 6 code filter bitmap, 7 hourly click buckets hash,
+--       8 link unique-visitor HLL for today, 9 in-flight click counts
+-- ARGV: 1 limit (0 = no limit), 2 window, 3 now (epoch ms), 4 now (ISO-8601),
+--       5 link code, 6 max_clicks ("" = unlimited), 7 click_count ("" = read cache),
+--       8 bucket start (epoch seconds), 9 visitor hash ("" = skip), 10 day (YYYYMMDD),
+--       11 HLL expiry (epoch seconds), 12 owner id ("" = read cache),
+--       13.. code filter bit positions
+local limit = tonumber(ARGV[1])
+if limit > 0 then
+  local count = redis.call("INCR", KEYS[1])
+  if count == 1 then
+    redis.call("EXPIRE", KEYS[1], ARGV[2])
+  end
+  if count > limit then
+    local ttl = redis.call("TTL", KEYS[1])
+    if ttl < 0 then ttl = tonumber(ARGV[2]) end
+    return {"rate_limited", "", ttl}
+  end
+end
+
+local payload = ""
+local cache_ttl = -1
+local max_clicks
+local click_count
+local owner = ARGV[12]
+
+if ARGV[7] == "" then
+  payload = redis.call("GET", KEYS[2])
+  if not payload then
+    if redis.call("EXISTS", KEYS[5]) == 1 then
+      return {"not_found", "", 0}
+    end
+    -- an unbuilt filter proves nothing; let the caller ask Postgres
+    if redis.call("EXISTS", KEYS[6]) == 1 then
+      for i = 13, #ARGV do
+        if redis.call("GETBIT", KEYS[6], ARGV[i]) == 0 then
+          return {"not_found", "", 0}
+        end
+      end
+    end
+    return {"miss", "", 0}
+  end
+  -- CachedLink layout: active|expires_ms|max_clicks|click_count|owner_id|long_url
+  local active, expires_ms, max_s, count_s, owner_s =
+    string.match(payload, "^([01])|(%d*)|(%d*)|(%d+)|([%x%-]*)|")
+  if not active then
+    -- unknown layout (e.g. written by an older release): reload from Postgres
+    return {"miss", "", 0}
+  end
+  if active == "0" then
+    return {"disabled", "", 0}
+  end
+  if expires_ms ~= "" and tonumber(ARGV[3]) >= tonumber(expires_ms) then
+    return {"expired", "", 0}
+  end
+  max_clicks = tonumber(max_s)
+  click_count = tonumber(count_s)
+  owner = owner_s
+  -- lets the caller refresh a hot entry before it expires (XFetch)
+  cache_ttl = redis.call("PTTL", KEYS[2])
+else
+  max_clicks = tonumber(ARGV[6])
+  click_count = tonumber(ARGV[7])
+end
+
+-- check + increment happen inside one script, so max_clicks cannot be
+-- overshot by concurrent redirects on other workers
+if type(max_clicks) == "number" then
+  -- clicks a flush has popped but not committed yet count too
+  local buffered = tonumber(redis.call("HGET", KEYS[3], ARGV[5]) or "0")
+    + tonumber(redis.call("HGET", KEYS[9], ARGV[5]) or "0")
+  if click_count + buffered >= max_clicks then
+    return {"max_clicks", "", 0}
+  end
+end
+
+redis.call("HINCRBY", KEYS[3], ARGV[5], 1)
+redis.call("HSET", KEYS[4], ARGV[5], ARGV[4])
+redis.call("HINCRBY", KEYS[7], ARGV[5] .. "|" .. ARGV[8], 1)
+
+-- Unique visitors. PFADD returns 1 when it creates the key (and when the
+-- estimate moves), so every new day's HLL gets its expiry without an
+-- extra call on clicks from repeat visitors.
+-- The owner key depends on the cached owner id, so it is built here
+-- (fine on a single Redis; not cluster-safe).
+if ARGV[9] ~= "" then
+  if redis.call("PFADD", KEYS[8], ARGV[9]) == 1 then
+    redis.call("EXPIREAT", KEYS[8], ARGV[11])
+  end
+  if owner ~= "" then
+    local owner_key = "__OWNER_PREFIX__" .. owner .. ":" .. ARGV[10]
+    if redis.call("PFADD", owner_key, ARGV[9]) == 1 then
+      redis.call("EXPIREAT", owner_key, ARGV[11])
+    end
+  end
+end
+
+return {"ok", payload, 0, cache_ttl}
+""".replace("__OWNER_PREFIX__", OWNER_VISITORS_PREFIX)
+
+
+@dataclass(frozen=True)
+class RedirectResult:
+    status: str
+    # Raw link_cache payload, set only when the script read it from Redis
+    payload: str | None = None
+    retry_after: int = 0
+    # Remaining TTL of that cache entry (-1 when the payload was not read)
+    cache_ttl_ms: int = -1
+
+
+def _script_call(
+    code: str,
+    now: datetime,
+    rate_limit: RateLimitRule | None,
+    link: CachedLink | None,
+    visitor: str | None,
+) -> tuple[list, list]:
+    day = day_key(now)
+    keys = [
+        rate_limit.key if rate_limit else _NO_RATE_LIMIT_KEY,
+        f"{LINK_CACHE_PREFIX}{code}",
+        CLICKS_KEY,
+        LAST_ACCESSED_KEY,
+        f"{NEGATIVE_CACHE_PREFIX}{code}",
+        code_filter.key,
+        CLICK_BUCKETS_KEY,
+        link_visitors_key(code, day),
+        CLICKS_IN_FLIGHT_KEY,
+    ]
+    args = [
+        rate_limit.limit if rate_limit else 0,
+        rate_limit.window_seconds if rate_limit else 0,
+        epoch_ms(now),
+        now.isoformat(),
+        code,
+        "" if link is None or link.max_clicks is None else link.max_clicks,
+        "" if link is None else link.click_count,
+        int(now.timestamp()) // BUCKET_SECONDS * BUCKET_SECONDS,
+        visitor or "",
+        day,
+        visitors_expire_at(now),
+        "" if link is None else link.owner_id,
+    ]
+    if link is None:
+        args.extend(code_filter.positions(code))
+    return keys, args
+
+
+def _parse_result(raw: list) -> RedirectResult:
+    status, payload, retry_after, *cache_ttl = raw
+    return RedirectResult(
+        status=status,
+        payload=payload or None,
+        retry_after=int(retry_after),
+        cache_ttl_ms=int(cache_ttl[0]) if cache_ttl else -1,
+    )
+
+
+class RedirectEngine:
+    """
+    Runs the whole redirect bookkeeping in one EVALSHA round trip:
+    rate limit, cache fetch, max_clicks-aware click increment, hourly
+    click bucket and last-accessed update.
+
+    When the caller already holds the link (local cache hit), it passes
+    it in and the script skips the cache read. `visitor` is the hashed
+    client id for the unique-visitor HLLs (None = not counted).
+    """
+
+    def __init__(self, r: Redis) -> None:
+        # register_script uses EVALSHA and falls back to EVAL on NOSCRIPT
+        self._script = r.register_script(REDIRECT_LUA)
+
+    def run(
+        self,
+        code: str,
+        now: datetime,
+        rate_limit: RateLimitRule | None = None,
+        link: CachedLink | None = None,
+        visitor: str | None = None,
+    ) -> RedirectResult:
+        keys, args = _script_call(code, now, rate_limit, link, visitor)
+        return _parse_result(self._script(keys=keys, args=args))
+
+
+class AsyncRedirectEngine:
+    """asyncio counterpart of RedirectEngine (same script, same result)."""
+
+    def __init__(self, r: AsyncRedis) -> None:
+        self._script = r.register_script(REDIRECT_LUA)
+
+    async def run(
+        self,
+        code: str,
+        now: datetime,
+        rate_limit: RateLimitRule | None = None,
+        link: CachedLink | None = None,
+        visitor: str | None = None,
+    ) -> RedirectResult:
+        keys, args = _script_call(code, now, rate_limit, link, visitor)
+        return _parse_result(await self._script(keys=keys, args=args))
+
+
+@lru_cache(maxsize=1)
+def get_redirect_engine() -> RedirectEngine:
+    return RedirectEngine(get_redis_client())
+
+
+@lru_cache(maxsize=1)
+def get_async_redirect_engine() -> AsyncRedirectEngine:
+    return AsyncRedirectEngine(get_async_redis_client())
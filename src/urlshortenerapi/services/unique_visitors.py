@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import hashlib
+from datetime import date, datetime, timedelta, timezone
+
+from redis import Redis
+
+from urlshortenerapi.core.config import settings
+
+# One HyperLogLog per link per UTC day and per owner per UTC day. The
+# redirect script adds the hashed visitor to both and sets the expiry, so
+# only the last `unique_visitors_retention_days` days are kept.
+LINK_VISITORS_PREFIX = "uv:link:"
+OWNER_VISITORS_PREFIX = "uv:owner:"
+
+_VISITOR_HASH_KEY = hashlib.sha256(settings.visitor_hash_key.encode("utf-8")).digest()
+
+
+def visitor_id(client_ip: str) -> str:
+    """Keyed hash of the client IP; raw IPs never reach Redis."""
+    return hashlib.blake2b(
+        client_ip.encode("utf-8"), key=_VISITOR_HASH_KEY, digest_size=8
+    ).hexdigest()
+
+
+def day_key(dt: datetime | date) -> str:
+    return dt.strftime("%Y%m%d")
+
+
+def link_visitors_key(code: str, day: str) -> str:
+    return f"{LINK_VISITORS_PREFIX}{code}:{day}"
+
+
+def owner_visitors_key(owner_id: str, day: str) -> str:
+    return f"{OWNER_VISITORS_PREFIX}{owner_id}:{day}"
+
+
+def visitors_expire_at(now: datetime) -> int:
+    """Epoch seconds at which today's HLLs fall out of the retention window."""
+    day_start = datetime.combine(now.date(), datetime.min.time(), tzinfo=timezone.utc)
+    return int(day_start.timestamp()) + (settings.unique_visitors_retention_days + 1) * 86400
+
+
+def retained_days(start: datetime, end: datetime, now: datetime | None = None) -> list[str]:
+    """UTC days overlapping [start, end) that are still inside the retention window."""
+    now = now or datetime.now(timezone.utc)
+    first = max(
+        start.date(), now.date() - timedelta(days=settings.unique_visitors_retention_days - 1)
+    )
+    last = (end - timedelta(microseconds=1)).date()
+    days = []
+    d = first
+    while d <= last:
+        days.append(day_key(d))
+        d += timedelta(days=1)
+    return days
+
+
+def count_unique(r: Redis, keys: list[str]) -> int:
+    """PFCOUNT over several HLLs counts their union without storing a merge."""
+    return int(r.pfcount(*keys)) if keys else 0
+
+
+def count_link_visitors(
+    r: Redis, code: str, start: datetime, end: datetime, now: datetime | None = None
+) -> int:
+    days = retained_days(start, end, now)
+    return count_unique(r, [link_visitors_key(code, day) for day in days])
+
+
+def count_owner_visitors(
+    r: Redis, owner_id: str, start: datetime, end: datetime, now: datetime | None = None
+) -> int:
+    days = retained_days(start, end, now)
+    return count_unique(r, [owner_visitors_key(owner_id, day) for day in days])
+
+
+def daily_link_visitors(r: Redis, code: str, days: list[str]) -> dict[str, int]:
+    """Per-day unique counts for the given day keys, in one pipeline."""
+    pipe = r.pipeline(transaction=False)
+    for day in days:
+        pipe.pfcount(link_visitors_key(code, day))
+    return {day: int(n) for day, n in zip(days, pipe.execute())}
+
+
+# asyncio counterparts for the ASYNC_MODE management routes
+
+
+async def count_unique_async(r, keys: list[str]) -> int:
+    return int(await r.pfcount(*keys)) if keys else 0
+
+
+async def count_link_visitors_async(
+    r, code: str, start: datetime, end: datetime, now: datetime | None = None
+) -> int:
+    days = retained_days(start, end, now)
+    return await count_unique_async(r, [link_visitors_key(code, day) for day in days])
+
+
+async def count_owner_visitors_async(
+    r, owner_id: str, start: datetime, end: datetime, now: datetime | None = None
+) -> int:
+    days = retained_days(start, end, now)
+    return await count_unique_async(r, [owner_visitors_key(owner_id, day) for day in days])
+
+
+async def daily_link_visitors_async(r, code: str, days: list[str]) -> dict[str, int]:
+    pipe = r.pipeline(transaction=False)
+    for day in days:
+        pipe.pfcount(link_visitors_key(code, day))
+    return {day: int(n) for day, n in zip(days, await pipe.execute())}
@@ -2,14 +2,17 @@ import os
 import hashlib
 import secrets
 
+import anyio.from_thread
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine, text
 from sqlalchemy.orm import Session
 
-from urlshortenerapi.main import app
+from urlshortenerapi.main import app, create_app
 from urlshortenerapi.api.deps import redirect_rate_limiter
-from urlshortenerapi.core.redis import get_redis_client
+from urlshortenerapi.core.redis import get_async_redis_client, get_redis_client
+from urlshortenerapi.db.session import get_async_sessionmaker
+from urlshortenerapi.services.link_cache import local_link_cache
 
 
 os.environ.setdefault("REDIRECT_LIMIT", "3")
@@ -71,23 +74,59 @@ def isolate_db():
     for k in r.scan_iter("rl:redirect:*"):
         r.delete(k)
 
+    # buffered clicks and visitor HLLs from earlier tests
+    r.delete("clicks", "last_accessed", "clicks:hourly")
+    for k in r.scan_iter("clicks:inflight*"):
+        r.delete(k)
+    for k in r.scan_iter("uv:*"):
+        r.delete(k)
+
+    # --- Local link cache isolation ---
+    local_link_cache.clear()
+
     yield
 
 
-@pytest.fixture()
-def client_a(api_key_a: str) -> TestClient:
+@pytest.fixture(scope="session")
+def async_app():
+    return create_app(async_mode=True)
+
+
+@pytest.fixture(scope="session")
+def async_portal():
+    """
+    One event loop for every ASYNC_MODE request: the async Redis pool and
+    engine are bound to the loop that first uses them.
+    """
+    with anyio.from_thread.start_blocking_portal() as portal:
+        yield portal
+        portal.call(get_async_redis_client().aclose)
+        portal.call(get_async_sessionmaker().kw["bind"].dispose)
+
+
+@pytest.fixture(params=["sync", "async"])
+def stack(request) -> str:
+    """Which handlers the client fixtures talk to: the default or ASYNC_MODE's."""
+    return request.param
+
+
+def _client(request, stack: str, raw_key: str) -> TestClient:
+    target = request.getfixturevalue("async_app") if stack == "async" else app
     # Override redirect rate limiter for determinism in redirect tests
-    app.dependency_overrides[redirect_rate_limiter] = lambda: None
+    target.dependency_overrides[redirect_rate_limiter] = lambda: None
 
-    c = TestClient(app)
-    c.headers.update({"X-API-Key": api_key_a})
+    c = TestClient(target)
+    if stack == "async":
+        c.portal = request.getfixturevalue("async_portal")
+    c.headers.update({"X-API-Key": raw_key})
     return c
 
 
 @pytest.fixture()
-def client_b(api_key_b: str) -> TestClient:
-    app.dependency_overrides[redirect_rate_limiter] = lambda: None
+def client_a(request, stack: str, api_key_a: str) -> TestClient:
+    return _client(request, stack, api_key_a)
 
-    c = TestClient(app)
-    c.headers.update({"X-API-Key": api_key_b})
-    return c
+
+@pytest.fixture()
+def client_b(request, stack: str, api_key_b: str) -> TestClient:
+    return _client(request, stack, api_key_b)
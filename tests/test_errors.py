@@ -1,4 +1,3 @@
-import os
 import time
 
 from fastapi.testclient import TestClient
@@ -91,14 +90,14 @@ def test_410_gone_expired_link(client_a):
     assert_error_shape(resp, "GONE")
 
 
-def test_429_rate_limited_create_includes_headers(client_a):
+def test_429_rate_limited_create_includes_headers(client_a, monkeypatch):
     """
     Exceed create rate limit should return 429 with Retry-After
     and the standard error format.
     Your isolate_db fixture clears Redis keys, so this stays deterministic.
     """
-    os.environ["CREATE_LIMIT"] = "2"
-    os.environ["CREATE_WINDOW"] = "60"
+    monkeypatch.setenv("CREATE_LIMIT", "2")
+    monkeypatch.setenv("CREATE_WINDOW", "60")
 
     r1 = client_a.post("/api/v1/links", json={"url": "https://example.com/1"})
     assert r1.status_code == 201
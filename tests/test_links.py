@@ -1,6 +1,8 @@
+import hashlib
 import re
 from datetime import datetime
 import secrets
+import time
 from sqlalchemy import create_engine, text
 from urlshortenerapi.core.config import settings
 
@@ -133,11 +135,37 @@ def _set_link_fields(code: str, **fields) -> None:
         conn.execute(text(f"UPDATE links SET {sets} WHERE code = :code"), params)
 
 
+def _flush_clicks() -> None:
+    from urlshortenerapi.core.redis import get_redis_client
+    from urlshortenerapi.db.session import SessionLocal
+    from urlshortenerapi.services.click_buffer import flush_click_buckets, flush_click_buffer
+
+    with SessionLocal() as db:
+        flush_click_buffer(get_redis_client(), db)
+        flush_click_buckets(get_redis_client(), db)
+
+
 def test_redirect_not_found_returns_404(client_a):
     resp = client_a.get("/doesnotexist", follow_redirects=False)
     assert resp.status_code == 404
 
 
+def test_alias_created_after_404_redirects(client_a):
+    alias = "late_" + secrets.token_urlsafe(8).replace("-", "_")
+
+    # 404 leaves a negative-cache marker for the code
+    miss = client_a.get(f"/{alias}", follow_redirects=False)
+    assert miss.status_code == 404
+
+    create = client_a.post(
+        "/api/v1/links", json={"url": "https://example.com", "custom_alias": alias}
+    )
+    assert create.status_code == 201
+
+    resp = client_a.get(f"/{alias}", follow_redirects=False)
+    assert resp.status_code == 307
+
+
 def test_redirect_disabled_returns_403(client_a):
     create = client_a.post("/api/v1/links", json={"url": "https://example.com"})
     assert create.status_code == 201
@@ -187,35 +215,22 @@ def test_redirect_increments_click_count_and_updates_last_accessed_at(client_a):
     resp = client_a.get(f"/{code}", follow_redirects=False)
     assert resp.status_code == 307
 
-    from urlshortenerapi.core.redis import get_redis_client
-
-    r = get_redis_client()
-    raw = r.getdel(f"clicks:{code}")
-    ts_raw = r.getdel(f"last_accessed:{code}")
-
-    flush_fields = {}
-    if raw:
-        flush_fields["click_count"] = int(raw)
-    if ts_raw:
-        flush_fields["last_accessed_at"] = ts_raw  # add this
-    if flush_fields:
-        _set_link_fields(code, **flush_fields)
+    _flush_clicks()
 
     after = _get_link_row(code)
     assert after["click_count"] == before["click_count"] + 1
     assert after["last_accessed_at"] is not None
 
 
-def test_create_rate_limit_returns_429_and_headers(client_a, api_key_a):
-    import os
+def test_create_rate_limit_returns_429_and_headers(client_a, api_key_a, monkeypatch):
     import hashlib
     from sqlalchemy import create_engine, text
     from urlshortenerapi.core.config import settings
     from urlshortenerapi.core.redis import get_redis_client
 
     # Tight limit for test
-    os.environ["CREATE_LIMIT"] = "3"
-    os.environ["CREATE_WINDOW"] = "60"
+    monkeypatch.setenv("CREATE_LIMIT", "3")
+    monkeypatch.setenv("CREATE_WINDOW", "60")
 
     # Look up api_key_id so we can clear Redis key for isolation
     key_hash = hashlib.sha256(api_key_a.encode("utf-8")).hexdigest()
@@ -272,6 +287,47 @@ def test_list_links_cursor_pagination(client_a):
     assert p2["next_cursor"] is None
 
 
+def test_readiness_waits_for_cache_warm_up(client_a, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from urlshortenerapi.main import app
+    from urlshortenerapi.services.link_cache import local_link_cache
+
+    code = client_a.post("/api/v1/links", json={"url": "https://example.com/hot"}).json()["code"]
+    monkeypatch.setattr(settings, "cache_warmup_links", 10)
+
+    with TestClient(app) as started:
+        for _ in range(50):
+            if started.get("/health/ready").status_code == 200:
+                break
+            time.sleep(0.1)
+        assert started.get("/health/ready").json() == {"status": "ready"}
+        assert local_link_cache.get(code) is not None
+
+
+def test_export_streams_all_owned_links(client_a, client_b):
+    import csv
+    import gzip
+    import io
+    import json
+
+    codes = {
+        client_a.post("/api/v1/links", json={"url": f"https://example.com/{i}"}).json()["code"]
+        for i in range(3)
+    }
+    client_b.post("/api/v1/links", json={"url": "https://example.com/other"})
+
+    ndjson = client_a.get("/api/v1/links/export")
+    assert ndjson.status_code == 200
+    assert ndjson.headers["content-type"].startswith("application/x-ndjson")
+    assert {json.loads(line)["code"] for line in ndjson.text.splitlines()} == codes
+
+    csv_resp = client_a.get("/api/v1/links/export", params={"format": "csv", "gzip": "true"})
+    assert csv_resp.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(gzip.decompress(csv_resp.content).decode())))
+    assert {row["code"] for row in rows} == codes
+
+
 def test_patch_disable_link_owner_only(client_a, client_b):
     code = client_a.post("/api/v1/links", json={"url": "https://example.com"}).json()["code"]
 
@@ -289,6 +345,47 @@ def test_patch_disable_link_owner_only(client_a, client_b):
     assert redir.status_code == 403
 
 
+def test_patch_disable_invalidates_cached_link(client_a):
+    code = client_a.post("/api/v1/links", json={"url": "https://example.com"}).json()["code"]
+
+    # HEAD fills both the Redis and the per-worker link cache
+    first = client_a.head(f"/{code}", follow_redirects=False)
+    assert first.status_code == 307
+
+    ok = client_a.patch(f"/api/v1/links/{code}", json={"is_active": False})
+    assert ok.status_code == 200
+
+    redir = client_a.get(f"/{code}", follow_redirects=False)
+    assert redir.status_code == 403
+
+
+def test_redirect_refreshes_expiring_cache_entry_early(client_a, monkeypatch):
+    from urlshortenerapi import main
+    from urlshortenerapi.core.redis import get_redis_client
+    from urlshortenerapi.services.link_cache import LINK_CACHE_PREFIX, local_link_cache
+
+    code = client_a.post("/api/v1/links", json={"url": "https://example.com"}).json()["code"]
+    assert client_a.head(f"/{code}", follow_redirects=False).status_code == 307
+
+    # A Redis entry close to expiry and stale, served from Redis
+    r = get_redis_client()
+    r.expire(f"{LINK_CACHE_PREFIX}{code}", 5)
+    _set_link_fields(code, long_url="https://example.com/moved")
+    local_link_cache.clear()
+    monkeypatch.setattr(main, "should_refresh_early", lambda *args: True)
+
+    resp = client_a.get(f"/{code}", follow_redirects=False)
+    assert resp.status_code == 307
+    assert resp.headers["location"] == "https://example.com/"
+
+    # The refresh runs in the background, after the response
+    deadline = time.monotonic() + 5
+    while "https://example.com/moved" not in (r.get(f"{LINK_CACHE_PREFIX}{code}") or ""):
+        assert time.monotonic() < deadline, "early refresh did not run"
+        time.sleep(0.01)
+    assert r.ttl(f"{LINK_CACHE_PREFIX}{code}") > 5
+
+
 def test_analytics_endpoint_returns_click_count_and_last_accessed_at(client_a):
     create = client_a.post("/api/v1/links", json={"url": "https://example.com"})
     assert create.status_code == 201
@@ -304,19 +401,7 @@ def test_analytics_endpoint_returns_click_count_and_last_accessed_at(client_a):
     r = client_a.get(f"/{code}", follow_redirects=False)
     assert r.status_code == 307
 
-    from urlshortenerapi.core.redis import get_redis_client
-
-    r = get_redis_client()
-    raw = r.getdel(f"clicks:{code}")
-    ts_raw = r.getdel(f"last_accessed:{code}")
-
-    flush_fields = {}
-    if raw:
-        flush_fields["click_count"] = int(raw)
-    if ts_raw:
-        flush_fields["last_accessed_at"] = ts_raw
-    if flush_fields:
-        _set_link_fields(code, **flush_fields)
+    _flush_clicks()
 
     a1 = client_a.get(f"/api/v1/links/{code}/analytics")
     assert a1.status_code == 200
@@ -325,6 +410,80 @@ def test_analytics_endpoint_returns_click_count_and_last_accessed_at(client_a):
     assert body1["last_accessed_at"] is not None
 
 
+def test_analytics_range_returns_hourly_and_daily_buckets(client_a):
+    from datetime import timedelta, timezone
+
+    create = client_a.post("/api/v1/links", json={"url": "https://example.com"})
+    code = create.json()["code"]
+
+    for _ in range(2):
+        assert client_a.get(f"/{code}", follow_redirects=False).status_code == 307
+    _flush_clicks()
+
+    now = datetime.now(timezone.utc)
+    hour = now.replace(minute=0, second=0, microsecond=0)
+    params = {
+        "from": (hour - timedelta(hours=2)).isoformat(),
+        "to": (hour + timedelta(hours=1)).isoformat(),
+        "granularity": "hour",
+    }
+    hourly = client_a.get(f"/api/v1/links/{code}/analytics", params=params)
+    assert hourly.status_code == 200
+    body = hourly.json()
+    assert body["granularity"] == "hour"
+    assert len(body["buckets"]) == 3
+    assert sum(b["clicks"] for b in body["buckets"]) == 2
+
+    daily = client_a.get(f"/api/v1/links/{code}/analytics", params={"granularity": "day"})
+    assert daily.status_code == 200
+    buckets = daily.json()["buckets"]
+    assert len(buckets) in (30, 31)
+    assert sum(b["clicks"] for b in buckets) == 2
+
+
+def test_analytics_range_validation(client_a):
+    create = client_a.post("/api/v1/links", json={"url": "https://example.com"})
+    code = create.json()["code"]
+
+    bad = client_a.get(f"/api/v1/links/{code}/analytics", params={"granularity": "week"})
+    assert bad.status_code == 422
+
+    backwards = client_a.get(
+        f"/api/v1/links/{code}/analytics",
+        params={"from": "2026-01-02T00:00:00Z", "to": "2026-01-01T00:00:00Z"},
+    )
+    assert backwards.status_code == 400
+
+    too_long = client_a.get(
+        f"/api/v1/links/{code}/analytics",
+        params={"from": "2020-01-01T00:00:00Z", "to": "2026-01-01T00:00:00Z"},
+    )
+    assert too_long.status_code == 400
+
+
+def test_analytics_counts_unique_visitors(client_a):
+    from datetime import timezone
+
+    first = client_a.post("/api/v1/links", json={"url": "https://example.com/1"}).json()["code"]
+    second = client_a.post("/api/v1/links", json={"url": "https://example.com/2"}).json()["code"]
+
+    # every TestClient request comes from the same client address
+    for code in (first, first, first, second):
+        assert client_a.get(f"/{code}", follow_redirects=False).status_code == 307
+
+    body = client_a.get(f"/api/v1/links/{first}/analytics").json()
+    assert body["unique_visitors"] == 1
+
+    daily = client_a.get(f"/api/v1/links/{first}/analytics", params={"granularity": "day"})
+    today = datetime.now(timezone.utc).date().isoformat()
+    (bucket,) = [b for b in daily.json()["buckets"] if b["start"].startswith(today)]
+    assert bucket["unique_visitors"] == 1
+
+    owner = client_a.get("/api/v1/analytics")
+    assert owner.status_code == 200
+    assert owner.json()["unique_visitors"] == 1
+
+
 def test_analytics_owner_only_returns_404(client_a, client_b):
     create = client_a.post("/api/v1/links", json={"url": "https://example.com"})
     assert create.status_code == 201
@@ -332,3 +491,197 @@ def test_analytics_owner_only_returns_404(client_a, client_b):
 
     resp = client_b.get(f"/api/v1/links/{code}/analytics")
     assert resp.status_code == 404
+
+
+def _reset_create_limit(monkeypatch, api_key: str, limit: int) -> None:
+    import hashlib
+    from urlshortenerapi.core.redis import get_redis_client
+
+    monkeypatch.setenv("CREATE_LIMIT", str(limit))
+    monkeypatch.setenv("CREATE_WINDOW", "60")
+
+    key_hash = hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+    engine = create_engine(settings.database_url)
+    with engine.connect() as conn:
+        api_key_id = conn.execute(
+            text("SELECT id FROM api_keys WHERE key_hash = :kh"),
+            {"kh": key_hash},
+        ).scalar_one()
+    get_redis_client().delete(f"rate:create:{api_key_id}")
+
+
+def test_batch_create_returns_per_item_results_in_order(client_a, api_key_a, monkeypatch):
+    _reset_create_limit(monkeypatch, api_key_a, 60)
+    alias = "batch_" + secrets.token_urlsafe(8).replace("-", "_")
+
+    resp = client_a.post(
+        "/api/v1/links:batch",
+        json={
+            "items": [
+                {"url": "https://example.com/a"},
+                {"url": "https://example.com/b", "custom_alias": alias, "max_clicks": 0},
+                {"url": "ftp://example.com"},
+                {"url": "https://example.com/c", "custom_alias": alias},
+            ]
+        },
+    )
+    assert resp.status_code == 200
+    assert resp.headers.get("X-RateLimit-Limit") == "60"
+    items = resp.json()["items"]
+    assert [item["index"] for item in items] == [0, 1, 2, 3]
+
+    assert _BASE62_RE.fullmatch(items[0]["link"]["code"])
+    assert items[0]["error"] is None
+    assert items[1]["link"]["code"] == alias
+    assert items[1]["link"]["max_clicks"] is None
+    assert items[2]["link"] is None
+    assert items[2]["error"]["code"] == "VALIDATION_ERROR"
+    assert items[3]["error"]["code"] == "CONFLICT"
+
+    redirect = client_a.get(f"/{alias}", follow_redirects=False)
+    assert redirect.status_code == 307
+
+
+def test_batch_create_alias_taken_by_existing_link_conflicts(client_a, api_key_a, monkeypatch):
+    _reset_create_limit(monkeypatch, api_key_a, 60)
+    alias = "batch_" + secrets.token_urlsafe(8).replace("-", "_")
+    first = client_a.post(
+        "/api/v1/links", json={"url": "https://example.com", "custom_alias": alias}
+    )
+    assert first.status_code == 201
+
+    resp = client_a.post(
+        "/api/v1/links:batch",
+        json={"items": [{"url": "https://example.com", "custom_alias": alias}]},
+    )
+    assert resp.status_code == 200
+    assert resp.json()["items"][0]["error"]["code"] == "CONFLICT"
+
+
+def test_batch_create_larger_than_bucket_rejected(client_a, api_key_a, monkeypatch):
+    _reset_create_limit(monkeypatch, api_key_a, 3)
+
+    resp = client_a.post(
+        "/api/v1/links:batch",
+        json={"items": [{"url": "https://example.com"}] * 4},
+    )
+    assert resp.status_code == 400
+
+
+def test_batch_create_charges_only_valid_items(client_a, api_key_a, monkeypatch):
+    _reset_create_limit(monkeypatch, api_key_a, 3)
+
+    resp = client_a.post(
+        "/api/v1/links:batch",
+        json={"items": [{"url": "https://example.com"}] * 2 + [{"url": "ftp://example.com"}] * 3},
+    )
+    assert resp.status_code == 200
+    assert resp.headers.get("X-RateLimit-Remaining") == "1"
+    errors = [item["error"] for item in resp.json()["items"]]
+    assert [e["code"] if e else None for e in errors] == [None, None] + ["VALIDATION_ERROR"] * 3
+
+
+def test_batch_create_larger_than_global_limit_rejected(client_a, api_key_a, monkeypatch):
+    _reset_create_limit(monkeypatch, api_key_a, 60)
+    monkeypatch.setenv("CREATE_GLOBAL_LIMIT", "3")
+
+    resp = client_a.post(
+        "/api/v1/links:batch",
+        json={"items": [{"url": "https://example.com"}] * 4},
+    )
+    assert resp.status_code == 400
+
+
+def test_revoked_api_key_is_rejected_immediately(client_a):
+    from sqlalchemy.orm import Session
+    from urlshortenerapi.core.redis import get_redis_client
+    from urlshortenerapi.db.models import ApiKey
+    from urlshortenerapi.services.api_key_cache import revoke_api_key
+
+    raw = "sk_test_revoke_" + secrets.token_urlsafe(24)
+    engine = create_engine(settings.database_url)
+    with Session(engine) as db:
+        row = ApiKey(name="test-revoke", key_hash=hashlib.sha256(raw.encode()).hexdigest())
+        db.add(row)
+        db.commit()
+        key_id = row.id
+
+    headers = {"X-API-Key": raw}
+    # warm the cache
+    assert client_a.get("/api/v1/links", headers=headers).status_code == 200
+
+    with Session(engine) as db:
+        assert revoke_api_key(get_redis_client(), db, key_id) is True
+
+    assert client_a.get("/api/v1/links", headers=headers).status_code == 401
+
+
+def test_profile_window_requires_admin_key(client_a, api_key_a, monkeypatch, tmp_path):
+    from urlshortenerapi.core.profiling import profiler
+
+    assert client_a.post("/api/v1/admin/profile").status_code == 403
+
+    engine = create_engine(settings.database_url)
+    with engine.connect() as conn:
+        key_id = conn.execute(
+            text("SELECT id FROM api_keys WHERE key_hash = :h"),
+            {"h": hashlib.sha256(api_key_a.encode()).hexdigest()},
+        ).scalar_one()
+    monkeypatch.setattr(settings, "admin_api_key_ids", str(key_id))
+    monkeypatch.setattr(profiler, "directory", str(tmp_path))
+
+    resp = client_a.post("/api/v1/admin/profile", json={"seconds": 0.2})
+    assert resp.status_code == 202
+    assert resp.json()["workers"] >= 1
+
+    assert client_a.post("/api/v1/admin/profile", json={"seconds": 0}).status_code == 422
+
+
+def test_expiry_sweeper_marks_expired_and_used_up_links_swept(client_a):
+    from urlshortenerapi.core.redis import get_redis_client
+    from urlshortenerapi.db.session import SessionLocal
+    from urlshortenerapi.services.expiry_sweeper import sweep_expired_links
+
+    expired = client_a.post("/api/v1/links", json={"url": "https://example.com"}).json()["code"]
+    capped = client_a.post(
+        "/api/v1/links", json={"url": "https://example.com", "max_clicks": 1}
+    ).json()["code"]
+    live = client_a.post("/api/v1/links", json={"url": "https://example.com"}).json()["code"]
+
+    _set_link_fields(expired, expires_at="2000-01-01T00:00:00+00:00")
+    assert client_a.get(f"/{capped}", follow_redirects=False).status_code == 307
+    _flush_clicks()
+
+    with SessionLocal() as db:
+        stats = sweep_expired_links(get_redis_client(), db, batch_size=1, max_batches=10)
+    assert (stats.expired, stats.exhausted) == (1, 1)
+
+    # is_active stays the owner's switch
+    links = {item["code"]: item for item in client_a.get("/api/v1/links").json()["items"]}
+    assert all(links[code]["is_active"] for code in (expired, capped, live))
+
+    engine = create_engine(settings.database_url)
+    with engine.connect() as conn:
+        swept = set(
+            conn.execute(text("SELECT code FROM links WHERE swept_at IS NOT NULL")).scalars()
+        )
+    assert swept == {expired, capped}
+
+    # swept links keep explaining why they are gone
+    assert client_a.get(f"/{expired}", follow_redirects=False).json()["error"]["message"] == (
+        "Link is expired"
+    )
+    assert client_a.get(f"/{capped}", follow_redirects=False).status_code == 410
+    assert client_a.get(f"/{live}", follow_redirects=False).status_code == 307
+
+
+def test_disabled_link_reports_403_even_when_expired(client_a):
+    from urlshortenerapi.services.link_cache import local_link_cache
+
+    code = client_a.post("/api/v1/links", json={"url": "https://example.com"}).json()["code"]
+    _set_link_fields(code, is_active=False, expires_at="2000-01-01T00:00:00+00:00")
+
+    # first from Postgres, then from the Redis entry that fill left behind
+    assert client_a.head(f"/{code}", follow_redirects=False).status_code == 403
+    local_link_cache.clear()
+    assert client_a.get(f"/{code}", follow_redirects=False).status_code == 403
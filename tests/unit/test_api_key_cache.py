@@ -0,0 +1,110 @@
+import asyncio
+import uuid
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+
+from urlshortenerapi.services import api_key_cache
+from urlshortenerapi.services.api_key_cache import (
+    API_KEY_CACHE_PREFIX,
+    API_KEY_INVALIDATE_CHANNEL,
+    ApiKeyPrincipal,
+    invalidate_api_key,
+    resolve_api_key,
+    resolve_api_key_async,
+)
+from urlshortenerapi.services.link_cache import LocalLinkCache
+
+
+@pytest.fixture(autouse=True)
+def fresh_local_cache(monkeypatch):
+    cache = LocalLinkCache(max_entries=100, max_bytes=1 << 20, ttl_seconds=30)
+    monkeypatch.setattr(api_key_cache, "local_api_key_cache", cache)
+    return cache
+
+
+def _db_returning(row):
+    db = Mock()
+    db.execute.return_value.first.return_value = row
+    return db
+
+
+def test_principal_roundtrip_allows_separator_in_name():
+    principal = ApiKeyPrincipal(id=uuid.uuid4(), name="team|ops")
+    assert ApiKeyPrincipal.decode(principal.encode()) == principal
+
+
+def test_principal_decode_rejects_garbage():
+    assert ApiKeyPrincipal.decode("not-a-uuid|x") is None
+    assert ApiKeyPrincipal.decode("nothing") is None
+
+
+def test_cold_miss_reads_postgres_and_fills_both_tiers():
+    key_id = uuid.uuid4()
+    r = Mock()
+    r.get.return_value = None
+    db = _db_returning(SimpleNamespace(id=key_id, name="ci"))
+
+    principal = resolve_api_key(r, db, "h1")
+
+    assert principal == ApiKeyPrincipal(id=key_id, name="ci")
+    r.setex.assert_called_once()
+    assert r.setex.call_args.args[0] == f"{API_KEY_CACHE_PREFIX}h1"
+
+    # second lookup is served locally
+    r.reset_mock()
+    db.reset_mock()
+    assert resolve_api_key(r, db, "h1") == principal
+    r.get.assert_not_called()
+    db.execute.assert_not_called()
+
+
+def test_async_cold_miss_reads_postgres_and_fills_both_tiers():
+    key_id = uuid.uuid4()
+    r = AsyncMock()
+    r.get.return_value = None
+    db = AsyncMock()
+    db.execute.return_value = Mock(first=Mock(return_value=SimpleNamespace(id=key_id, name="ci")))
+
+    principal = asyncio.run(resolve_api_key_async(r, db, "h1"))
+
+    assert principal == ApiKeyPrincipal(id=key_id, name="ci")
+    assert r.setex.await_args.args[0] == f"{API_KEY_CACHE_PREFIX}h1"
+
+    r.reset_mock()
+    db.reset_mock()
+    assert asyncio.run(resolve_api_key_async(r, db, "h1")) == principal
+    r.get.assert_not_awaited()
+    db.execute.assert_not_awaited()
+
+
+def test_redis_hit_skips_postgres():
+    principal = ApiKeyPrincipal(id=uuid.uuid4(), name="ci")
+    r = Mock()
+    r.get.return_value = principal.encode()
+    db = Mock()
+
+    assert resolve_api_key(r, db, "h2") == principal
+    db.execute.assert_not_called()
+
+
+def test_unknown_key_is_not_cached():
+    r = Mock()
+    r.get.return_value = None
+    db = _db_returning(None)
+
+    assert resolve_api_key(r, db, "h3") is None
+    r.setex.assert_not_called()
+
+
+def test_invalidate_drops_local_copy_and_notifies_workers(fresh_local_cache):
+    principal = ApiKeyPrincipal(id=uuid.uuid4(), name="ci")
+    fresh_local_cache.set("h4", principal, size=10)
+    r = Mock()
+
+    invalidate_api_key(r, "h4")
+
+    assert fresh_local_cache.get("h4") is None
+    r.delete.assert_called_once_with(f"{API_KEY_CACHE_PREFIX}h4")
+    r.publish.assert_called_once_with(API_KEY_INVALIDATE_CHANNEL, "h4")
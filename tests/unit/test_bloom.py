@@ -0,0 +1,85 @@
+from unittest.mock import Mock
+
+from urlshortenerapi.services.bloom import CODE_FILTERS_KEY, BloomFilter, add_new_codes
+from urlshortenerapi.services.link_cache import _known_missing
+
+
+def test_bloom_sizing_follows_capacity_and_error_rate():
+    bf = BloomFilter.for_capacity("k", capacity=1_000_000, error_rate=0.001)
+    # ~14.4 bits per item and ~10 hash functions for a 0.1% error rate
+    assert 14_000_000 < bf.size_bits < 15_000_000
+    assert bf.num_hashes == 10
+
+
+def test_bloom_positions_are_stable_and_in_range():
+    bf = BloomFilter.for_capacity("k", capacity=1000, error_rate=0.01)
+    positions = bf.positions("abc1234")
+
+    assert positions == bf.positions("abc1234")
+    assert len(positions) == bf.num_hashes
+    assert all(0 <= p < bf.size_bits for p in positions)
+
+
+def test_bloom_has_no_false_negatives_and_few_false_positives():
+    bf = BloomFilter.for_capacity("k", capacity=2000, error_rate=0.01)
+    bits: set[int] = set()
+    for i in range(2000):
+        bits.update(bf.positions(f"code{i}"))
+
+    assert all(all(p in bits for p in bf.positions(f"code{i}")) for i in range(2000))
+
+    false_positives = sum(all(p in bits for p in bf.positions(f"other{i}")) for i in range(10_000))
+    assert false_positives < 300  # 1% target, generous margin
+
+
+def test_bloom_add_sets_every_position():
+    bf = BloomFilter.for_capacity("bloom:test", capacity=1000, error_rate=0.01)
+    r = Mock()
+
+    bf.add(r, ["abc1234"])
+
+    pipe = r.pipeline.return_value
+    assert pipe.setbit.call_count == bf.num_hashes
+    pipe.execute.assert_called_once()
+
+
+def test_bloom_key_carries_its_parameters():
+    small = BloomFilter.for_capacity("bloom:codes", capacity=1000, error_rate=0.01)
+    large = BloomFilter.for_capacity("bloom:codes", capacity=100_000, error_rate=0.01)
+
+    assert small.key == f"bloom:codes:{small.size_bits}:{small.num_hashes}"
+    assert small.key != large.key
+    same = BloomFilter.from_key(small.key)
+    assert same.positions("abc1234") == small.positions("abc1234")
+
+
+def test_new_codes_go_to_every_built_filter_only():
+    old = BloomFilter.for_capacity("bloom:codes", capacity=1000, error_rate=0.01)
+    new = BloomFilter.for_capacity("bloom:codes", capacity=5000, error_rate=0.001)
+    r = Mock()
+    r.smembers.return_value = {old.key, new.key}
+
+    add_new_codes(r, ["abc1234"])
+
+    r.smembers.assert_called_once_with(CODE_FILTERS_KEY)
+    pipe = r.pipeline.return_value
+    set_bits = {(c.args[0], c.args[1]) for c in pipe.setbit.call_args_list}
+    assert set_bits == {(old.key, p) for p in old.positions("abc1234")} | {
+        (new.key, p) for p in new.positions("abc1234")
+    }
+
+    r.reset_mock()
+    r.smembers.return_value = set()
+    add_new_codes(r, ["abc1234"])
+    r.pipeline.assert_not_called()
+
+
+def test_known_missing_rules():
+    # negative cache marker wins
+    assert _known_missing([1, 1, 1, 1]) is True
+    # filter present and one bit unset => definitely missing
+    assert _known_missing([0, 1, 1, 0]) is True
+    # filter present and all bits set => maybe present
+    assert _known_missing([0, 1, 1, 1]) is False
+    # filter not built yet => cannot tell
+    assert _known_missing([0, 0, 0, 0]) is False
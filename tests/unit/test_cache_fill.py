@@ -0,0 +1,196 @@
+import asyncio
+import threading
+import time
+from unittest.mock import Mock
+
+import pytest
+
+from urlshortenerapi.services.cache_fill import (
+    FILL_GIVE_UP,
+    FILL_MISSING,
+    AsyncSingleFlight,
+    FillLock,
+    FillTimer,
+    RecentMisses,
+    SingleFlight,
+    should_refresh_early,
+)
+
+
+def test_single_flight_runs_loader_once_for_concurrent_callers():
+    flight = SingleFlight()
+    calls = 0
+    release = threading.Event()
+
+    def load():
+        nonlocal calls
+        calls += 1
+        release.wait(2)
+        return "value"
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(flight.do("abc", load))) for _ in range(8)
+    ]
+    for t in threads:
+        t.start()
+    while flight.in_flight() == 0:
+        time.sleep(0.001)
+    time.sleep(0.05)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert calls == 1
+    assert results == ["value"] * 8
+    assert flight.in_flight() == 0
+
+
+def test_single_flight_shares_errors_and_forgets_them():
+    flight = SingleFlight()
+
+    def fail():
+        raise RuntimeError("db down")
+
+    with pytest.raises(RuntimeError):
+        flight.do("abc", fail)
+    # the next call loads again
+    assert flight.do("abc", lambda: 1) == 1
+
+
+def test_async_single_flight_coalesces():
+    flight = AsyncSingleFlight()
+    calls = 0
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "value"
+
+    async def main():
+        return await asyncio.gather(*(flight.do("abc", load) for _ in range(10)))
+
+    assert asyncio.run(main()) == ["value"] * 10
+    assert calls == 1
+
+
+def test_async_single_flight_follower_takes_over_cancelled_leader():
+    flight = AsyncSingleFlight()
+    started = asyncio.Event()
+
+    async def slow():
+        started.set()
+        await asyncio.sleep(10)
+
+    async def fast():
+        return "value"
+
+    async def main():
+        leader = asyncio.create_task(flight.do("abc", slow))
+        await started.wait()
+        follower = asyncio.create_task(flight.do("abc", fast))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(main()) == "value"
+
+
+def test_xfetch_never_refreshes_without_ttl_or_when_disabled():
+    assert not should_refresh_early(-1, 5.0, 1.0, rand=lambda: 0.999999)
+    assert not should_refresh_early(100, 5.0, 0.0, rand=lambda: 0.999999)
+
+
+def test_xfetch_refreshes_more_often_near_expiry():
+    draws = [i / 1000 for i in range(1000)]
+
+    def rate(ttl_ms):
+        return sum(should_refresh_early(ttl_ms, 5.0, 1.0, rand=lambda d=d: d) for d in draws)
+
+    assert rate(60_000) == 0
+    assert 0 < rate(20) < rate(5) < rate(1)
+
+
+def test_fill_timer_tracks_moving_average():
+    timer = FillTimer(initial_ms=5.0, alpha=0.5)
+    timer.observe(15.0)
+    assert timer.delta_ms == 10.0
+
+
+def _lock(set_result, checks):
+    r = Mock()
+    r.set.return_value = set_result
+    r.pipeline.return_value.execute.side_effect = checks
+    return FillLock(r, ttl_ms=200), r
+
+
+def test_fill_lock_acquire_is_set_nx_px():
+    lock, r = _lock(True, [])
+    token = lock.acquire("abc")
+    assert token
+    r.set.assert_called_once_with("link_fill:abc", token, nx=True, px=200)
+
+    lock, _ = _lock(None, [])
+    assert lock.acquire("abc") is None
+
+
+def test_wait_for_fill_returns_payload_or_missing():
+    lock, _ = _lock(None, [[None, 0, 1], ["1|||0||https://example.com", 0, 1]])
+    assert lock.wait_for_fill("abc") == "1|||0||https://example.com"
+
+    lock, _ = _lock(None, [[None, 1, 0]])
+    assert lock.wait_for_fill("abc") == FILL_MISSING
+
+
+def test_wait_for_fill_gives_up_when_lock_disappears():
+    lock, _ = _lock(None, [[None, 0, 0]])
+    assert lock.wait_for_fill("abc") is FILL_GIVE_UP
+
+
+def test_recent_misses_marks_codes_that_miss_again_within_the_window():
+    misses = RecentMisses(window=10, max_codes=2)
+
+    assert misses.is_hot("a", now=0) is False
+    assert misses.is_hot("a", now=5) is True
+    assert misses.is_hot("a", now=20) is False
+
+    # "a" is the oldest once "b" and "c" arrive, so it is forgotten
+    misses.is_hot("b", now=21)
+    misses.is_hot("c", now=22)
+    assert misses.is_hot("a", now=23) is False
+
+
+def test_cold_miss_skips_the_fill_lock(monkeypatch):
+    from urlshortenerapi import main
+
+    query = Mock(return_value="link")
+    lock = Mock()
+    monkeypatch.setattr(main, "_query_link", query)
+    monkeypatch.setattr(main, "_fill_lock", lambda: lock)
+    monkeypatch.setattr(main, "recent_misses", RecentMisses())
+
+    assert main._fill_link("cold", None, None) == "link"
+    lock.acquire.assert_not_called()
+
+    lock.acquire.return_value = "token"
+    assert main._fill_link("cold", None, None) == "link"
+    lock.release.assert_called_once_with("cold", "token")
+
+
+def test_early_refresh_runs_off_the_request_once_per_code(monkeypatch):
+    from urlshortenerapi import main
+
+    pool = Mock()
+    monkeypatch.setattr(main, "_refresh_pool", lambda: pool)
+    monkeypatch.setattr(main, "should_refresh_early", lambda *args: True)
+    result = Mock(cache_ttl_ms=100)
+
+    main._refresh_if_expiring("hot", result, None)
+    main._refresh_if_expiring("hot", result, None)
+
+    pool.submit.assert_called_once_with(main._refresh_link, "hot", None)
+    main._refresh_done("hot")
+    main._refresh_if_expiring("hot", result, None)
+    assert pool.submit.call_count == 2
+    main._refresh_done("hot")
@@ -0,0 +1,141 @@
+from types import SimpleNamespace
+from unittest.mock import MagicMock, Mock
+
+from urlshortenerapi.services.cache_warmup import (
+    WARMUP_CODES_KEY,
+    WARMUP_LOCK_KEY,
+    warm_link_cache,
+    warm_link_cache_once,
+)
+from urlshortenerapi.services.link_cache import LINK_CACHE_TTL, CachedLink, LocalLinkCache
+
+
+def _row(i):
+    return SimpleNamespace(
+        code=f"code{i:03d}",
+        long_url=f"https://example.com/{i}",
+        is_active=True,
+        expires_at=None,
+        max_clicks=None,
+        click_count=1000 - i,
+        owner_api_key_id=None,
+    )
+
+
+def _db(partitions):
+    db = Mock()
+    db.execute.return_value.partitions.return_value = iter(partitions)
+    return db
+
+
+def test_warm_up_pipelines_one_batch_per_partition():
+    r = Mock()
+    pipe = r.pipeline.return_value
+    db = _db([[_row(1), _row(2)], [_row(3)]])
+
+    assert warm_link_cache(r, db, limit=3, batch_size=2) == 3
+
+    assert r.pipeline.call_count == 2
+    assert pipe.execute.call_count == 2
+    key, ttl, payload = pipe.setex.call_args_list[0].args
+    assert key == "link_cache:code001"
+    assert LINK_CACHE_TTL <= ttl < 2 * LINK_CACHE_TTL
+    assert CachedLink.decode(payload).long_url == "https://example.com/1"
+
+    stmt = db.execute.call_args.args[0]
+    assert stmt.get_execution_options()["yield_per"] == 2
+
+
+def test_warm_up_fills_local_cache_up_to_its_capacity():
+    local = LocalLinkCache(max_entries=2, max_bytes=1 << 20, ttl_seconds=60)
+
+    warm_link_cache(Mock(), _db([[_row(1), _row(2), _row(3)]]), limit=3, local_cache=local)
+
+    assert local.get("code001") is not None
+    assert local.get("code002") is not None
+    # the hottest links stay; the rest would only have evicted them
+    assert local.get("code003") is None
+
+
+def test_warm_up_disabled_does_not_query():
+    db = Mock()
+    assert warm_link_cache(Mock(), db, limit=0) == 0
+    db.execute.assert_not_called()
+
+
+def _warmup_redis(lock_taken: bool):
+    r = Mock()
+    r.set.return_value = not lock_taken
+    return r
+
+
+def test_startup_warm_up_lock_holder_queries_and_publishes_codes():
+    r = _warmup_redis(lock_taken=False)
+    pipe = r.pipeline.return_value
+    db = _db([[_row(1), _row(2)]])
+    factory = Mock(return_value=MagicMock(__enter__=Mock(return_value=db)))
+
+    assert warm_link_cache_once(r, factory, limit=2) == 2
+
+    assert r.set.call_args.args[0] == WARMUP_LOCK_KEY
+    assert r.set.call_args.kwargs["nx"] is True
+    pipe.rpush.assert_called_once_with(f"{WARMUP_CODES_KEY}:building", "code001", "code002")
+    pipe.rename.assert_called_once_with(f"{WARMUP_CODES_KEY}:building", WARMUP_CODES_KEY)
+
+
+def test_startup_warm_up_without_lock_fills_local_cache_from_redis():
+    r = _warmup_redis(lock_taken=True)
+    r.exists.return_value = 1
+    r.lrange.return_value = ["code001", "code002"]
+    r.mget.return_value = [CachedLink.from_row(_row(1)).encode(), None]
+    factory = Mock()
+    local = LocalLinkCache(max_entries=10, max_bytes=1 << 20, ttl_seconds=60)
+
+    assert warm_link_cache_once(r, factory, limit=100, local_cache=local) == 1
+
+    factory.assert_not_called()
+    r.lrange.assert_called_once_with(WARMUP_CODES_KEY, 0, 9)
+    assert local.get("code001").long_url == "https://example.com/1"
+    assert local.get("code002") is None
+
+
+def test_startup_warm_up_gives_up_when_the_holder_fails():
+    r = _warmup_redis(lock_taken=True)
+    # neither the codes list nor the lock exist any more
+    r.exists.return_value = 0
+    local = LocalLinkCache(max_entries=10, max_bytes=1 << 20, ttl_seconds=60)
+
+    assert warm_link_cache_once(r, Mock(), limit=100, local_cache=local, poll_seconds=0) == 0
+    r.lrange.assert_not_called()
+
+
+def test_startup_warm_up_holder_renews_the_lock_with_every_batch():
+    r = _warmup_redis(lock_taken=False)
+    pipe = r.pipeline.return_value
+    db = _db([[_row(1)], [_row(2)]])
+    factory = Mock(return_value=MagicMock(__enter__=Mock(return_value=db)))
+
+    warm_link_cache_once(r, factory, limit=2, batch_size=1)
+
+    lock_ttl = r.set.call_args.kwargs["ex"]
+    assert [c.args for c in pipe.expire.call_args_list] == [
+        (WARMUP_LOCK_KEY, lock_ttl),
+        (WARMUP_LOCK_KEY, lock_ttl),
+        (WARMUP_CODES_KEY, 300),
+        (WARMUP_LOCK_KEY, 300),
+    ]
+
+
+def test_startup_warm_up_stops_waiting_after_max_wait():
+    r = _warmup_redis(lock_taken=True)
+    # the holder is alive but never finishes
+    r.exists.side_effect = lambda key: int(key == WARMUP_LOCK_KEY)
+    local = LocalLinkCache(max_entries=10, max_bytes=1 << 20, ttl_seconds=60)
+
+    assert (
+        warm_link_cache_once(
+            r, Mock(), limit=100, local_cache=local, poll_seconds=0.001, max_wait=0.01
+        )
+        == 0
+    )
+    r.lrange.assert_not_called()
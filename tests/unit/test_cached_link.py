@@ -0,0 +1,86 @@
+import asyncio
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, Mock, patch
+
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from urlshortenerapi.services.link_cache import (
+    CachedLink,
+    register_new_codes,
+    register_new_codes_async,
+)
+
+
+def test_cached_link_round_trip():
+    link = CachedLink(
+        long_url="https://example.com/a?b=1",
+        is_active=True,
+        expires_ms=1_767_225_600_000,
+        max_clicks=5,
+        click_count=2,
+    )
+    payload = link.encode()
+
+    assert payload == "1|1767225600000|5|2||https://example.com/a?b=1"
+    assert CachedLink.decode(payload) == link
+
+
+def test_cached_link_empty_fields_mean_none():
+    link = CachedLink("https://example.com", False, None, None, 0)
+    assert link.encode() == "0|||0||https://example.com"
+    assert CachedLink.decode(link.encode()) == link
+
+
+def test_cached_link_url_may_contain_separator():
+    link = CachedLink("https://example.com/?q=a|b", True, None, None, 7)
+    assert CachedLink.decode(link.encode()).long_url == "https://example.com/?q=a|b"
+
+
+def test_cached_link_carries_owner_id():
+    owner = "7d3c1f6e-1a2b-4c5d-8e9f-0a1b2c3d4e5f"
+    link = CachedLink("https://example.com", True, None, None, 0, owner)
+    assert link.encode() == f"1|||0|{owner}|https://example.com"
+    assert CachedLink.decode(link.encode()).owner_id == owner
+
+
+def test_cached_link_rejects_old_payloads():
+    assert CachedLink.decode('{"long_url": "https://example.com"}') is None
+    # pre-owner layout: the URL lands in the owner field and fails validation
+    assert CachedLink.decode("1|||0|https://example.com/a|b") is None
+
+
+def test_cached_link_from_row_stores_expiry_as_epoch_ms():
+    row = SimpleNamespace(
+        long_url="https://example.com",
+        is_active=True,
+        expires_at=datetime(2026, 1, 1, tzinfo=timezone.utc),
+        max_clicks=None,
+        click_count=3,
+        owner_api_key_id="7d3c1f6e-1a2b-4c5d-8e9f-0a1b2c3d4e5f",
+    )
+    link = CachedLink.from_row(row)
+
+    assert link.expires_ms == 1_767_225_600_000
+    assert link.click_count == 3
+    assert link.owner_id == "7d3c1f6e-1a2b-4c5d-8e9f-0a1b2c3d4e5f"
+
+
+def test_register_new_codes_logs_redis_errors_after_commit(caplog):
+    r = Mock()
+    r.smembers.return_value = set()
+    r.delete.side_effect = RedisConnectionError("redis down")
+
+    register_new_codes(r, ["abc"])
+
+    assert "Could not register 1 new codes" in caplog.text
+
+
+def test_register_new_codes_async_logs_redis_errors_after_commit(caplog):
+    r = Mock()
+    r.delete = AsyncMock(side_effect=RedisConnectionError("redis down"))
+
+    with patch("urlshortenerapi.services.link_cache.add_new_codes_async", AsyncMock()):
+        asyncio.run(register_new_codes_async(r, ["abc", "def"]))
+
+    assert "Could not register 2 new codes" in caplog.text
@@ -0,0 +1,199 @@
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+import pytest
+
+from urlshortenerapi.services.click_buffer import (
+    PUBLISHED_SETTLE_MS,
+    SETTLE_CHUNK_LUA,
+    SETTLE_DUE_BATCH,
+    SETTLE_DUE_LUA,
+    UNCONFIRMED_SETTLE_MS,
+    flush_click_buckets,
+    flush_click_buffer,
+    settle_overdue_chunks,
+)
+
+
+def _redis(dirty: int, chunks: list[list[str]]):
+    r = Mock()
+    r.hlen.return_value = dirty
+    r.drain = Mock(side_effect=chunks)
+    r.settle = Mock()
+    r.settle_due = Mock(return_value=0)
+    scripts = {SETTLE_CHUNK_LUA: r.settle, SETTLE_DUE_LUA: r.settle_due}
+    r.register_script.side_effect = lambda script: scripts.get(script, r.drain)
+    return r
+
+
+def _chunk_id(r) -> str:
+    return r.drain.call_args.kwargs["args"][1]
+
+
+def test_flush_applies_each_chunk_in_one_statement():
+    r = _redis(
+        3,
+        [
+            ["a", "3", "2026-01-01T00:00:00+00:00", "b", "1", ""],
+            ["c", "2", ""],
+        ],
+    )
+    db = Mock()
+    db.execute.return_value.all.return_value = []
+
+    stats = flush_click_buffer(r, db, chunk_size=2)
+
+    assert stats.links == 3
+    assert stats.clicks == 6
+    assert db.execute.call_count == 2
+    assert db.commit.call_count == 2
+
+    params = db.execute.call_args_list[0].args[1]
+    assert params["codes"] == ["a", "b"]
+    assert params["counts"] == [3, 1]
+    assert params["last_accessed"][0].year == 2026
+    assert params["last_accessed"][1] is None
+
+
+def test_flush_is_bounded_by_dirty_count_at_start():
+    r = _redis(1, [["a", "1", ""]])
+    db = Mock()
+    db.execute.return_value.all.return_value = []
+
+    flush_click_buffer(r, db, chunk_size=100)
+
+    assert r.drain.call_count == 1
+    assert r.drain.call_args.kwargs["args"] == [1, _chunk_id(r), UNCONFIRMED_SETTLE_MS]
+
+
+def test_flush_invalidates_cached_links_with_max_clicks():
+    r = _redis(2, [["a", "1", "", "b", "1", ""]])
+    db = Mock()
+    db.execute.return_value.all.return_value = [
+        SimpleNamespace(code="a", max_clicks=5),
+        SimpleNamespace(code="b", max_clicks=None),
+    ]
+
+    flush_click_buffer(r, db)
+
+    pipe = r.pipeline.return_value
+    pipe.delete.assert_called_once_with("link_cache:a")
+
+
+def test_flush_settles_uncapped_counts_and_defers_capped_ones_past_the_local_ttl():
+    r = _redis(2, [["a", "3", "", "b", "1", ""]])
+    db = Mock()
+    db.execute.return_value.all.return_value = [SimpleNamespace(code="a", max_clicks=5)]
+    calls = Mock()
+    calls.attach_mock(r.pipeline.return_value.execute, "invalidate")
+    calls.attach_mock(r.settle, "settle")
+
+    flush_click_buffer(r, db)
+
+    chunk = f"clicks:inflight:chunk:{_chunk_id(r)}"
+    assert r.drain.call_args.kwargs["keys"] == [
+        "clicks",
+        "last_accessed",
+        "clicks:inflight",
+        chunk,
+        "clicks:inflight:due",
+    ]
+    assert [c[0] for c in calls.mock_calls] == ["invalidate", "settle"]
+    assert r.settle.call_args.kwargs == {
+        "keys": ["clicks:inflight", chunk, "clicks:inflight:due"],
+        "args": [_chunk_id(r), PUBLISHED_SETTLE_MS, "b"],
+    }
+
+
+def test_flush_still_settles_when_invalidation_fails_after_commit():
+    r = _redis(2, [["a", "3", "", "b", "1", ""]])
+    r.pipeline.return_value.execute.side_effect = ConnectionError("redis down")
+    db = Mock()
+    db.execute.return_value.all.return_value = [SimpleNamespace(code="a", max_clicks=5)]
+
+    with pytest.raises(ConnectionError):
+        flush_click_buffer(r, db)
+
+    db.commit.assert_called_once()
+    # "a" keeps the drain-time deadline: its cached copies may still be live
+    assert r.settle.call_args.kwargs["args"] == [_chunk_id(r), "", "b"]
+
+
+def test_flush_settles_overdue_chunks_before_draining():
+    r = _redis(1, [["a", "1", ""]])
+    db = Mock()
+    db.execute.return_value.all.return_value = []
+    calls = Mock()
+    calls.attach_mock(r.settle_due, "settle_due")
+    calls.attach_mock(r.drain, "drain")
+
+    flush_click_buffer(r, db)
+
+    assert [c[0] for c in calls.mock_calls] == ["settle_due", "drain"]
+    assert r.settle_due.call_args.kwargs == {
+        "keys": ["clicks:inflight", "clicks:inflight:due"],
+        "args": ["clicks:inflight:chunk:", SETTLE_DUE_BATCH],
+    }
+
+
+def test_settle_overdue_chunks_loops_until_a_short_batch():
+    r = _redis(0, [])
+    r.settle_due.side_effect = [2, 2, 1]
+
+    assert settle_overdue_chunks(r, batch=2) == 5
+    assert r.settle_due.call_count == 3
+
+
+def test_flush_restores_chunk_when_postgres_write_fails():
+    r = _redis(1, [["a", "4", "2026-01-01T00:00:00+00:00"]])
+    db = Mock()
+    db.execute.side_effect = RuntimeError("db down")
+
+    with pytest.raises(RuntimeError):
+        flush_click_buffer(r, db)
+
+    db.rollback.assert_called_once()
+    pipe = r.pipeline.return_value
+    pipe.hincrby.assert_called_once_with("clicks", "a", 4)
+    pipe.hsetnx.assert_called_once_with("last_accessed", "a", "2026-01-01T00:00:00+00:00")
+    assert r.settle.call_args.kwargs["args"] == [_chunk_id(r), "", "a"]
+
+
+def test_flush_settles_chunk_even_when_restore_fails():
+    r = _redis(1, [["a", "4", ""]])
+    r.pipeline.return_value.execute.side_effect = ConnectionError("redis down")
+    db = Mock()
+    db.execute.side_effect = RuntimeError("db down")
+
+    with pytest.raises(ConnectionError):
+        flush_click_buffer(r, db)
+
+    r.settle.assert_called_once()
+
+
+def test_bucket_flush_upserts_each_chunk_with_parsed_buckets():
+    r = _redis(2, [["a|1767225600", "3", "b|1767229200", "1"]])
+    db = Mock()
+
+    applied = flush_click_buckets(r, db)
+
+    assert applied == 2
+    db.execute.assert_called_once()
+    params = db.execute.call_args.args[1]
+    assert params["codes"] == ["a", "b"]
+    assert params["counts"] == [3, 1]
+    assert params["buckets"][0] == datetime(2026, 1, 1, tzinfo=timezone.utc)
+    assert params["buckets"][1] == datetime(2026, 1, 1, 1, tzinfo=timezone.utc)
+    r.hlen.assert_called_once_with("clicks:hourly")
+
+
+def test_bucket_flush_restores_chunk_when_postgres_write_fails():
+    r = _redis(1, [["a|1767225600", "2"]])
+    db = Mock()
+    db.execute.side_effect = RuntimeError("db down")
+
+    with pytest.raises(RuntimeError):
+        flush_click_buckets(r, db)
+
+    r.pipeline.return_value.hincrby.assert_called_once_with("clicks:hourly", "a|1767225600", 2)
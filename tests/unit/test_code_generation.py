@@ -1,16 +1,131 @@
+import asyncio
 import re
-from urlshortenerapi.api.routes import _base62_code, _BASE62_ALPHABET
+import threading
+from unittest.mock import Mock
+
+import pytest
+
+from urlshortenerapi.core.config import DEV_CODE_PERMUTATION_KEY, settings
+from urlshortenerapi.services.code_allocator import (
+    BASE62_ALPHABET,
+    CODE_ID_BITS,
+    CODE_LENGTH,
+    FeistelPermutation,
+    RedisCounterBlockSource,
+    SequentialCodeAllocator,
+    base62_encode,
+    get_code_allocator,
+    random_code,
+)
 
 _BASE62_RE = re.compile(r"^[0-9a-zA-Z]+$")
 
 
-def test_base62_code_has_only_base62_chars():
-    code = _base62_code(7)
+def test_random_code_has_only_base62_chars():
+    code = random_code(7)
     assert _BASE62_RE.fullmatch(code)
     # also ensure alphabet matches what we expect
-    assert set(code).issubset(set(_BASE62_ALPHABET))
+    assert set(code).issubset(set(BASE62_ALPHABET))
+
+
+def test_random_code_length():
+    assert len(random_code(6)) == 6
+    assert len(random_code(8)) == 8
+
+
+def test_base62_encode_pads_to_width():
+    assert base62_encode(0, 7) == "0000000"
+    assert base62_encode(61, 3) == "00Z"
+    assert base62_encode(62, 3) == "010"
+    assert len(base62_encode((1 << CODE_ID_BITS) - 1, CODE_LENGTH)) == CODE_LENGTH
+
+
+def test_feistel_permutation_is_a_bijection():
+    perm = FeistelPermutation(b"k" * 32, bits=12)
+    outputs = {perm.permute(n) for n in range(1 << 12)}
+    assert outputs == set(range(1 << 12))
+    assert all(perm.invert(perm.permute(n)) == n for n in range(0, 1 << 12, 7))
+
+
+def test_feistel_permutation_depends_on_key():
+    a = FeistelPermutation(b"a" * 32)
+    b = FeistelPermutation(b"b" * 32)
+    assert [a.permute(n) for n in range(1, 20)] != [b.permute(n) for n in range(1, 20)]
+
+
+class _FakeSource:
+    def __init__(self, block_size: int):
+        self.block_size = block_size
+        self.calls = 0
+
+    def next_block(self) -> range:
+        start = self.calls * self.block_size + 1
+        self.calls += 1
+        return range(start, start + self.block_size)
+
+
+def test_sequential_allocator_codes_are_unique_and_fixed_length():
+    allocator = SequentialCodeAllocator(_FakeSource(50), FeistelPermutation(b"k" * 32))
+    codes = [allocator.next_code() for _ in range(500)]
+
+    assert len(set(codes)) == 500
+    assert all(len(c) == CODE_LENGTH and _BASE62_RE.fullmatch(c) for c in codes)
+    # ids are permuted, not encoded as-is
+    assert codes[0] != base62_encode(1, CODE_LENGTH)
+
+
+def test_sequential_allocator_fetches_one_block_per_block_size():
+    source = _FakeSource(100)
+    allocator = SequentialCodeAllocator(source, FeistelPermutation(b"k" * 32))
+
+    allocator.next_code()
+    assert source.calls == 1
+    for _ in range(99):
+        allocator.next_code()
+    # the next block is prefetched, not fetched per code
+    assert source.calls <= 2
+
+
+def test_sequential_allocator_async_fetches_blocks_off_the_event_loop():
+    fetched_on: list[threading.Thread] = []
+
+    class _Source(_FakeSource):
+        def next_block(self) -> range:
+            fetched_on.append(threading.current_thread())
+            return super().next_block()
+
+    allocator = SequentialCodeAllocator(_Source(10), FeistelPermutation(b"k" * 32))
+
+    async def main():
+        return threading.current_thread(), [await allocator.next_code_async() for _ in range(5)]
+
+    loop_thread, codes = asyncio.run(main())
+
+    assert len(set(codes)) == 5
+    # the first block had to be fetched inline: on a worker thread
+    assert fetched_on[0] is not loop_thread
+
+
+def test_redis_counter_block_source_reserves_contiguous_block():
+    r = Mock()
+    r.incrby.return_value = 2000
+    block = RedisCounterBlockSource(r, key="k", block_size=1000).next_block()
+
+    r.incrby.assert_called_once_with("k", 1000)
+    assert block == range(1001, 2001)
+
 
+def test_allocator_refuses_the_default_permutation_key_outside_dev(monkeypatch):
+    monkeypatch.setattr(settings, "app_env", "production")
+    monkeypatch.setattr(settings, "code_allocator", "sequence")
+    monkeypatch.setattr(settings, "code_permutation_key", DEV_CODE_PERMUTATION_KEY)
+    get_code_allocator.cache_clear()
+    try:
+        with pytest.raises(ValueError, match="CODE_PERMUTATION_KEY"):
+            get_code_allocator()
 
-def test_base62_code_length():
-    assert len(_base62_code(6)) == 6
-    assert len(_base62_code(8)) == 8
+        monkeypatch.setattr(settings, "code_permutation_key", "s3cret")
+        get_code_allocator.cache_clear()
+        assert isinstance(get_code_allocator(), SequentialCodeAllocator)
+    finally:
+        get_code_allocator.cache_clear()
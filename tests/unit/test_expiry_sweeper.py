@@ -0,0 +1,75 @@
+from datetime import datetime, timezone
+from unittest.mock import Mock
+
+import pytest
+
+from urlshortenerapi.services.expiry_sweeper import (
+    SWEEP_EXHAUSTED_SQL,
+    SWEEP_EXPIRED_SQL,
+    sweep_expired_links,
+)
+
+NOW = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def _db(batches: dict) -> Mock:
+    """A session whose sweep statements return the given batches of codes in turn."""
+    remaining = {statement: list(codes) for statement, codes in batches.items()}
+
+    def execute(statement, params):
+        result = Mock()
+        queue = remaining[statement]
+        result.scalars.return_value.all.return_value = queue.pop(0) if queue else []
+        return result
+
+    db = Mock()
+    db.execute.side_effect = execute
+    return db
+
+
+def test_sweep_runs_batches_until_one_comes_back_short():
+    db = _db({SWEEP_EXPIRED_SQL: [["a", "b"], ["c"]], SWEEP_EXHAUSTED_SQL: [["d"]]})
+    r = Mock()
+
+    stats = sweep_expired_links(r, db, batch_size=2, max_batches=10, now=NOW)
+
+    assert (stats.expired, stats.exhausted) == (3, 1)
+    # two expired batches, one exhausted batch, each in its own transaction
+    assert db.execute.call_count == 3
+    assert db.commit.call_count == 3
+    assert db.execute.call_args_list[0].args[1] == {"now": NOW, "limit": 2}
+    assert db.execute.call_args_list[2].args[1] == {"now": NOW, "limit": 2}
+
+
+def test_sweep_is_bounded_by_max_batches():
+    db = _db({SWEEP_EXPIRED_SQL: [["a"], ["b"], ["c"]], SWEEP_EXHAUSTED_SQL: []})
+
+    stats = sweep_expired_links(Mock(), db, batch_size=1, max_batches=2, now=NOW)
+
+    assert stats.expired == 2
+
+
+def test_sweep_purges_swept_links_in_one_pipeline_per_batch():
+    db = _db({SWEEP_EXPIRED_SQL: [["a", "b"]], SWEEP_EXHAUSTED_SQL: []})
+    r = Mock()
+    pipe = r.pipeline.return_value
+
+    sweep_expired_links(r, db, batch_size=10, max_batches=10, now=NOW)
+
+    deleted = [c.args[0] for c in pipe.delete.call_args_list]
+    assert deleted == ["link_cache:a", "link_cache:b"]
+    pipe.execute.assert_called_once()
+    # buffered clicks are left for the click flush
+    r.hdel.assert_not_called()
+
+
+def test_sweep_rolls_back_a_failed_batch():
+    db = Mock()
+    db.execute.side_effect = RuntimeError("db down")
+    r = Mock()
+
+    with pytest.raises(RuntimeError):
+        sweep_expired_links(r, db, batch_size=10, max_batches=10, now=NOW)
+
+    db.rollback.assert_called_once()
+    r.pipeline.assert_not_called()
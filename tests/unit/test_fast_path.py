@@ -0,0 +1,56 @@
+import asyncio
+
+from urlshortenerapi.main import RedirectFastPath, app
+from urlshortenerapi.services.link_cache import CachedLink, local_link_cache
+
+
+async def _passthrough(scope, receive, send):
+    await send({"type": "http.response.start", "status": 299, "headers": []})
+    await send({"type": "http.response.body", "body": b"inner"})
+
+
+def _call(method: str, path: str) -> list[dict]:
+    fast = RedirectFastPath(_passthrough, router=app.router)
+    sent: list[dict] = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": method, "path": path, "client": ("1.2.3.4", 1)}
+    asyncio.run(fast(scope, receive, send))
+    return sent
+
+
+def test_fast_path_head_serves_local_cache_hit():
+    local_link_cache.set("fastabc", CachedLink("https://example.com/a b", True, None, None, 0), 10)
+
+    start, body = _call("HEAD", "/fastabc")
+
+    assert start["status"] == 307
+    assert (b"location", b"https://example.com/a%20b") in start["headers"]
+    assert body["body"] == b""
+
+
+def test_fast_path_error_body_matches_exception_handler():
+    local_link_cache.set("fastoff", CachedLink("https://example.com", False, None, None, 0), 10)
+
+    # GET on a disabled local-cache hit is rejected before any Redis call
+    start, body = _call("GET", "/fastoff")
+
+    assert start["status"] == 403
+    assert (b"content-type", b"application/json") in start["headers"]
+    assert body["body"] == b'{"error":{"code":"FORBIDDEN","message":"Link is disabled"}}'
+
+    start, body = _call("HEAD", "/fastoff")
+    assert start["status"] == 403
+    assert body["body"] == b""
+
+
+def test_fast_path_leaves_other_routes_alone():
+    for method, path in [("GET", "/health"), ("GET", "/api/v1/links"), ("POST", "/abc")]:
+        start, body = _call(method, path)
+        assert start["status"] == 299
+        assert body["body"] == b"inner"
@@ -0,0 +1,66 @@
+import asyncio
+import threading
+from unittest.mock import Mock
+
+import pytest
+
+from urlshortenerapi.main import _run_cycle
+from urlshortenerapi.services.leases import RedisLease
+
+
+def _lease(acquire_result: int):
+    r = Mock()
+    acquire = Mock(return_value=acquire_result)
+    release = Mock(return_value=1)
+    r.register_script.side_effect = [acquire, release]
+    return RedisLease(r, "lease:test", ttl_ms=15000, holder_id="host:1"), acquire, release
+
+
+def test_lease_acquire_passes_holder_and_ttl():
+    lease, acquire, _ = _lease(1)
+
+    assert lease.acquire() is True
+    assert lease.is_held is True
+    acquire.assert_called_once_with(keys=["lease:test"], args=["host:1", 15000])
+
+
+def test_lease_not_acquired_when_held_elsewhere():
+    lease, _, release = _lease(0)
+
+    assert lease.acquire() is False
+    lease.release()
+    release.assert_not_called()
+
+
+def test_lease_release_only_when_held():
+    lease, _, release = _lease(1)
+    lease.acquire()
+    lease.release()
+
+    release.assert_called_once_with(keys=["lease:test"], args=["host:1"])
+    assert lease.is_held is False
+
+
+def test_cancelled_cycle_waits_for_its_thread_before_ending():
+    started = threading.Event()
+    proceed = threading.Event()
+    finished = []
+
+    def cycle():
+        started.set()
+        proceed.wait(5)
+        finished.append(True)
+
+    async def scenario():
+        task = asyncio.create_task(_run_cycle(cycle))
+        await asyncio.to_thread(started.wait, 5)
+        task.cancel()
+        await asyncio.sleep(0.05)
+        assert not task.done()
+
+        proceed.set()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert finished == [True]
+
+    asyncio.run(scenario())
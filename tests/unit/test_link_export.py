@@ -0,0 +1,79 @@
+import csv
+import gzip
+import io
+import json
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+import pytest
+
+from urlshortenerapi.services.link_export import EXPORT_COLUMNS, gzip_chunks, iter_export
+
+CREATED = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def _row(i, **fields):
+    values = dict(
+        code=f"code{i:03d}",
+        long_url=f"https://example.com/{i}?a=1,b=2",
+        created_at=CREATED,
+        expires_at=None,
+        is_active=True,
+        click_count=i,
+        last_accessed_at=None,
+        max_clicks=None,
+    )
+    values.update(fields)
+    return SimpleNamespace(**values)
+
+
+def _session_factory(partitions):
+    db = Mock()
+    db.execute.return_value.partitions.return_value = iter(partitions)
+
+    @contextmanager
+    def factory():
+        yield db
+
+    return factory, db
+
+
+def test_ndjson_export_writes_one_chunk_per_partition():
+    factory, db = _session_factory([[_row(1), _row(2)], [_row(3, max_clicks=5)]])
+
+    chunks = list(iter_export(factory, uuid.uuid4(), "ndjson"))
+
+    assert len(chunks) == 2
+    lines = b"".join(chunks).decode().splitlines()
+    assert [json.loads(line)["code"] for line in lines] == ["code001", "code002", "code003"]
+    assert json.loads(lines[0])["created_at"] == "2026-01-01T00:00:00+00:00"
+    assert json.loads(lines[2])["max_clicks"] == 5
+
+    stmt = db.execute.call_args.args[0]
+    assert stmt.get_execution_options()["yield_per"] == 1000
+
+
+def test_csv_export_has_header_and_quotes_fields():
+    factory, _ = _session_factory([[_row(1, is_active=False)]])
+
+    body = b"".join(iter_export(factory, uuid.uuid4(), "csv")).decode()
+
+    rows = list(csv.reader(io.StringIO(body)))
+    assert tuple(rows[0]) == EXPORT_COLUMNS
+    assert rows[1][:2] == ["code001", "https://example.com/1?a=1,b=2"]
+    assert rows[1][4] == "false"
+    assert rows[1][7] == ""
+
+
+def test_export_rejects_unknown_format():
+    factory, _ = _session_factory([])
+    with pytest.raises(ValueError):
+        list(iter_export(factory, uuid.uuid4(), "xml"))
+
+
+def test_gzip_chunks_produces_one_valid_member():
+    chunks = [b"a" * 10_000, b"b\n", b""]
+    assert gzip.decompress(b"".join(gzip_chunks(iter(chunks)))) == b"".join(chunks)
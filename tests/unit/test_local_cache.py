@@ -0,0 +1,84 @@
+from urlshortenerapi.services.link_cache import LocalLinkCache
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _cache(clock=None, max_entries=3, max_bytes=10_000, ttl=10.0) -> LocalLinkCache:
+    return LocalLinkCache(
+        max_entries=max_entries,
+        max_bytes=max_bytes,
+        ttl_seconds=ttl,
+        clock=clock or FakeClock(),
+    )
+
+
+def test_local_cache_hit_and_miss_counters():
+    c = _cache()
+    assert c.get("a") is None
+    c.set("a", {"long_url": "https://example.com"}, 10)
+    assert c.get("a") == {"long_url": "https://example.com"}
+
+    stats = c.stats()
+    assert stats.hits == 1
+    assert stats.misses == 1
+    assert stats.entries == 1
+
+
+def test_local_cache_entries_expire_after_ttl():
+    clock = FakeClock()
+    c = _cache(clock=clock, ttl=5.0)
+    c.set("a", 1, 10)
+
+    clock.now = 4.9
+    assert c.get("a") == 1
+
+    clock.now = 5.0
+    assert c.get("a") is None
+    assert c.stats().entries == 0
+
+
+def test_local_cache_evicts_least_recently_used():
+    c = _cache(max_entries=2)
+    c.set("a", 1, 10)
+    c.set("b", 2, 10)
+    c.get("a")  # "b" is now the LRU entry
+    c.set("c", 3, 10)
+
+    assert c.get("b") is None
+    assert c.get("a") == 1
+    assert c.get("c") == 3
+    assert c.stats().evictions == 1
+
+
+def test_local_cache_respects_byte_cap():
+    c = _cache(max_entries=100, max_bytes=1000)
+    c.set("a", 1, 400)
+    c.set("b", 2, 400)
+
+    stats = c.stats()
+    assert stats.entries == 1
+    assert stats.bytes <= 1000
+    assert c.get("b") == 2
+
+
+def test_local_cache_skips_values_larger_than_cap():
+    c = _cache(max_bytes=500)
+    c.set("a", 1, 10_000)
+    assert c.get("a") is None
+
+
+def test_local_cache_invalidate_and_disabled():
+    c = _cache()
+    c.set("a", 1, 10)
+    c.invalidate("a")
+    assert c.get("a") is None
+
+    disabled = _cache(max_entries=0)
+    disabled.set("a", 1, 10)
+    assert disabled.get("a") is None
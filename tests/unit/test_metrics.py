@@ -0,0 +1,258 @@
+import json
+import os
+import time
+from unittest.mock import Mock
+
+import pytest
+from redis.exceptions import WatchError
+
+from urlshortenerapi.core import metrics
+from urlshortenerapi.core.metrics import METRICS_RETENTION_SECONDS, Registry
+
+
+def _registry():
+    reg = Registry()
+    hits = reg.counter("hits_total", "Hits", ("result",))
+    latency = reg.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    backlog = reg.gauge("backlog", "Backlog")
+    return reg, hits, latency, backlog
+
+
+def test_render_counter_and_cumulative_histogram():
+    reg, hits, latency, _ = _registry()
+    hits.labels("hit").inc()
+    hits.labels("hit").inc(2)
+    latency.observe(0.05)
+    latency.observe(0.5)
+    latency.observe(5)
+
+    text = reg.render([reg.snapshot()])
+
+    assert "# TYPE hits_total counter" in text
+    assert 'hits_total{result="hit"} 3' in text
+    assert 'latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{le="1"} 2' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 3' in text
+    assert "latency_seconds_sum 5.55" in text
+    assert "latency_seconds_count 3" in text
+
+
+def test_render_merges_worker_snapshots():
+    reg, hits, latency, backlog = _registry()
+    hits.labels("hit").inc()
+    latency.observe(0.05)
+    backlog.set(7)
+    other = json.loads(json.dumps(reg.snapshot()))
+    other["backlog"][""] = [3, time.time() - 60]
+
+    text = reg.render([reg.snapshot(), other])
+
+    assert 'hits_total{result="hit"} 2' in text
+    assert 'latency_seconds_bucket{le="0.1"} 2' in text
+    # gauges take the most recent value, not the sum
+    assert "backlog 7" in text
+
+
+def test_summed_gauges_add_up_live_workers_only():
+    reg = Registry()
+    connections = reg.gauge("connections", "Open", ("state",), aggregate="sum")
+    connections.labels("in_use").set(2)
+    live = json.loads(json.dumps(reg.snapshot()))
+    live["_published_at"] = time.time()
+    gone = dict(live, _published_at=time.time() - 10 * metrics.LIVE_SNAPSHOT_SECONDS)
+
+    text = reg.render([reg.snapshot(), live, gone])
+
+    assert 'connections{state="in_use"} 4' in text
+
+
+def test_collectors_run_before_each_snapshot_and_failures_are_logged(caplog):
+    reg = Registry()
+    depth = reg.gauge("depth", "Depth")
+    reg.add_collector(Mock(side_effect=RuntimeError("boom")))
+    reg.add_collector(lambda: depth.set(5))
+
+    snap = reg.snapshot()
+
+    assert snap["depth"][""][0] == 5
+    assert "Metrics collector failed" in caplog.text
+
+
+def test_unknown_gauge_aggregate_is_rejected():
+    with pytest.raises(ValueError):
+        Registry().gauge("depth", "Depth", aggregate="max")
+
+
+def test_render_ignores_unknown_families_and_bookkeeping():
+    reg, *_ = _registry()
+
+    text = reg.render([{"_published_at": 1.0, "gone_total": {"": 5}}])
+
+    assert "gone_total" not in text
+
+
+def test_label_values_are_escaped():
+    reg, hits, *_ = _registry()
+    hits.labels('a"b\\c\nd').inc()
+
+    assert 'hits_total{result="a\\"b\\\\c\\nd"} 1' in reg.render([reg.snapshot()])
+
+
+def test_labels_checks_arity_and_reuses_children():
+    _, hits, *_ = _registry()
+
+    assert hits.labels("hit") is hits.labels("hit")
+    with pytest.raises(ValueError):
+        hits.labels("hit", "extra")
+
+
+def test_duplicate_family_is_rejected():
+    reg, *_ = _registry()
+
+    with pytest.raises(ValueError):
+        reg.counter("hits_total", "Again")
+
+
+def test_record_request_counts_by_route_and_status():
+    metrics.record_request("/test/{code}", "GET", 404, 0.002)
+    metrics.record_request("/test/{code}", "GET", 404, 0.003)
+
+    assert metrics.HTTP_REQUESTS.labels("/test/{code}", "GET", "404").value == 2
+    child = metrics.HTTP_REQUEST_DURATION.labels("/test/{code}", "GET")
+    assert sum(child.counts) == 2
+    assert child.sum == pytest.approx(0.005)
+
+
+class _HashRedis:
+    """Just enough of a Redis client for the metrics hash and its WATCH transaction."""
+
+    def __init__(self, fields: dict[str, str]) -> None:
+        self.fields = dict(fields)
+
+    def hgetall(self, key):
+        return dict(self.fields)
+
+    def pipeline(self, transaction=True):
+        return _HashPipeline(self)
+
+
+class _HashPipeline:
+    def __init__(self, r: _HashRedis) -> None:
+        self.r = r
+        self.queued = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def watch(self, key):
+        pass
+
+    def hmget(self, key, fields):
+        return [self.r.fields.get(f) for f in fields]
+
+    def multi(self):
+        pass
+
+    def hset(self, key, field, value):
+        self.queued.append(lambda: self.r.fields.__setitem__(field, value))
+
+    def hdel(self, key, *fields):
+        self.queued.append(lambda: [self.r.fields.pop(f, None) for f in fields])
+
+    def execute(self):
+        for op in self.queued:
+            op()
+
+
+def _published(rows: float, age: float = 0) -> str:
+    return json.dumps(
+        {
+            "_published_at": time.time() - age,
+            "click_flush_rows_total": {"links": rows},
+            "click_flush_backlog_links": {"": [9, time.time() - age]},
+        }
+    )
+
+
+def _host_rows(r) -> float:
+    text = metrics.render_metrics(r)
+    line = next(
+        x for x in text.splitlines() if x.startswith('click_flush_rows_total{table="links"}')
+    )
+    return float(line.rsplit(" ", 1)[1]) - metrics.CLICK_FLUSH_ROWS.labels("links").value
+
+
+def test_render_metrics_merges_other_workers_and_drops_this_ones_published_copy():
+    r = _HashRedis({"other": _published(4), metrics._WORKER: _published(100)})
+
+    assert _host_rows(r) == 4
+
+
+def test_crashed_worker_keeps_counting_after_a_restart():
+    # worker 7 crashed after publishing 10; its replacement reuses pid 7
+    r = _HashRedis({"7-aaaaaaaa": _published(10, age=3600), "7-bbbbbbbb": _published(3)})
+
+    assert _host_rows(r) == 13
+
+
+def test_worker_ids_differ_even_when_the_pid_is_reused():
+    assert metrics._new_worker_id() != metrics._new_worker_id()
+    assert metrics._WORKER.startswith(f"{os.getpid()}-")
+
+
+def test_workers_past_retention_are_folded_into_the_retired_totals():
+    stale = METRICS_RETENTION_SECONDS + 1
+    r = _HashRedis({"dead1": _published(10, age=stale), "live": _published(3)})
+
+    assert _host_rows(r) == 13
+    assert set(r.fields) == {"live", metrics.RETIRED_FIELD}
+    retired = json.loads(r.fields[metrics.RETIRED_FIELD])
+    # counters carry over, the dead worker's gauges do not
+    assert retired == {"click_flush_rows_total": {"links": 10}}
+
+    r.fields["dead2"] = _published(5, age=stale)
+    assert _host_rows(r) == 18
+    assert _host_rows(r) == 18
+    assert json.loads(r.fields[metrics.RETIRED_FIELD])["click_flush_rows_total"] == {"links": 15}
+
+
+def test_retiring_skips_snapshots_another_worker_already_folded():
+    r = _HashRedis({metrics.RETIRED_FIELD: json.dumps({"click_flush_rows_total": {"links": 10}})})
+
+    metrics.retire_workers(r, ["dead1"])
+
+    assert json.loads(r.fields[metrics.RETIRED_FIELD]) == {"click_flush_rows_total": {"links": 10}}
+
+
+def test_retiring_gives_up_on_a_concurrent_change():
+    r = _HashRedis({"dead1": _published(10, age=METRICS_RETENTION_SECONDS + 1)})
+    pipe = _HashPipeline(r)
+    pipe.execute = Mock(side_effect=WatchError())
+    r.pipeline = lambda transaction=True: pipe
+
+    metrics.retire_workers(r, ["dead1"])
+
+    assert set(r.fields) == {"dead1"}
+
+
+def test_render_metrics_falls_back_to_this_worker_without_redis():
+    r = Mock()
+    r.hgetall.side_effect = ConnectionError("down")
+
+    assert "# TYPE http_requests_total counter" in metrics.render_metrics(r)
+
+
+def test_publish_snapshot_writes_this_workers_field():
+    r = Mock()
+    pipe = r.pipeline.return_value
+
+    metrics.publish_snapshot(r)
+
+    key, worker, raw = pipe.hset.call_args.args
+    assert key == metrics.metrics_key()
+    assert worker == metrics._WORKER
+    assert "_published_at" in json.loads(raw)
+    pipe.expire.assert_called_once_with(key, METRICS_RETENTION_SECONDS)
@@ -0,0 +1,39 @@
+import uuid
+from datetime import datetime, timezone
+from unittest.mock import Mock
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.dialects import postgresql
+
+from urlshortenerapi.api.link_service import decode_cursor, encode_cursor
+from urlshortenerapi.api.routes import list_links
+from urlshortenerapi.services.api_key_cache import ApiKeyPrincipal
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2026, 1, 1, 12, 30, 0, 123456, tzinfo=timezone.utc)
+    link_id = uuid.uuid4()
+    assert decode_cursor(encode_cursor(created_at, link_id)) == (created_at, link_id)
+
+
+def test_cursor_with_bad_id_is_rejected():
+    bad = encode_cursor(datetime(2026, 1, 1, tzinfo=timezone.utc), "not-a-uuid")
+    with pytest.raises(HTTPException) as exc:
+        decode_cursor(bad)
+    assert exc.value.status_code == 400
+
+
+def test_list_links_cursor_is_a_row_value_comparison():
+    db = Mock()
+    db.scalars.return_value.all.return_value = []
+    cursor = encode_cursor(datetime(2026, 1, 1, tzinfo=timezone.utc), uuid.uuid4())
+
+    list_links(limit=10, cursor=cursor, db=db, api_key=ApiKeyPrincipal(uuid.uuid4(), "t"))
+
+    (stmt,) = db.scalars.call_args.args
+    sql = str(stmt.compile(dialect=postgresql.psycopg.dialect()))
+    where = sql.split("WHERE ", 1)[1]
+    assert " AND (links.created_at, links.id) < (" in where
+    assert "TIMESTAMP WITH TIME ZONE" in where
+    assert " OR " not in where
@@ -0,0 +1,122 @@
+import asyncio
+
+import pytest
+import redis
+import redis.asyncio
+from sqlalchemy import create_engine, exc, text
+from sqlalchemy.pool import QueuePool
+
+from urlshortenerapi.core import metrics
+from urlshortenerapi.core.redis import (
+    AsyncTimedBlockingConnectionPool,
+    TimedBlockingConnectionPool,
+    TimedConnectionPool,
+    pool_usage,
+)
+from urlshortenerapi.db.session import _time_statements, _timed_pool
+
+
+class _FakeConnection(redis.Connection):
+    """A redis-py connection that never opens a socket."""
+
+    def connect(self) -> None:
+        pass
+
+    def can_read(self, timeout: float = 0) -> bool:
+        return False
+
+
+def _checkouts(family, label: str) -> int:
+    return sum(family.labels(label).counts)
+
+
+def test_db_pool_times_checkouts_and_counts_timeouts():
+    pool = _timed_pool(QueuePool, "test")(
+        lambda: object(), pool_size=1, max_overflow=0, timeout=0.01
+    )
+    before = _checkouts(metrics.DB_POOL_CHECKOUT_DURATION, "test")
+
+    held = pool.connect()
+    with pytest.raises(exc.TimeoutError):
+        pool.connect()
+    held.close()
+
+    assert type(pool).__name__ == "TimedQueuePool"
+    assert _checkouts(metrics.DB_POOL_CHECKOUT_DURATION, "test") == before + 2
+    assert metrics.DB_POOL_TIMEOUTS.labels("test").value == 1
+    assert (pool.checkedout(), pool.checkedin()) == (0, 1)
+
+
+def test_engine_checkouts_go_through_the_timed_pool():
+    engine = create_engine("sqlite://", poolclass=_timed_pool(QueuePool, "engine-test"))
+    before = _checkouts(metrics.DB_POOL_CHECKOUT_DURATION, "engine-test")
+
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+    with engine.begin() as connection:
+        connection.execute(text("SELECT 1"))
+
+    assert _checkouts(metrics.DB_POOL_CHECKOUT_DURATION, "engine-test") == before + 2
+
+
+def test_failed_statements_leave_no_timing_state_on_the_connection():
+    engine = create_engine("sqlite://")
+    _time_statements(engine)
+    before = _checkouts(metrics.POSTGRES_QUERY_DURATION, "SELECT")
+
+    with engine.connect() as connection:
+        for _ in range(3):
+            with pytest.raises(exc.OperationalError):
+                connection.execute(text("SELECT * FROM missing_table"))
+        connection.execute(text("SELECT 1"))
+        assert "query_started" not in connection.info
+
+    # only the statement that ran is timed
+    assert _checkouts(metrics.POSTGRES_QUERY_DURATION, "SELECT") == before + 1
+
+
+def test_redis_pool_reports_usage():
+    pool = TimedConnectionPool(connection_class=_FakeConnection)
+    before = _checkouts(metrics.REDIS_POOL_CHECKOUT_DURATION, "sync")
+
+    first = pool.get_connection()
+    second = pool.get_connection()
+    pool.release(first)
+
+    assert pool_usage(pool) == (1, 1)
+    assert _checkouts(metrics.REDIS_POOL_CHECKOUT_DURATION, "sync") == before + 2
+    pool.release(second)
+
+
+def test_blocking_redis_pool_counts_exhaustion():
+    pool = TimedBlockingConnectionPool(
+        connection_class=_FakeConnection, max_connections=1, timeout=0.01
+    )
+    timeouts = metrics.REDIS_POOL_TIMEOUTS.labels("sync").value
+
+    held = pool.get_connection()
+    assert pool_usage(pool) == (1, 0)
+    with pytest.raises(redis.ConnectionError):
+        pool.get_connection()
+    pool.release(held)
+
+    assert pool_usage(pool) == (0, 1)
+    assert metrics.REDIS_POOL_TIMEOUTS.labels("sync").value == timeouts + 1
+
+
+def test_async_blocking_redis_pool_counts_exhaustion():
+    pool = AsyncTimedBlockingConnectionPool(max_connections=1, timeout=0.01)
+    timeouts = metrics.REDIS_POOL_TIMEOUTS.labels("async").value
+
+    held = redis.asyncio.Connection()
+
+    async def exhaust():
+        # Pretend the only connection is checked out
+        pool._in_use_connections.add(held)
+        with pytest.raises(redis.ConnectionError):
+            await pool.get_connection()
+
+    asyncio.run(exhaust())
+
+    assert pool_usage(pool) == (1, 0)
+    assert metrics.REDIS_POOL_TIMEOUTS.labels("async").value == timeouts + 1
@@ -0,0 +1,132 @@
+from unittest.mock import Mock
+
+import pytest
+
+from urlshortenerapi.services.prelimiter import (
+    PRELIMIT_DENY,
+    PRELIMIT_LOCAL,
+    PRELIMIT_REDIS,
+    SYNC_LUA,
+    LocalPreLimiter,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _limiter(clock, limit=10, burst=3):
+    return LocalPreLimiter("rl:redirect:", limit=limit, window_seconds=60, burst=burst, clock=clock)
+
+
+def _redis_returning(raw):
+    r = Mock()
+    script = Mock(return_value=raw)
+    r.register_script.return_value = script
+    return r, script
+
+
+def test_admits_locally_up_to_burst_then_defers_to_redis():
+    lim = _limiter(FakeClock(), burst=3)
+
+    decisions = [lim.admit("1.2.3.4").decision for _ in range(5)]
+
+    assert decisions == [PRELIMIT_LOCAL] * 3 + [PRELIMIT_REDIS] * 2
+    assert lim.local_admits == 3
+    assert lim.redis_checks == 2
+
+
+def test_sync_sends_deltas_in_one_call_and_resets_burst():
+    clock = FakeClock()
+    lim = _limiter(clock, burst=2)
+    lim.admit("a")
+    lim.admit("a")
+    lim.admit("b")
+    r, script = _redis_returning([2, 59_000, 1, 59_000])
+
+    assert lim.sync(r) == 2
+
+    r.register_script.assert_called_once_with(SYNC_LUA)
+    assert script.call_args.kwargs == {
+        "keys": ["rl:redirect:a", "rl:redirect:b"],
+        "args": [60_000, 2, 1],
+    }
+    # burst budget is per sync interval
+    assert lim.admit("a").decision == PRELIMIT_LOCAL
+
+
+def test_client_near_quota_goes_to_redis():
+    clock = FakeClock()
+    lim = _limiter(clock, limit=5, burst=10)
+    lim.admit("a")
+    r, _ = _redis_returning([4, 30_000])
+    lim.sync(r)
+
+    assert lim.admit("a").decision == PRELIMIT_LOCAL  # 4 + 1 pending = limit
+    assert lim.admit("a").decision == PRELIMIT_REDIS
+
+
+def test_client_over_quota_is_denied_locally_until_window_ends():
+    clock = FakeClock()
+    lim = _limiter(clock, limit=5, burst=10)
+    for _ in range(6):
+        lim.admit("a")
+    r, script = _redis_returning([7, 30_000])
+    lim.sync(r)
+
+    verdict = lim.admit("a")
+    assert verdict.decision == PRELIMIT_DENY
+    assert verdict.retry_after == 30
+
+    clock.now += 31
+    assert lim.admit("a").decision == PRELIMIT_LOCAL
+
+
+def test_redis_routed_clients_are_refreshed_with_zero_delta():
+    # burst=0: every hit is checked (and counted) by the redirect script
+    lim = _limiter(FakeClock(), limit=5, burst=0)
+    assert lim.admit("a").decision == PRELIMIT_REDIS
+    r, script = _redis_returning([6, 49_000])
+
+    lim.sync(r)
+
+    assert script.call_args.kwargs["args"] == [60_000, 0]
+    assert lim.admit("a").decision == PRELIMIT_DENY
+
+
+def test_failed_sync_keeps_deltas():
+    lim = _limiter(FakeClock())
+    lim.admit("a")
+    lim.admit("a")
+    r, script = _redis_returning(None)
+    script.side_effect = ConnectionError("down")
+
+    with pytest.raises(ConnectionError):
+        lim.sync(r)
+
+    script.side_effect = None
+    script.return_value = [2, 60_000]
+    lim.sync(r)
+    assert script.call_args.kwargs["args"] == [60_000, 2]
+
+
+def test_idle_clients_are_forgotten():
+    clock = FakeClock()
+    lim = _limiter(clock)
+    lim.admit("a")
+    r, _ = _redis_returning([1, 1_000])
+    lim.sync(r)
+
+    clock.now += 2
+    assert lim.sync(r) == 0
+    assert lim._clients == {}
+
+
+def test_max_clients_falls_back_to_redis():
+    lim = LocalPreLimiter("p:", limit=10, window_seconds=60, burst=5, max_clients=1)
+    assert lim.admit("a").decision == PRELIMIT_LOCAL
+    assert lim.admit("b").decision == PRELIMIT_REDIS
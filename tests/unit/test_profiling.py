@@ -0,0 +1,139 @@
+import asyncio
+import json
+import threading
+import time
+from unittest.mock import Mock
+
+import pytest
+
+from urlshortenerapi.core import profiling
+from urlshortenerapi.core.profiling import (
+    PROFILE_CHANNEL,
+    Profile,
+    Profiler,
+    ProfilingMiddleware,
+    StackSampler,
+    render_collapsed,
+    render_speedscope,
+    write_profile,
+)
+
+_STACK = (("MainThread", "", 0), ("handler", "app.py", 10), ("query", "db.py", 3))
+
+
+def _profile(samples=None):
+    samples = {_STACK: 3} if samples is None else samples
+    return Profile(samples, interval=0.01, started_at=0.0, ended_at=1.0)
+
+
+def test_collapsed_output_is_one_folded_line_per_stack():
+    assert render_collapsed(_profile()) == "MainThread;handler (app.py:10);query (db.py:3) 3\n"
+
+
+def test_speedscope_output_shares_frames_and_weights_by_interval():
+    other = (("MainThread", "", 0), ("handler", "app.py", 10))
+    doc = json.loads(render_speedscope(_profile({_STACK: 3, other: 1}), "test"))
+
+    frames = doc["shared"]["frames"]
+    assert frames[0] == {"name": "MainThread"}
+    assert frames[1] == {"name": "handler", "file": "app.py", "line": 10}
+    profile = doc["profiles"][0]
+    assert profile["type"] == "sampled"
+    assert profile["samples"] == [[0, 1, 2], [0, 1]]
+    assert profile["weights"] == pytest.approx([0.03, 0.01])
+
+
+def test_write_profile_names_file_per_worker(tmp_path):
+    path = write_profile(_profile(), str(tmp_path / "out"), "collapsed", "window")
+
+    assert path.name.startswith("window-")
+    assert path.name.endswith(".collapsed.txt")
+    assert path.read_text().startswith("MainThread;handler")
+    assert write_profile(_profile({}), str(tmp_path), "collapsed", "window") is None
+
+
+def _spin(stop):
+    while not stop.is_set():
+        sum(range(100))
+
+
+def test_sampler_records_busy_threads_and_skips_idle_ones():
+    stop = threading.Event()
+    busy = threading.Thread(target=_spin, args=(stop,), name="busy-1")
+    idle = threading.Thread(target=stop.wait, name="idle")
+    busy.start()
+    idle.start()
+    sampler = StackSampler(0.001)
+    try:
+        for _ in range(20):
+            sampler.sample()
+    finally:
+        stop.set()
+        busy.join()
+        idle.join()
+
+    roots = {stack[0][0] for stack in sampler.take().samples}
+    assert "busy" in roots
+    assert "idle" not in roots
+
+
+def test_sampler_thread_runs_only_while_held():
+    sampler = StackSampler(0.001)
+    sampler.acquire()
+    sampler.acquire()
+    sampler.release()
+    time.sleep(0.02)
+    assert sampler._thread is not None
+
+    sampler.release()
+    deadline = time.monotonic() + 1
+    while sampler._thread is not None and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert sampler._thread is None
+
+
+def test_only_one_window_per_worker(tmp_path):
+    profiler = Profiler(0.001, str(tmp_path), "collapsed", sample_rate=0)
+
+    assert profiler.start_window(0.05) is True
+    assert profiler.start_window(0.05) is False
+
+
+def test_profile_message_clamps_seconds_and_ignores_bad_requests(monkeypatch):
+    fake = Mock()
+    fake.format = "collapsed"
+    monkeypatch.setattr(profiling, "profiler", fake)
+
+    profiling._on_profile_message({"data": json.dumps({"seconds": 10_000})})
+    fake.start_window.assert_called_once_with(profiling.PROFILE_MAX_SECONDS, "collapsed")
+
+    fake.start_window.reset_mock()
+    profiling._on_profile_message({"data": json.dumps({"seconds": 1, "format": "pprof"})})
+    profiling._on_profile_message({"data": "not json"})
+    fake.start_window.assert_not_called()
+
+
+def test_request_profile_window_publishes_to_all_workers():
+    r = Mock()
+    r.publish.return_value = 4
+
+    assert profiling.request_profile_window(r, 30, "speedscope") == 4
+    channel, payload = r.publish.call_args.args
+    assert channel == PROFILE_CHANNEL
+    assert json.loads(payload) == {"seconds": 30, "format": "speedscope"}
+
+
+async def _app(scope, receive, send):
+    pass
+
+
+@pytest.mark.parametrize("rate, held", [(0.0, 0), (1.0, 1)])
+def test_middleware_holds_sampler_for_sampled_requests(rate, held):
+    profiler = Profiler(0.01, "unused", "collapsed", sample_rate=rate)
+    profiler.request_sampler = Mock()
+    middleware = ProfilingMiddleware(_app, profiler)
+
+    asyncio.run(middleware({"type": "http"}, None, None))
+
+    assert profiler.request_sampler.acquire.call_count == held
+    assert profiler.request_sampler.release.call_count == held
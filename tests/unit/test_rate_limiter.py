@@ -1,38 +1,88 @@
 from unittest.mock import Mock
 
-from urlshortenerapi.services.rate_limiter import check_rate_limit
+from urlshortenerapi.services.rate_limiter import (
+    GCRA,
+    RATE_LIMIT_LUA,
+    TOKEN_BUCKET,
+    RateLimiter,
+    RateLimitRule,
+    check_rate_limit,
+    check_token_bucket,
+)
+
+
+def _redis_returning(raw):
+    r = Mock()
+    script = Mock(return_value=raw)
+    r.register_script.return_value = script
+    return r, script
 
 
-def test_rate_limiter_first_hit_sets_expire():
-    r = Mock()
-    r.incr.return_value = 1
-    r.ttl.return_value = 59
+def test_rate_limiter_registers_script_once_and_calls_it_by_sha():
+    r, script = _redis_returning([1, 1, 2, 0, 59_000])
+    limiter = RateLimiter(r)
 
-    res = check_rate_limit(r, key="k", limit=3, window_seconds=60)
+    limiter.check([RateLimitRule("k", 3, 60)])
+    limiter.check([RateLimitRule("k", 3, 60)])
 
-    r.expire.assert_called_once_with("k", 60)
-    assert res.allowed is True
-    assert res.remaining == 2
-    assert res.reset_seconds == 59
+    r.register_script.assert_called_once_with(RATE_LIMIT_LUA)
+    assert script.call_count == 2
+    r.eval.assert_not_called()
 
 
-def test_rate_limiter_subsequent_hit_does_not_set_expire():
-    r = Mock()
-    r.incr.return_value = 2
-    r.ttl.return_value = 10
+def test_rate_limiter_sends_all_rules_in_one_call():
+    r, script = _redis_returning([1, 1, 2, 0, 60_000, 1, 9, 0, 100, 1, 99, 0, 1000])
+    rules = [
+        RateLimitRule("ip", 3, 60),
+        RateLimitRule("key", 10, 60, algorithm=TOKEN_BUCKET),
+        RateLimitRule("global", 100, 1, algorithm=GCRA, cost=2),
+    ]
+
+    decision = RateLimiter(r).check(rules)
+
+    script.assert_called_once()
+    kwargs = script.call_args.kwargs
+    assert kwargs["keys"] == ["ip", "key", "global"]
+    assert kwargs["args"] == [
+        "fw", 3, 60_000, 1, 0,
+        "tb", 10, 60_000, 1, 0,
+        "gcra", 100, 1000, 2, 0,
+    ]  # fmt: skip
+    assert decision.allowed is True
+    assert [o.remaining for o in decision.outcomes] == [2, 9, 99]
+
+
+def test_rate_limiter_reports_the_longest_retry_after():
+    r, _ = _redis_returning([0, 1, 2, 0, 60_000, 0, 0, 1_500, 3_000])
+    rules = [RateLimitRule("ip", 3, 60), RateLimitRule("key", 10, 60, algorithm=GCRA)]
+
+    decision = RateLimiter(r).check(rules)
+
+    assert decision.allowed is False
+    assert decision.outcomes[0].allowed is True
+    assert decision.outcomes[1].allowed is False
+    # milliseconds are rounded up to whole seconds
+    assert decision.retry_after == 2
+
+
+def test_rate_limiter_with_no_rules_skips_redis():
+    r, script = _redis_returning([])
+    assert RateLimiter(r).check([]).allowed is True
+    script.assert_not_called()
+
+
+def test_check_rate_limit_allows_under_limit():
+    r, _ = _redis_returning([1, 1, 2, 0, 59_000])
 
     res = check_rate_limit(r, key="k", limit=3, window_seconds=60)
 
-    r.expire.assert_not_called()
     assert res.allowed is True
-    assert res.remaining == 1
-    assert res.reset_seconds == 10
+    assert res.remaining == 2
+    assert res.reset_seconds == 59
 
 
-def test_rate_limiter_blocks_when_over_limit():
-    r = Mock()
-    r.incr.return_value = 4
-    r.ttl.return_value = 20
+def test_check_rate_limit_blocks_when_over_limit():
+    r, _ = _redis_returning([0, 0, 0, 20_000, 20_000])
 
     res = check_rate_limit(r, key="k", limit=3, window_seconds=60)
 
@@ -41,11 +91,37 @@ def test_rate_limiter_blocks_when_over_limit():
     assert res.reset_seconds == 20
 
 
-def test_rate_limiter_ttl_fallback_when_missing():
-    r = Mock()
-    r.incr.return_value = 2
-    r.ttl.return_value = -1  # Redis returns -1 or -2 depending on state
+def test_check_rate_limit_reset_falls_back_to_window():
+    r, _ = _redis_returning([1, 1, 2, 0, 0])
 
     res = check_rate_limit(r, key="k", limit=3, window_seconds=60)
 
     assert res.reset_seconds == 60
+
+
+def test_check_token_bucket_maps_outcome():
+    r, script = _redis_returning([0, 0, 0, 4_200, 60_000])
+
+    res = check_token_bucket(r, key="b", capacity=60, window_seconds=60, cost=5)
+
+    assert script.call_args.kwargs["args"] == ["tb", 60, 60_000, 5, 0]
+    assert res.allowed is False
+    assert res.retry_after == 5
+
+
+def test_check_token_bucket_passes_ttl_as_key_expiry():
+    r, script = _redis_returning([1, 1, 59, 0, 1_000])
+
+    check_token_bucket(r, key="b", capacity=60, window_seconds=60, ttl_seconds=300)
+
+    assert script.call_args.kwargs["args"] == ["tb", 60, 60_000, 1, 300_000]
+
+
+def test_check_helpers_register_the_script_once_per_client():
+    r, script = _redis_returning([1, 1, 2, 0, 59_000])
+
+    for _ in range(3):
+        check_rate_limit(r, key="k", limit=3, window_seconds=60)
+
+    r.register_script.assert_called_once_with(RATE_LIMIT_LUA)
+    assert script.call_count == 3
@@ -0,0 +1,115 @@
+import asyncio
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, Mock
+
+from urlshortenerapi.services.bloom import code_filter
+from urlshortenerapi.services.link_cache import CachedLink
+from urlshortenerapi.services.rate_limiter import RateLimitRule
+from urlshortenerapi.services.redirect_engine import (
+    REDIRECT_MISS,
+    REDIRECT_OK,
+    REDIRECT_RATE_LIMITED,
+    AsyncRedirectEngine,
+    RedirectEngine,
+)
+
+NOW = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def _engine(script_result):
+    r = Mock()
+    script = Mock(return_value=script_result)
+    r.register_script.return_value = script
+    return RedirectEngine(r), script
+
+
+def test_redirect_engine_reads_cache_when_link_unknown():
+    engine, script = _engine(["ok", '{"long_url": "https://example.com"}', 0])
+    rule = RateLimitRule(key="rl:redirect:1.2.3.4", limit=3, window_seconds=60)
+
+    res = engine.run("abc1234", NOW, rule, visitor="00ff00ff00ff00ff")
+
+    keys = script.call_args.kwargs["keys"]
+    args = script.call_args.kwargs["args"]
+    assert keys == [
+        "rl:redirect:1.2.3.4",
+        "link_cache:abc1234",
+        "clicks",
+        "last_accessed",
+        "link_missing:abc1234",
+        code_filter.key,
+        "clicks:hourly",
+        "uv:link:abc1234:20260101",
+        "clicks:inflight",
+    ]
+    assert args[:2] == [3, 60]
+    assert args[4] == "abc1234"
+    # empty click_count tells the script to read the cache entry itself,
+    # then the hour bucket, the visitor HLL fields, and the code filter
+    # bit positions for the not-found check
+    assert args[5:7] == ["", ""]
+    assert args[7] == int(NOW.timestamp())
+    assert args[8:10] == ["00ff00ff00ff00ff", "20260101"]
+    assert args[11] == ""  # owner comes from the cache entry
+    assert args[12:] == code_filter.positions("abc1234")
+    assert res.status == REDIRECT_OK
+    assert res.payload == '{"long_url": "https://example.com"}'
+
+
+def test_redirect_engine_passes_known_link_fields():
+    engine, script = _engine(["ok", "", 0])
+
+    owner = "7d3c1f6e-1a2b-4c5d-8e9f-0a1b2c3d4e5f"
+    link = CachedLink("https://example.com", True, None, 5, 2, owner)
+
+    res = engine.run("abc1234", NOW, link=link)
+
+    args = script.call_args.kwargs["args"]
+    assert args[:2] == [0, 0]  # no rate limit
+    assert args[5:7] == [5, 2]
+    assert args[8] == ""  # visitor not counted
+    assert args[11] == owner
+    assert len(args) == 12  # no filter positions needed
+    assert res.status == REDIRECT_OK
+    assert res.payload is None
+
+
+def test_redirect_engine_reports_rate_limit_and_miss():
+    engine, _ = _engine(["rate_limited", "", 42])
+    res = engine.run("abc1234", NOW, RateLimitRule(key="k", limit=1, window_seconds=60))
+    assert res.status == REDIRECT_RATE_LIMITED
+    assert res.retry_after == 42
+
+    engine, _ = _engine(["miss", "", 0])
+    assert engine.run("abc1234", NOW).status == REDIRECT_MISS
+
+
+def test_async_redirect_engine_matches_sync_call():
+    r = Mock()
+    script = AsyncMock(return_value=["ok", "", 0])
+    r.register_script.return_value = script
+    engine = AsyncRedirectEngine(r)
+
+    link = CachedLink("https://example.com", True, None, None, 0)
+    res = asyncio.run(engine.run("abc1234", NOW, link=link))
+
+    args = script.call_args.kwargs["args"]
+    assert args[5:7] == ["", 0]
+    assert res.status == REDIRECT_OK
+
+
+def test_visitor_hlls_expire_after_retention_window():
+    engine, script = _engine(["ok", "", 0])
+    engine.run("abc1234", NOW, visitor="00ff00ff00ff00ff")
+
+    expire_at = script.call_args.kwargs["args"][10]
+    # today's HLL stays readable for the whole retention window
+    assert expire_at == int(NOW.timestamp()) + 31 * 86400
+
+
+def test_redirect_engine_reports_cache_entry_ttl():
+    engine, _ = _engine(["ok", "1|||0||https://example.com", 0, 1500])
+    assert engine.run("abc1234", NOW).cache_ttl_ms == 1500
+
+    engine, _ = _engine(["miss", "", 0])
+    assert engine.run("abc1234", NOW).cache_ttl_ms == -1
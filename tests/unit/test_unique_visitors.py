@@ -0,0 +1,71 @@
+from datetime import datetime, timezone
+from unittest.mock import Mock
+
+from urlshortenerapi.services.unique_visitors import (
+    count_link_visitors,
+    daily_link_visitors,
+    link_visitors_key,
+    retained_days,
+    visitor_id,
+    visitors_expire_at,
+)
+
+NOW = datetime(2026, 3, 10, 15, 30, tzinfo=timezone.utc)
+
+
+def test_visitor_id_is_stable_and_hides_the_ip():
+    vid = visitor_id("203.0.113.7")
+    assert vid == visitor_id("203.0.113.7")
+    assert vid != visitor_id("203.0.113.8")
+    assert len(vid) == 16
+    assert "203" not in vid
+
+
+def test_retained_days_clamps_to_retention_window():
+    days = retained_days(datetime(2020, 1, 1, tzinfo=timezone.utc), NOW, now=NOW)
+    assert len(days) == 30
+    assert days[0] == "20260209"
+    assert days[-1] == "20260310"
+
+
+def test_retained_days_end_is_exclusive():
+    start = datetime(2026, 3, 8, tzinfo=timezone.utc)
+    end = datetime(2026, 3, 10, tzinfo=timezone.utc)
+    assert retained_days(start, end, now=NOW) == ["20260308", "20260309"]
+
+
+def test_visitors_expire_at_keeps_day_for_full_window():
+    day_start = int(datetime(2026, 3, 10, tzinfo=timezone.utc).timestamp())
+    assert visitors_expire_at(NOW) == day_start + 31 * 86400
+
+
+def test_count_link_visitors_unions_days_in_one_pfcount():
+    r = Mock()
+    r.pfcount.return_value = 42
+    start = datetime(2026, 3, 9, tzinfo=timezone.utc)
+
+    assert count_link_visitors(r, "abc1234", start, NOW, now=NOW) == 42
+    r.pfcount.assert_called_once_with(
+        link_visitors_key("abc1234", "20260309"), link_visitors_key("abc1234", "20260310")
+    )
+
+
+def test_count_link_visitors_outside_retention_is_zero():
+    r = Mock()
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    end = datetime(2020, 2, 1, tzinfo=timezone.utc)
+
+    assert count_link_visitors(r, "abc1234", start, end, now=NOW) == 0
+    r.pfcount.assert_not_called()
+
+
+def test_daily_link_visitors_pipelines_per_day_counts():
+    r = Mock()
+    pipe = r.pipeline.return_value
+    pipe.execute.return_value = [3, 5]
+
+    assert daily_link_visitors(r, "abc1234", ["20260309", "20260310"]) == {
+        "20260309": 3,
+        "20260310": 5,
+    }
+    assert pipe.pfcount.call_count == 2
@@ -58,3 +58,16 @@ def test_max_clicks_none_normalizes_to_zero():
     # your validator turns None into 0
     req = CreateLinkRequest(url="https://example.com", max_clicks=None)
     assert req.max_clicks == 0
+
+
+def test_batch_create_request_bounds():
+    from urlshortenerapi.schemas.links import BATCH_CREATE_MAX_ITEMS, BatchCreateLinksRequest
+
+    with pytest.raises(ValidationError):
+        BatchCreateLinksRequest(items=[])
+    with pytest.raises(ValidationError):
+        BatchCreateLinksRequest(
+            items=[{"url": "https://example.com"}] * (BATCH_CREATE_MAX_ITEMS + 1)
+        )
+    # Items themselves are validated by the endpoint, one by one
+    assert len(BatchCreateLinksRequest(items=[{"url": "nope"}]).items) == 1